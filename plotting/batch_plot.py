@@ -0,0 +1,196 @@
+import ROOT
+import root_cosmetics as cosmetics
+import utils
+import export
+import config_matrix
+import graph_loader
+import shape_cache
+import instrumentation
+import limit_plot
+import limit_plot_2d
+import gof_plot
+import nuisance_plot
+import correlation_plot
+import postfit_plot
+import scan_plot
+import argparse
+import multiprocessing
+import multiprocessing.util
+import os
+import sys
+
+
+"""
+Create many plots from a list of config files (or glob patterns) in a pool of worker processes.
+Each worker imports ROOT and builds the CMS style only once and then renders all plots it gets.
+The type of plot is taken from the 'plot_type' entry of each config ('limit', 'limit_2d', 'postfit', 'postfit_all', 'postfit_combined', 'nuisance', 'correlation', 'scan' or 'gof').
+Configs with a 'matrix' entry are expanded into one job per combination (see config_matrix.py). The .csv inputs
+of all jobs are read once into a cache before the workers are forked, so shared theory and comparison files
+are not read again for every plot.
+
+With --profile, the stages of all plots are recorded as JSON lines (see instrumentation.py) and summarized at the end.
+
+usage: python plotting/batch_plot.py 'configs/*.yml' other_config.yml -j 8 [--profile profile.jsonl]
+"""
+
+PLOT_FUNCTIONS = {
+    'limit': limit_plot.make_limit_plot,
+    'limit_2d': limit_plot_2d.make_limit_plot_2d,
+    'postfit': postfit_plot.make_postfit_plot,
+    'postfit_all': postfit_plot.make_postfit_plots,
+    'postfit_combined': postfit_plot.make_combined_postfit_plot,
+    'nuisance': nuisance_plot.make_nuisance_plot,
+    'correlation': correlation_plot.make_correlation_plot,
+    'scan': scan_plot.make_scan_plot,
+    'gof': gof_plot.make_gof_plot,
+}
+
+_style = None # CMS style of the worker process
+
+
+def init_worker(background_export=False): # -> None
+    """
+    set up a worker process: batch mode and CMS style.
+    with background_export, the plots of a job are written in a background thread while the job goes on,
+    every job waits for its files at the end (see render_job).
+    """
+    global _style
+    ROOT.gROOT.SetBatch(True)
+    _style = cosmetics.get_cms_style()
+    if background_export:
+        export.start_background()
+        multiprocessing.util.Finalize(None, export.stop_background, exitpriority=100)
+
+
+def render(config, plot_type='limit'): # -> str
+    """
+    render one plot from a config dict with the style of the current process.
+    returns file name of the plot
+    """
+    global _style
+    if _style is None:
+        init_worker()
+    plot_type = config.get('plot_type', plot_type)
+    if plot_type not in PLOT_FUNCTIONS:
+        raise ValueError('unknown plot_type "{}", choose from {}'.format(plot_type, sorted(PLOT_FUNCTIONS)))
+    return PLOT_FUNCTIONS[plot_type](config, style=_style)
+
+
+def render_job(job): # -> tuple
+    """
+    render the plot of a (job name, config, default plot type) job.
+    with background export, the job waits until its files are written, so that failed writes fail the job.
+    returns (job name, plot file name, error message)
+    """
+    name, config, plot_type = job
+    try:
+        plot_file = render(config, plot_type)
+        error = None
+    except Exception as exc:
+        plot_file, error = None, '{}: {}'.format(type(exc).__name__, exc)
+    export_errors = export.join_background()
+    if export_errors:
+        plot_file = None
+        error = '; '.join(([error] if error else []) + ['export failed: {}'.format(e) for e in export_errors])
+    return name, plot_file, error
+
+
+def load_jobs(config_files, plot_type='limit'): # -> tuple
+    """
+    read the config files and expand their matrix entries.
+    returns list of (job name, config, plot type) jobs and list of (config file, None, error message) of unusable configs
+    """
+    jobs = []
+    failed = []
+    for config_file in config_files:
+        try:
+            for variables, config in config_matrix.expand_config(utils.get_config(config_file)):
+                jobs.append((config_matrix.job_name(config_file, variables), config, plot_type))
+        except Exception as exc:
+            failed.append((config_file, None, '{}: {}'.format(type(exc).__name__, exc)))
+    return jobs, failed
+
+
+def schedule(jobs): # -> list
+    """
+    read every .csv input of the jobs once into the graph_loader cache, extract missing shape caches and order the jobs
+    so that jobs sharing an input file follow each other.
+    returns the ordered list of jobs
+    """
+    graph = config_matrix.input_graph(jobs)
+    graph_loader.preload([f for f in graph if f.endswith('.csv') and os.path.exists(f)])
+    # shape caches are extracted here once instead of by several workers at the same time
+    extracted = set()
+    for name, config, plot_type in jobs:
+        cache_dir = config.get('shape_cache')
+        if cache_dir and cache_dir not in extracted and os.path.exists(config.get('file_name', '')):
+            if not shape_cache.is_current(cache_dir, config['file_name']):
+                shape_cache.extract(config['file_name'], cache_dir)
+            extracted.add(cache_dir)
+    order = []
+    scheduled = set()
+    for indices in graph.values():
+        for i in indices:
+            if i not in scheduled:
+                scheduled.add(i)
+                order.append(i)
+    order += [i for i in range(len(jobs)) if i not in scheduled]
+    return [jobs[i] for i in order]
+
+
+def render_jobs(jobs, n_jobs=None, background_export=False): # -> list
+    """
+    render (job name, config, plot type) jobs in a pool of n_jobs worker processes.
+    returns list of (job name, plot file name, error message)
+    """
+    if not jobs:
+        return []
+    jobs = schedule(jobs)
+    n_jobs = min(n_jobs or multiprocessing.cpu_count(), len(jobs))
+    pool = multiprocessing.Pool(n_jobs, initializer=init_worker, initargs=(background_export,))
+    try:
+        return list(pool.imap_unordered(render_job, jobs))
+    finally:
+        pool.close()
+        pool.join()
+        graph_loader.clear_cache()
+
+
+def run_batch(config_files, plot_type='limit', n_jobs=None, background_export=False): # -> list
+    """
+    render all config files (expanded to one job per matrix combination) in a pool of n_jobs worker processes.
+    returns list of (job name, plot file name, error message)
+    """
+    jobs, results = load_jobs(config_files, plot_type)
+    return results + render_jobs(jobs, n_jobs, background_export)
+
+
+def main(argv=None): # -> int
+    parser = argparse.ArgumentParser(description='Render many plots from YAML configs in parallel.')
+    parser.add_argument('configs', nargs='+', help='config files or glob patterns')
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='number of worker processes (default: number of CPUs)')
+    parser.add_argument('-t', '--plot-type', default='limit', choices=sorted(PLOT_FUNCTIONS), help='plot type for configs without "plot_type"')
+    parser.add_argument('-b', '--background-export', action='store_true', help='write the output files in a background thread of each worker')
+    parser.add_argument('-p', '--profile', default=None, help='record the timing and memory of each stage in this .jsonl file and print a summary')
+    args = parser.parse_args(argv)
+
+    if args.profile:
+        if os.path.exists(args.profile):
+            os.remove(args.profile)
+        instrumentation.enable(args.profile)
+    results = run_batch(config_matrix.expand_patterns(args.configs), args.plot_type, args.jobs, args.background_export)
+    n_failed = 0
+    for name, plot_file, error in sorted(results):
+        if error is None:
+            print('{} -> {}'.format(name, plot_file))
+        else:
+            n_failed += 1
+            print('{} FAILED: {}'.format(name, error))
+    print('{} plots, {} failed'.format(len(results), n_failed))
+    if args.profile and os.path.exists(args.profile):
+        instrumentation.print_summary(instrumentation.summarize(instrumentation.read_records([args.profile])))
+    return 1 if n_failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
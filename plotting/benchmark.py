@@ -0,0 +1,263 @@
+import ROOT
+import graph_loader
+import synthetic_inputs
+import limit_plot
+import nuisance_plot
+import postfit_plot
+import numpy as np
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+
+"""
+Benchmark suite for the plot scripts on synthetic inputs.
+Every case runs in a fresh process and records the wall time of each stage and of the whole plot
+as well as the peak RSS. The results can be stored as a baseline and compared with a stored baseline.
+The startup case measures the import of the plot scripts and a --dry-run in fresh interpreters; it fails
+if one of them takes longer than --startup-budget seconds or loads ROOT.
+
+usage: python plotting/benchmark.py [--cases limit nuisance postfit graph_loader startup] [--startup-budget 1]
+                                    [--save-baseline baseline.json | --compare baseline.json]
+"""
+
+CASES = ['graph_loader', 'limit', 'nuisance', 'postfit', 'startup']
+PLOT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class Timer(object):
+    """
+    collects the wall time of named stages
+    """
+
+    def __init__(self):
+        self.times = {}
+
+    def stage(self, name, func, *args, **kwargs):
+        t0 = time.time()
+        result = func(*args, **kwargs)
+        self.times[name] = self.times.get(name, 0.) + time.time() - t0
+        return result
+
+
+def bench_graph_loader(tmp_dir, sizes): # -> dict
+    """
+    time reading and filling of the limit graphs for different numbers of mass points.
+    the scaling exponent k of t ~ n^k should be close to 1.
+    """
+    timer = Timer()
+    totals = []
+    for n in sizes:
+        file_name = os.path.join(tmp_dir, 'limits_{}.csv'.format(n))
+        synthetic_inputs.write_limit_csv(file_name, n)
+        t0 = time.time()
+        cols = timer.stage('read_{}'.format(n), graph_loader.read_columns, file_name, graph_loader.LIMIT_COLUMNS)
+        timer.stage('fill_{}'.format(n), graph_loader.make_limit_graphs, cols)
+        totals.append(time.time() - t0)
+    if len(sizes) > 1:
+        timer.times['scaling_exponent'] = scaling_exponent(sizes, totals)
+    return timer.times
+
+
+def bench_limit(tmp_dir, n_points): # -> dict
+    limit_file = os.path.join(tmp_dir, 'limits.csv')
+    theory_file = os.path.join(tmp_dir, 'theory.csv')
+    synthetic_inputs.write_limit_csv(limit_file, n_points)
+    synthetic_inputs.write_theory_csv(theory_file, n_points)
+    config = {'limit_file_name': limit_file, 'theory_file_name': theory_file, 'b_theory_err': True}
+    timer = Timer()
+    cols = timer.stage('read', graph_loader.read_columns, limit_file, graph_loader.LIMIT_COLUMNS)
+    timer.stage('fill', graph_loader.make_limit_graphs, cols)
+    timer.stage('total', limit_plot.make_limit_plot, config)
+    return timer.times
+
+
+def bench_nuisance(tmp_dir, n_rows): # -> dict
+    file_name = os.path.join(tmp_dir, 'pulls.csv')
+    synthetic_inputs.write_nuisance_csv(file_name, n_rows)
+    timer = Timer()
+    cols = timer.stage('read', graph_loader.read_columns, file_name, nuisance_plot.NUISANCE_COLUMNS, text_columns=['label'])
+    timer.stage('select', nuisance_plot.select_nuisances, cols, 'pull', 100)
+    timer.stage('total', nuisance_plot.make_nuisance_plot, {'file_name': file_name})
+    return timer.times
+
+
+def bench_postfit(tmp_dir, n_channels, n_bins, n_samples): # -> dict
+    file_name = os.path.join(tmp_dir, 'fitDiagnostics.root')
+    synthetic_inputs.write_fit_diagnostics(file_name, n_channels, n_bins, n_samples)
+    config = {
+        'file_name': file_name,
+        'shapes': ['shapes_fit_b/'],
+        'background_samples': [{'name': 'bkg{}'.format(j), 'title': 'bkg {}'.format(j), 'color': 2 + j} for j in range(n_samples)],
+        'signal_sample': {'name': 'signal', 'title': 'signal'},
+        'output_dir': tmp_dir,
+    }
+    timer = Timer()
+    f = ROOT.TFile(file_name)
+    shapes = [timer.stage('read', postfit_plot.read_shapes, f, 'shapes_fit_b/', 'ch{}'.format(i), config) for i in range(n_channels)]
+    f.Close()
+    for s in shapes:
+        bkg = graph_loader.hist_to_arrays(s['total_background'])
+        data = graph_loader.graph_to_arrays(s['data'])
+        timer.stage('ratio', postfit_plot.compute_ratio, bkg['edges'], data['y'], data['eyh'], bkg['contents'], bkg['errors'])
+    timer.stage('total', postfit_plot.make_postfit_plots, config)
+    return timer.times
+
+
+def time_command(command): # -> tuple
+    t0 = time.time()
+    output = subprocess.check_output(command, universal_newlines=True)
+    return time.time() - t0, output
+
+
+def bench_startup(tmp_dir, n_points): # -> dict
+    """
+    time the import of the plot scripts and a --dry-run of a limit config, each in a new interpreter.
+    root_loaded is 1 if importing the plot scripts imported ROOT
+    """
+    limit_file = os.path.join(tmp_dir, 'limits.csv')
+    theory_file = os.path.join(tmp_dir, 'theory.csv')
+    config_file = os.path.join(tmp_dir, 'limit_config.yml')
+    synthetic_inputs.write_limit_csv(limit_file, n_points)
+    synthetic_inputs.write_theory_csv(theory_file, n_points)
+    with open(config_file, 'w') as f:
+        f.write("limit_file_name: '{}'\ntheory_file_name: '{}'\n".format(limit_file, theory_file))
+    code = 'import sys; sys.path.insert(0, {!r}); import limit_plot, limit_plot_2d, nuisance_plot, postfit_plot, scan_plot, gof_plot, correlation_plot; print("ROOT" in sys.modules)'
+    times = {}
+    times['import'], output = time_command([sys.executable, '-c', code.format(PLOT_DIR)])
+    times['root_loaded'] = float(output.strip() == 'True')
+    times['dry_run'], output = time_command([sys.executable, os.path.join(PLOT_DIR, 'limit_plot.py'), config_file, '--dry-run'])
+    return times
+
+
+def check_startup(times, budget): # -> list
+    """
+    returns list of problems of the startup case: stages over the time budget and ROOT being loaded
+    """
+    problems = ['{} took {:.3f} s, the budget is {:.3f} s'.format(stage, times[stage], budget)
+                for stage in ('import', 'dry_run') if times[stage] > budget]
+    if times['root_loaded']:
+        problems.append('ROOT was imported before anything was drawn')
+    return problems
+
+
+def run_case(args): # -> dict
+    """
+    run one benchmark case in a temporary directory.
+    returns dict of stage -> seconds and the peak RSS in MB
+    """
+    name, params = args
+    ROOT.gROOT.SetBatch(True)
+    tmp_dir = tempfile.mkdtemp()
+    cwd = os.getcwd()
+    try:
+        os.chdir(tmp_dir)
+        if name == 'graph_loader':
+            result = bench_graph_loader(tmp_dir, params['sizes'])
+        elif name == 'limit':
+            result = bench_limit(tmp_dir, params['limit_points'])
+        elif name == 'nuisance':
+            result = bench_nuisance(tmp_dir, params['nuisances'])
+        elif name == 'startup':
+            result = bench_startup(tmp_dir, params['limit_points'])
+        else:
+            result = bench_postfit(tmp_dir, params['channels'], params['bins'], params['samples'])
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(tmp_dir)
+    result['max_rss_mb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.
+    return result
+
+
+def run_benchmarks(cases, params): # -> dict
+    """
+    run each case in a fresh worker process so that the peak RSS belongs to this case only
+    """
+    results = {}
+    for name in cases:
+        pool = multiprocessing.Pool(1, maxtasksperchild=1)
+        try:
+            results[name] = pool.apply(run_case, ((name, params),))
+        finally:
+            pool.close()
+            pool.join()
+    return results
+
+
+def compare(results, baseline, tolerance): # -> list
+    """
+    compare results with a baseline.
+    returns list of (case, stage, baseline value, new value) of all stages that are slower
+    (or use more memory) than baseline * (1 + tolerance)
+    """
+    regressions = []
+    for case, stages in sorted(results.items()):
+        for stage, value in sorted(stages.items()):
+            ref = baseline.get(case, {}).get(stage)
+            if ref is None or stage == 'scaling_exponent':
+                continue
+            if value > ref * (1. + tolerance):
+                regressions.append((case, stage, ref, value))
+    return regressions
+
+
+def scaling_exponent(sizes, times): # -> float
+    """
+    fit t ~ n^k and return k, k close to 1 means linear scaling
+    """
+    return np.polyfit(np.log(sizes), np.log(times), 1)[0]
+
+
+def main(argv=None): # -> int
+    parser = argparse.ArgumentParser(description='Benchmark the plot scripts on synthetic inputs.')
+    parser.add_argument('--cases', nargs='+', default=CASES, choices=CASES)
+    parser.add_argument('--sizes', nargs='+', type=int, default=[1000, 10000, 100000, 1000000], help='mass points for graph_loader')
+    parser.add_argument('--limit-points', type=int, default=10000)
+    parser.add_argument('--nuisances', type=int, default=1000)
+    parser.add_argument('--channels', type=int, default=10)
+    parser.add_argument('--bins', type=int, default=100)
+    parser.add_argument('--samples', type=int, default=5)
+    parser.add_argument('--save-baseline', default=None, help='store the results as baseline in this .json file')
+    parser.add_argument('--compare', default=None, help='compare the results with the baseline in this .json file')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed relative slowdown (default: 0.2)')
+    parser.add_argument('--startup-budget', type=float, default=1., help='allowed seconds for the import and --dry-run of a plot script (default: 1)')
+    args = parser.parse_args(argv)
+
+    params = dict((k, getattr(args, k)) for k in ['sizes', 'limit_points', 'nuisances', 'channels', 'bins', 'samples'])
+    results = run_benchmarks(args.cases, params)
+    for case in args.cases:
+        print(case)
+        for stage, value in sorted(results[case].items()):
+            print('  {:<20} {:>10.4f}'.format(stage, value))
+
+    if 'startup' in results:
+        problems = check_startup(results['startup'], args.startup_budget)
+        for problem in problems:
+            print('STARTUP {}'.format(problem))
+        if problems:
+            return 1
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump({'params': params, 'results': results}, f, indent=1, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline.get('params') != params:
+            print('WARNING: baseline was recorded with different parameters {}'.format(baseline.get('params')))
+        regressions = compare(results, baseline['results'], args.tolerance)
+        for case, stage, ref, value in regressions:
+            print('REGRESSION {} {}: {:.4f} -> {:.4f}'.format(case, stage, ref, value))
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
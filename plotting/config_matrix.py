@@ -0,0 +1,108 @@
+import glob
+import itertools
+import os
+
+
+"""
+Expand a config with a 'matrix' entry into one config per combination of the matrix values
+and find the input files of the plot jobs, so that shared inputs are only read once.
+'{name}' in any string of the config is replaced by the value of the matrix variable name,
+a string that is only '{name}' takes the value itself (e.g. a number):
+
+matrix:
+  year: [2016, 2017, 2018]
+  chirality: ['LH', 'RH']
+limit_file_name: 'limits/limits_{year}_{chirality}.csv'
+theory_file_name: 'theory/theory_{chirality}.csv'
+"""
+
+
+def substitute(value, variables): # -> object
+    """
+    replace '{name}' by the matrix variables in all strings of a (nested) config value
+    """
+    if isinstance(value, dict):
+        return dict((k, substitute(v, variables)) for k, v in value.items())
+    if isinstance(value, list):
+        return [substitute(v, variables) for v in value]
+    if isinstance(value, str):
+        for name, v in variables.items():
+            placeholder = '{' + name + '}'
+            if value == placeholder:
+                return v
+            value = value.replace(placeholder, str(v))
+    return value
+
+
+def expand_config(config): # -> list
+    """
+    expand the 'matrix' entry of a config.
+    returns list of (dict of matrix variables, config), a config without matrix gives one entry with no variables
+    """
+    matrix = config.get('matrix')
+    if not matrix:
+        return [({}, config)]
+    if not isinstance(matrix, dict):
+        raise ValueError('matrix: expected a mapping of variable -> list of values, got {}'.format(type(matrix).__name__))
+    names = list(matrix)
+    values = [matrix[name] if isinstance(matrix[name], list) else [matrix[name]] for name in names]
+    base = dict((k, v) for k, v in config.items() if k != 'matrix')
+    configs = []
+    for combination in itertools.product(*values):
+        variables = dict(zip(names, combination))
+        configs.append((variables, substitute(base, variables)))
+    return configs
+
+
+def job_name(config_file, variables): # -> str
+    """
+    name of an expanded job, e.g. limits.yml[year=2016,chirality=LH]
+    """
+    if not variables:
+        return config_file
+    return '{}[{}]'.format(config_file, ','.join('{}={}'.format(k, v) for k, v in variables.items()))
+
+
+def expand_patterns(patterns): # -> list
+    """
+    expand a glob pattern or list of patterns to a sorted list of files without duplicates
+    """
+    files = []
+    for pattern in ([patterns] if isinstance(patterns, str) else patterns):
+        for f in sorted(glob.glob(pattern)) or [pattern]:
+            if f not in files:
+                files.append(f)
+    return files
+
+
+def input_files(config, plot_type='limit'): # -> list
+    """
+    input files read by the plot of a config
+    """
+    plot_type = config.get('plot_type', plot_type)
+    if plot_type in ('limit', 'limit_2d'):
+        files = [config.get('limit_file_name'), config.get('theory_file_name')]
+        files += [g.get('file') for g in config.get('compare_graphs', [])]
+    elif plot_type == 'nuisance':
+        files = [config.get('file_name'), config.get('fit_diagnostics_file')]
+    elif plot_type == 'scan':
+        files = expand_patterns(config.get('scan_files') or [])
+    elif plot_type == 'gof':
+        files = [config.get('observed_file')] + expand_patterns(config.get('toy_files') or [])
+    else:
+        files = [config.get('file_name')]
+    return [os.path.abspath(f) for f in files if f]
+
+
+def input_graph(jobs): # -> dict
+    """
+    dependency graph of (name, config, plot type) jobs on their input files.
+    returns dict of input file -> list of indices of the jobs reading it, in order of first use
+    """
+    graph = {}
+    for i, (name, config, plot_type) in enumerate(jobs):
+        for file_name in input_files(config, plot_type):
+            jobs_of_file = graph.setdefault(file_name, [])
+            if i not in jobs_of_file:
+                jobs_of_file.append(i)
+    return graph
@@ -0,0 +1,158 @@
+import numpy as np
+
+
+"""
+Grid scattered (x, y, value) points and extract contour lines with marching squares.
+All cells of a contour case are processed at once with numpy, only the chaining of the
+line segments loops in python, over the segments on the contour and not over the grid.
+"""
+
+# cell edges: bottom, right, top, left
+EDGE_B, EDGE_R, EDGE_T, EDGE_L = range(4)
+
+# segments (pairs of crossed edges) for the 16 cases of corners above the level,
+# case bits: 1 = bottom left, 2 = bottom right, 4 = top right, 8 = top left
+SEGMENTS = {
+    1: [(EDGE_L, EDGE_B)], 2: [(EDGE_B, EDGE_R)], 3: [(EDGE_L, EDGE_R)], 4: [(EDGE_R, EDGE_T)],
+    6: [(EDGE_B, EDGE_T)], 7: [(EDGE_L, EDGE_T)], 8: [(EDGE_L, EDGE_T)], 9: [(EDGE_B, EDGE_T)],
+    11: [(EDGE_R, EDGE_T)], 12: [(EDGE_L, EDGE_R)], 13: [(EDGE_B, EDGE_R)], 14: [(EDGE_L, EDGE_B)],
+}
+# saddle cells are resolved with the mean of the corners: (case, centre above level) -> segments
+SADDLE_SEGMENTS = {
+    (5, True): [(EDGE_B, EDGE_R), (EDGE_L, EDGE_T)], (5, False): [(EDGE_L, EDGE_B), (EDGE_R, EDGE_T)],
+    (10, True): [(EDGE_L, EDGE_B), (EDGE_R, EDGE_T)], (10, False): [(EDGE_B, EDGE_R), (EDGE_L, EDGE_T)],
+}
+
+
+def grid_points(x, y, values, bins=None): # -> tuple
+    """
+    put scattered points on a grid of shape (len(y_axis), len(x_axis)).
+    without bins, the axes are the distinct x and y values and every point fills its own node.
+    with bins = (nx, ny), the points are averaged in nx x ny equal bins and the axes are the bin centres.
+    values can be one array or a dict of arrays, nodes without points are NaN.
+    returns x axis, y axis and the grid (or dict of grids)
+    """
+    x, y = np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64)
+    if bins is None:
+        x_axis, ix = np.unique(x, return_inverse=True)
+        y_axis, iy = np.unique(y, return_inverse=True)
+    else:
+        nx, ny = bins
+        x_edges = np.linspace(x.min(), x.max(), nx + 1)
+        y_edges = np.linspace(y.min(), y.max(), ny + 1)
+        ix = np.clip(np.searchsorted(x_edges, x, side='right') - 1, 0, nx - 1)
+        iy = np.clip(np.searchsorted(y_edges, y, side='right') - 1, 0, ny - 1)
+        x_axis = (x_edges[1:] + x_edges[:-1]) / 2.
+        y_axis = (y_edges[1:] + y_edges[:-1]) / 2.
+    shape = (len(y_axis), len(x_axis))
+    index = iy * shape[1] + ix
+    counts = np.bincount(index, minlength=shape[0] * shape[1])
+
+    def fill(v):
+        v = np.asarray(v, dtype=np.float64)
+        finite = np.isfinite(v)
+        sums = np.bincount(index[finite], weights=v[finite], minlength=counts.size)
+        n = np.bincount(index[finite], minlength=counts.size)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            grid = np.where(n > 0, sums / n, np.nan)
+        return grid.reshape(shape)
+
+    if isinstance(values, dict):
+        return x_axis, y_axis, dict((k, fill(v)) for k, v in values.items())
+    return x_axis, y_axis, fill(values)
+
+
+def edge_points(x, y, z, level, edge, j, i): # -> tuple
+    """
+    crossing points of the level on one edge of the cells (j, i).
+    returns x, y and the id of the edge, shared by the two cells next to it
+    """
+    nx = len(x)
+    n_horizontal = len(y) * (nx - 1)
+    if edge in (EDGE_B, EDGE_T):
+        row = j if edge == EDGE_B else j + 1
+        za, zb = z[row, i], z[row, i + 1]
+        t = (level - za) / (zb - za)
+        return x[i] + t * (x[i + 1] - x[i]), y[row], row * (nx - 1) + i
+    column = i if edge == EDGE_L else i + 1
+    za, zb = z[j, column], z[j + 1, column]
+    t = (level - za) / (zb - za)
+    return x[column] + np.zeros_like(t), y[j] + t * (y[j + 1] - y[j]), n_horizontal + j * nx + column
+
+
+def marching_squares(x, y, z, level=0.): # -> tuple
+    """
+    find the line segments of the contour z = level on the grid z of shape (len(y), len(x)).
+    cells with a NaN corner are skipped.
+    returns dict of edge id -> (x, y) of the crossing points and array of (edge id, edge id) segments
+    """
+    x, y, z = np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64), np.asarray(z, dtype=np.float64)
+    if z.shape != (len(y), len(x)):
+        raise ValueError('marching_squares: grid of shape {} for axes of length {} and {}'.format(z.shape, len(x), len(y)))
+    if len(x) < 2 or len(y) < 2:
+        return {}, np.zeros((0, 2), dtype=np.int64)
+    above = z > level
+    case = (above[:-1, :-1] * 1 + above[:-1, 1:] * 2 + above[1:, 1:] * 4 + above[1:, :-1] * 8)
+    valid = np.isfinite(z[:-1, :-1]) & np.isfinite(z[:-1, 1:]) & np.isfinite(z[1:, 1:]) & np.isfinite(z[1:, :-1])
+    case[~valid] = 0
+    centre_above = (z[:-1, :-1] + z[:-1, 1:] + z[1:, 1:] + z[1:, :-1]) / 4. > level
+
+    points = {}
+    segments = []
+    selections = [(SEGMENTS[c], case == c) for c in SEGMENTS]
+    selections += [(SADDLE_SEGMENTS[(c, b)], (case == c) & (centre_above == b)) for c, b in SADDLE_SEGMENTS]
+    for pairs, selected in selections:
+        j, i = np.nonzero(selected)
+        if len(j) == 0:
+            continue
+        for edge_a, edge_b in pairs:
+            ids = []
+            for edge in (edge_a, edge_b):
+                px, py, edge_id = edge_points(x, y, z, level, edge, j, i)
+                points.update(zip(edge_id.tolist(), zip(px.tolist(), py.tolist())))
+                ids.append(edge_id)
+            segments.append(np.column_stack(ids))
+    if not segments:
+        return points, np.zeros((0, 2), dtype=np.int64)
+    return points, np.concatenate(segments)
+
+
+def chain_segments(points, segments): # -> list
+    """
+    join segments sharing an edge into lines.
+    closed lines end with their first point.
+    returns list of (n, 2) arrays of points
+    """
+    neighbours = {}
+    for k, (a, b) in enumerate(segments.tolist()):
+        neighbours.setdefault(a, []).append(k)
+        neighbours.setdefault(b, []).append(k)
+    used = np.zeros(len(segments), dtype=bool)
+    # start at open ends so that open lines are not split, then pick up the closed lines
+    starts = [e for e, ks in neighbours.items() if len(ks) == 1] + list(neighbours)
+    lines = []
+    for start in starts:
+        for k in neighbours[start]:
+            if used[k]:
+                continue
+            line = [start]
+            edge = start
+            while True:
+                used[k] = True
+                a, b = segments[k]
+                edge = int(b) if a == edge else int(a)
+                line.append(edge)
+                k = next((n for n in neighbours[edge] if not used[n]), None)
+                if k is None:
+                    break
+            lines.append(np.array([points[e] for e in line]))
+    return lines
+
+
+def find_contours(x, y, z, level=0.): # -> list
+    """
+    contour lines z = level of the grid z of shape (len(y), len(x)).
+    returns list of (n, 2) arrays of points
+    """
+    points, segments = marching_squares(x, y, z, level)
+    return chain_segments(points, segments)
@@ -0,0 +1,59 @@
+import pandas as pd
+import argparse
+import os
+import sys
+
+
+"""
+Convert limit, theory and compare .csv files to Parquet or Arrow (Feather) files.
+The columnar files are read memory-mapped by graph_loader.read_columns, only with the columns
+and mass range a plot needs. Parquet files are written in row groups sorted by mass,
+so that a mass range only reads the overlapping row groups.
+
+usage: python plotting/convert_columns.py limits.csv theory.csv [-f parquet|arrow] [-o output_dir]
+"""
+
+FORMATS = {'parquet': '.parquet', 'arrow': '.arrow'}
+
+
+def convert(file_name, fmt='parquet', output=None, row_group_size=65536): # -> str
+    """
+    convert a .csv file to fmt ('parquet' or 'arrow').
+    returns name of the written file
+    """
+    import pyarrow as pa
+    df = pd.read_csv(file_name)
+    if 'mass' in df.columns:
+        df = df.sort_values('mass', kind='mergesort').reset_index(drop=True)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    if output is None:
+        output = os.path.splitext(file_name)[0] + FORMATS[fmt]
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+        pq.write_table(table, output, row_group_size=row_group_size)
+    else:
+        # uncompressed, so that the columns can be used directly from the memory map
+        import pyarrow.feather as feather
+        feather.write_feather(table, output, compression='uncompressed')
+    return output
+
+
+def main(argv=None): # -> int
+    parser = argparse.ArgumentParser(description='Convert limit .csv files to Parquet or Arrow files.')
+    parser.add_argument('files', nargs='+', help='.csv files')
+    parser.add_argument('-f', '--format', default='parquet', choices=sorted(FORMATS), help='output format (default: parquet)')
+    parser.add_argument('-o', '--output-dir', default=None, help='output directory (default: next to the input file)')
+    args = parser.parse_args(argv)
+
+    for file_name in args.files:
+        output = None
+        if args.output_dir is not None:
+            if not os.path.isdir(args.output_dir):
+                os.makedirs(args.output_dir)
+            output = os.path.join(args.output_dir, os.path.splitext(os.path.basename(file_name))[0] + FORMATS[args.format])
+        print('{} -> {}'.format(file_name, convert(file_name, args.format, output)))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
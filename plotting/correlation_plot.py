@@ -0,0 +1,192 @@
+import graph_loader
+import render_context
+import fit_diagnostics
+import instrumentation
+import numpy as np
+import utils
+import os
+import re
+import sys
+
+
+"""
+Create correlation matrix plots of the parameters of a fit result (fit_s or fit_b) in the fit diagnostics output.
+The parameters can be filtered by a regular expression, reduced to the ones with the strongest correlations
+(above a threshold or the top N) and ordered by hierarchical clustering (requires scipy).
+Large matrices are down-sampled to at most max_bins x max_bins cells for drawing, each cell shows
+the strongest correlation of its block, so a 2000 x 2000 matrix stays fast to draw and small as .pdf.
+
+usage: python plotting/correlation_plot.py correlation_config.yml
+"""
+
+# imported when the plot is drawn, so that a config can be checked without loading ROOT (--dry-run)
+ROOT = utils.LazyModule('ROOT')
+root_cosmetics = utils.LazyModule('root_cosmetics')
+
+
+def correlation_strength(corr): # -> np.ndarray
+    """
+    largest absolute correlation of every parameter with any other parameter
+    """
+    off_diagonal = np.abs(corr)
+    np.fill_diagonal(off_diagonal, 0.)
+    return off_diagonal.max(axis=1) if len(corr) else np.zeros(0)
+
+
+def select_parameters(names, corr, pattern=None, threshold=None, top_n=None): # -> np.ndarray
+    """
+    select the parameters to plot.
+    parameters whose name does not match the regular expression pattern are dropped,
+    then only the ones with a correlation of at least threshold to another parameter are kept
+    and of these the top_n with the strongest correlations.
+    returns array of indices in the order of the fit result
+    """
+    indices = np.arange(len(names))
+    if pattern is not None:
+        regex = re.compile(pattern)
+        indices = np.array([i for i in indices if regex.search(names[i])], dtype=int)
+    strength = correlation_strength(corr[np.ix_(indices, indices)])
+    if threshold is not None:
+        indices, strength = indices[strength >= threshold], strength[strength >= threshold]
+    if top_n is not None and len(indices) > top_n:
+        # selection without sorting all parameters
+        keep = np.argpartition(-strength, top_n - 1)[:top_n]
+        indices = indices[np.sort(keep)]
+    return indices
+
+
+def cluster_order(corr, method='average'): # -> np.ndarray
+    """
+    order of the parameters from hierarchical clustering with the distance 1 - |correlation|,
+    so strongly (anti-)correlated parameters end up next to each other
+    """
+    if len(corr) < 3:
+        return np.arange(len(corr))
+    from scipy.cluster import hierarchy
+    from scipy.spatial import distance
+    dist = 1. - np.abs(corr)
+    np.fill_diagonal(dist, 0.)
+    dist = np.clip((dist + dist.T) / 2., 0., None)
+    return hierarchy.leaves_list(hierarchy.linkage(distance.squareform(dist, checks=False), method))
+
+
+def downsample(corr, max_bins): # -> tuple
+    """
+    reduce the matrix to at most max_bins x max_bins cells, each cell takes the value of largest magnitude
+    of its block of k x k parameters (the last block can be smaller). the correlations of the parameters
+    with themselves are left out, so the diagonal cells show the strongest correlation within their block.
+    returns the reduced matrix and k
+    """
+    n = len(corr)
+    k = int(np.ceil(n / float(max_bins))) if max_bins and n > max_bins else 1
+    if k == 1:
+        return corr, 1
+    m = int(np.ceil(n / float(k)))
+    padded = np.zeros((m * k, m * k))
+    padded[:n, :n] = corr
+    np.fill_diagonal(padded, 0.)
+    blocks = padded.reshape(m, k, m, k).transpose(0, 2, 1, 3).reshape(m, m, k * k)
+    largest = np.abs(blocks).argmax(axis=2)
+    return np.take_along_axis(blocks, largest[:, :, np.newaxis], axis=2)[:, :, 0], k
+
+
+def make_matrix_hist(name, matrix, labels=None): # -> TH2D
+    """
+    create TH2D with one bin per matrix entry, the first row at the top, filled in one call
+    """
+    n = len(matrix)
+    h = ROOT.TH2D(name, name, n, 0, n, n, 0, n)
+    h.SetDirectory(0)
+    content = np.zeros((n + 2, n + 2))
+    content[1:-1, 1:-1] = matrix[::-1]
+    h.SetContent(graph_loader.as_buffer(content.ravel()))
+    if labels is not None:
+        for i, label in enumerate(labels):
+            h.GetXaxis().SetBinLabel(i + 1, label)
+            h.GetYaxis().SetBinLabel(n - i, label)
+    return h
+
+
+def make_correlation_plot(config, style=None): # -> str
+    """
+    create correlation matrix plot from a config dict with the fit diagnostics output as 'file_name'.
+    an existing TStyle can be passed to avoid building the CMS style again.
+    returns file name of the plot
+    """
+    file_name = config.get('file_name')                 # fit diagnostics file
+    fit = config.get('fit','fit_s')                     # fit result: 'fit_s' or 'fit_b'
+    pattern = config.get('filter')                      # only use parameters whose name matches this regular expression
+    threshold = config.get('threshold')                 # only use parameters with a correlation of at least this to another one
+    top_n = config.get('top_n')                         # only use the top_n parameters with the strongest correlations
+    b_cluster = config.get('b_cluster',False)           # order the parameters by hierarchical clustering (requires scipy)
+    max_bins = config.get('max_bins',200)               # down-sample larger matrices to max_bins x max_bins cells
+    max_labels = config.get('max_labels',60)            # draw the parameter names if there are at most this many cells
+    palette = config.get('palette',87)                  # ROOT colour palette of the matrix (default: kLightTemperature)
+
+    profile = instrumentation.sequence(plot='correlation', input=file_name)
+    profile.next('read')
+    names, corr = fit_diagnostics.read_correlation_matrix(file_name, fit)
+    profile.next('select')
+    indices = select_parameters(names, corr, pattern, threshold, top_n)
+    if len(indices) == 0:
+        raise ValueError('{}: no parameters of {} selected'.format(file_name, fit))
+    corr = corr[np.ix_(indices, indices)]
+    if b_cluster:
+        order = cluster_order(corr)
+        indices, corr = indices[order], corr[np.ix_(order, order)]
+    labels = [names[i] for i in indices]
+    matrix, k = downsample(corr, max_bins)
+
+    profile.next('draw')
+    with render_context.RenderContext(style, 'correlation') as context:
+        c = context.canvas('correlation_canvas',800,800)
+        pad = context.keep(ROOT.TPad(context.name('pad'),'pad',0.01,0.01,0.99,0.99))
+        b_labels = len(matrix) <= max_labels and k == 1
+        margin = 0.25 if b_labels else 0.08
+        pad.SetTopMargin(0.06)
+        pad.SetBottomMargin(margin)
+        pad.SetLeftMargin(margin)
+        pad.SetRightMargin(0.14)
+        pad.Draw()
+        pad.cd()
+        h = make_matrix_hist(context.name('h_correlation'), matrix, labels if b_labels else None)
+        h.SetMinimum(-1.)
+        h.SetMaximum(1.)
+        h.GetZaxis().SetTitle('correlation')
+        if b_labels:
+            h.GetXaxis().LabelsOption('v')
+            h.GetXaxis().SetLabelSize(min(0.025, 1.2 / len(matrix)))
+            h.GetYaxis().SetLabelSize(min(0.025, 1.2 / len(matrix)))
+        else:
+            h.GetXaxis().SetTitle('parameter' if k == 1 else 'parameter (blocks of {})'.format(k))
+            h.GetYaxis().SetTitle('parameter' if k == 1 else 'parameter (blocks of {})'.format(k))
+        # the palette is set only while the matrix is painted and the current palette is restored afterwards,
+        # so other plots keep theirs. the colours are copied, the array is kept alive with the plot
+        previous_palette = ROOT.TArrayI(ROOT.gStyle.GetNumberOfColors())
+        for i in range(previous_palette.GetSize()):
+            previous_palette[i] = ROOT.gStyle.GetColorPalette(i)
+        set_palette = ROOT.TExec(context.name('set_palette'), 'gStyle->SetPalette({});'.format(palette))
+        reset_palette = ROOT.TExec(context.name('reset_palette'), 'gStyle->SetPalette({}, ((TArrayI*){:#x})->GetArray());'.format(
+            previous_palette.GetSize(), ROOT.addressof(previous_palette)))
+        h.Draw('AXIS')
+        set_palette.Draw()
+        h.Draw('COLZ SAME')
+        reset_palette.Draw()
+
+        profile.next('texts')
+        root_cosmetics.draw_texts(pad, config)
+        profile.next('print')
+        pad.RedrawAxis()
+        data = {'labels': labels, 'correlation': corr, 'block_size': k}
+        plot_file_name = context.save(c, config, os.path.splitext(file_name)[0] + '_correlation_' + fit, data,
+                                      [h, set_palette, reset_palette, previous_palette])
+    profile.done()
+    return plot_file_name
+
+
+if __name__ == '__main__':
+    config = utils.get_config(sys.argv[1])
+    if '--dry-run' in sys.argv[2:]:
+        import validate
+        sys.exit(validate.dry_run(config, 'correlation', sys.argv[1]))
+    make_correlation_plot(config)
@@ -0,0 +1,267 @@
+import utils
+import numpy as np
+import json
+import os
+import sys
+import itertools
+import queue
+import threading
+
+
+"""
+Save canvases in several formats, optionally through a background export queue.
+
+The formats are set in the config with 'output_formats' (default ['pdf']):
+    pdf, eps, png (with 'png_dpi'), root (canvas in a .root file) and json (plotted arrays).
+The output files are <output_dir>/<output_name>.<format>, where output_name defaults to a name given by the plot.
+
+With start_background(), the files are written by a background thread, so that the inputs of the next plot
+can already be read while the previous one is written. The canvas and all objects drawn on it are handed over to
+the queue and must not be changed afterwards. ROOT graphics (gStyle, gPad, the PostScript/PDF output) are
+not thread-safe, so writing and drawing (see render_context.py) take the same lock and never overlap.
+"""
+
+# imported when the first canvas is written, so that the formats can be checked without loading ROOT
+ROOT = utils.LazyModule('ROOT')
+
+FORMATS = ['pdf', 'eps', 'png', 'root', 'json']
+PAGE_FORMATS = ['pdf', 'json'] # formats of plots with several pages
+ROOT_DPI = 72. # nominal resolution of a canvas in pixels per inch
+
+_queue = None # background export queue, None if files are written directly
+lock = threading.RLock() # serializes ROOT graphics: drawing of the plots and writing of the canvases
+
+
+def get_output_name(config, default_name): # -> str
+    """
+    get output file name without extension from 'output_dir' and 'output_name' of the config
+    """
+    output_dir = config.get('output_dir', '')
+    output_name = config.get('output_name', default_name)
+    return os.path.join(output_dir, output_name)
+
+
+def get_formats(config): # -> list
+    """
+    get list of output formats from the config.
+    raises ValueError for unknown formats
+    """
+    formats = config.get('output_formats', ['pdf'])
+    if not isinstance(formats, list):
+        formats = [formats]
+    unknown = [fmt for fmt in formats if fmt not in FORMATS]
+    if unknown:
+        raise ValueError('unknown output format(s) {}, choose from {}'.format(', '.join(unknown), ', '.join(FORMATS)))
+    return formats
+
+
+def write_json(file_name, data): # -> None
+    """
+    write dict of arrays and numbers to a .json file, NaN and infinite values (e.g. empty grid cells) are written as null
+    """
+    def convert(value):
+        if isinstance(value, dict):
+            return dict((str(k), convert(v)) for k, v in value.items())
+        if isinstance(value, (list, tuple)):
+            return [convert(v) for v in value]
+        if isinstance(value, (np.ndarray, np.generic)):
+            return convert(value.tolist())
+        if isinstance(value, float) and not np.isfinite(value):
+            return None
+        return value
+    with open(file_name, 'w') as f:
+        json.dump(convert(data), f, indent=1, allow_nan=False)
+
+
+def write_files(canvas, output_name, formats, png_dpi=None, data=None, style=None): # -> list
+    """
+    write the canvas in all formats, holding the lock and with the style the canvas was drawn with.
+    returns list of written file names
+    """
+    output_dir = os.path.dirname(output_name)
+    if output_dir and not os.path.isdir(output_dir):
+        os.makedirs(output_dir)
+    file_names = []
+    with lock:
+        previous_style = ROOT.gStyle if style is not None else None
+        if style is not None:
+            style.cd()
+        try:
+            for fmt in formats:
+                file_name = str(output_name + '.' + fmt)
+                if fmt == 'png' and png_dpi:
+                    w, h = canvas.GetWw(), canvas.GetWh()
+                    scale = png_dpi / ROOT_DPI
+                    canvas.SetCanvasSize(int(w * scale), int(h * scale))
+                    canvas.Print(file_name)
+                    canvas.SetCanvasSize(w, h)
+                elif fmt == 'root':
+                    f = ROOT.TFile(file_name, 'RECREATE')
+                    canvas.Write()
+                    f.Close()
+                elif fmt == 'json':
+                    write_json(file_name, data or {})
+                else:
+                    canvas.Print(file_name)
+                file_names.append(file_name)
+        finally:
+            if previous_style is not None:
+                previous_style.cd()
+    return file_names
+
+
+def write_pages(canvas, output_name, formats, pages, data=None): # -> list
+    """
+    write a plot with several pages into one file per format.
+    pages is an iterable that draws the next page on the canvas in every step, it is only run for the .pdf output.
+    the pages are written directly, also with background export, because they share the canvas.
+    raises ValueError for formats that cannot hold several pages (anything but pdf and json).
+    returns list of written file names
+    """
+    unsupported = [fmt for fmt in formats if fmt not in PAGE_FORMATS]
+    if unsupported:
+        raise ValueError('output format(s) {} cannot hold several pages, choose from {}'.format(
+            ', '.join(unsupported), ', '.join(PAGE_FORMATS)))
+    output_dir = os.path.dirname(output_name)
+    if output_dir and not os.path.isdir(output_dir):
+        os.makedirs(output_dir)
+    file_names = []
+    with lock:
+        for fmt in formats:
+            file_name = str(output_name + '.' + fmt)
+            if fmt == 'json':
+                write_json(file_name, data or {})
+            else:
+                canvas.Print(file_name + '[')
+                for _ in pages:
+                    canvas.Print(file_name)
+                canvas.Print(file_name + ']')
+            file_names.append(file_name)
+    return file_names
+
+
+class ExportQueue(object):
+    """
+    background thread that writes the queued canvases one after the other.
+    at most max_pending canvases wait in the queue, further submits block until one is written.
+    """
+
+    def __init__(self, max_pending=2):
+        ROOT.EnableThreadSafety()
+        self.queue = queue.Queue(max_pending)
+        self.errors = []
+        self.counter = itertools.count()
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _run(self): # -> None
+        while True:
+            job = self.queue.get()
+            if job is None:
+                self.queue.task_done()
+                return
+            output_name = job[1]
+            try:
+                with lock:
+                    try:
+                        write_files(*job[:6])
+                    finally:
+                        # the canvas and the objects drawn on it are deleted here, while the lock is held
+                        job = None
+            except Exception as exc:
+                self.errors.append('{}: {}'.format(output_name, exc))
+                sys.stderr.write('ERROR: export of {} failed ({})\n'.format(output_name, exc))
+            finally:
+                self.queue.task_done()
+
+    def submit(self, canvas, output_name, formats, png_dpi=None, data=None, keep=(), style=None): # -> None
+        """
+        queue a canvas for writing. keep holds the objects drawn on the canvas until it is written.
+        blocks while max_pending canvases wait, so it must not be called while holding the lock.
+        """
+        # rename the canvas, a new canvas with the same name would delete it before it is written
+        with lock:
+            canvas.SetName('{}_export_{}'.format(canvas.GetName(), next(self.counter)))
+        self.queue.put((canvas, output_name, formats, png_dpi, data, style, list(keep)))
+
+    def join(self): # -> list
+        """
+        wait until all queued canvases are written.
+        returns list of error messages of failed exports since the last join
+        """
+        self.queue.join()
+        errors, self.errors = self.errors, []
+        return errors
+
+    def close(self): # -> list
+        """
+        write the remaining canvases and stop the thread.
+        returns list of error messages
+        """
+        errors = self.join()
+        self.queue.put(None)
+        self.thread.join()
+        return errors
+
+
+def start_background(max_pending=2): # -> ExportQueue
+    """
+    write all following exports in a background thread
+    """
+    global _queue
+    if _queue is None:
+        _queue = ExportQueue(max_pending)
+    return _queue
+
+
+def stop_background(): # -> list
+    """
+    write the remaining exports and go back to writing directly.
+    returns list of error messages of failed background exports
+    """
+    global _queue
+    errors = []
+    if _queue is not None:
+        errors = _queue.close()
+        _queue = None
+    return errors
+
+
+def join_background(): # -> list
+    """
+    wait until the pending background exports are written.
+    returns list of error messages of the exports that failed since the last join
+    """
+    return _queue.join() if _queue is not None else []
+
+
+def in_background(): # -> bool
+    """
+    returns True if the exports are written by the background queue
+    """
+    return _queue is not None
+
+
+def output_file_name(config, default_name): # -> str
+    """
+    file name of the first output format
+    """
+    return str(get_output_name(config, default_name) + '.' + get_formats(config)[0])
+
+
+def save(canvas, config, default_name, data=None, keep=(), style=None): # -> str
+    """
+    save the canvas in all formats of the config, in the background if start_background() was called.
+    data is the dict of plotted arrays written to the .json output, keep the objects drawn on the canvas
+    and style the style they were drawn with.
+    returns file name of the first format
+    """
+    output_name = get_output_name(config, default_name)
+    formats = get_formats(config)
+    png_dpi = config.get('png_dpi')
+    if _queue is not None:
+        _queue.submit(canvas, output_name, formats, png_dpi, data, keep, style)
+    else:
+        write_files(canvas, output_name, formats, png_dpi, data, style)
+    return output_file_name(config, default_name)
@@ -0,0 +1,127 @@
+import utils
+import numpy as np
+
+
+"""
+Read fit results from the fitDiagnostics output of combine.
+"""
+
+# imported when a file is read
+ROOT = utils.LazyModule('ROOT')
+pd = utils.LazyModule('pandas')
+
+
+def get_fit_result(f, name): # -> RooFitResult
+    """
+    get a RooFitResult (e.g. 'fit_b', 'fit_s') from an open fit diagnostics file.
+    raises KeyError if it does not exist
+    """
+    fit_result = f.Get(name)
+    if not fit_result:
+        raise KeyError('{}: fit result {} not found'.format(f.GetName(), name))
+    return fit_result
+
+
+def parameter_arrays(parameters): # -> dict
+    """
+    get names, values and errors of all parameters of a RooArgList/RooArgSet in one pass.
+    returns dict with 'name' (list) and arrays 'value', 'error', 'error_low' and 'error_high'
+    (error_low is negative, both are the symmetric error if the parameter has no asymmetric errors)
+    """
+    parameters = ROOT.RooArgList(parameters)
+    n = parameters.getSize()
+    names = []
+    values = np.empty(n)
+    errors = np.empty(n)
+    errors_low = np.empty(n)
+    errors_high = np.empty(n)
+    for i in range(n):
+        p = parameters.at(i)
+        names.append(p.GetName())
+        values[i] = p.getVal()
+        errors[i] = p.getError()
+        if p.hasAsymError():
+            errors_low[i] = p.getErrorLo()
+            errors_high[i] = p.getErrorHi()
+        else:
+            errors_low[i] = -errors[i]
+            errors_high[i] = errors[i]
+    return {'name': names, 'value': values, 'error': errors, 'error_low': errors_low, 'error_high': errors_high}
+
+
+def compute_pulls(prefit, postfit): # -> dict
+    """
+    compute pulls (post - pre) / sigma_pre and constraints sigma_post / sigma_pre of the parameters in postfit,
+    matched to prefit by name. parameters without prefit value (e.g. r) are dropped.
+    returns dict with 'name' (list) and arrays 'pull', 'pull_up', 'pull_down' and 'constraint'
+    """
+    prefit_index = dict((name, i) for i, name in enumerate(prefit['name']))
+    post = [i for i, name in enumerate(postfit['name']) if name in prefit_index]
+    pre = np.array([prefit_index[postfit['name'][i]] for i in post], dtype=int)
+    post = np.array(post, dtype=int)
+    sigma_pre = prefit['error'][pre]
+    sigma_pre = np.where(sigma_pre > 0, sigma_pre, 1.)
+    return {
+        'name': [postfit['name'][i] for i in post],
+        'pull': (postfit['value'][post] - prefit['value'][pre]) / sigma_pre,
+        'pull_up': postfit['error_high'][post] / sigma_pre,
+        'pull_down': -postfit['error_low'][post] / sigma_pre,
+        'constraint': postfit['error'][post] / sigma_pre,
+    }
+
+
+def read_nuisance_pulls(file_name): # -> pd.DataFrame
+    """
+    read the nuisance pulls of the background only and signal+background fits from a fit diagnostics file.
+    returns DataFrame with the columns of the nuisance pull .csv format
+    (label, postfit_b, postfit_b_up, postfit_b_down, postfit_s, postfit_s_up, postfit_s_down)
+    and constraint_b, constraint_s.
+    as in the .csv files, the _up column is the error drawn to the left of the pull (towards smaller values)
+    and the _down column the error drawn to the right
+    """
+    f = ROOT.TFile(file_name)
+    try:
+        prefit = f.Get('nuisances_prefit')
+        if not prefit:
+            raise KeyError('{}: nuisances_prefit not found'.format(file_name))
+        prefit = parameter_arrays(prefit)
+        pulls_b = compute_pulls(prefit, parameter_arrays(get_fit_result(f, 'fit_b').floatParsFinal()))
+        pulls_s = compute_pulls(prefit, parameter_arrays(get_fit_result(f, 'fit_s').floatParsFinal()))
+    finally:
+        f.Close()
+    # only keep nuisances present in both fits, in the order of the background only fit
+    index_s = dict((name, i) for i, name in enumerate(pulls_s['name']))
+    b = np.array([i for i, name in enumerate(pulls_b['name']) if name in index_s], dtype=int)
+    s = np.array([index_s[pulls_b['name'][i]] for i in b], dtype=int)
+    return pd.DataFrame({
+        'label': [pulls_b['name'][i] for i in b],
+        'postfit_b': pulls_b['pull'][b],
+        'postfit_b_up': pulls_b['pull_down'][b],
+        'postfit_b_down': pulls_b['pull_up'][b],
+        'postfit_s': pulls_s['pull'][s],
+        'postfit_s_up': pulls_s['pull_down'][s],
+        'postfit_s_down': pulls_s['pull_up'][s],
+        'constraint_b': pulls_b['constraint'][b],
+        'constraint_s': pulls_s['constraint'][s],
+    }, columns=['label', 'postfit_b', 'postfit_b_up', 'postfit_b_down', 'postfit_s', 'postfit_s_up', 'postfit_s_down',
+                'constraint_b', 'constraint_s'])
+
+
+def read_correlation_matrix(file_name, fit='fit_s'): # -> tuple
+    """
+    read the correlation matrix of the floating parameters of a fit result (e.g. 'fit_s', 'fit_b')
+    from a fit diagnostics file, copied from the matrix buffer in one call.
+    returns list of parameter names and (n, n) array
+    """
+    f = ROOT.TFile(file_name)
+    try:
+        fit_result = get_fit_result(f, fit)
+        names = parameter_arrays(fit_result.floatParsFinal())['name']
+        matrix = fit_result.correlationMatrix()
+        n = matrix.GetNrows()
+        if n != len(names):
+            raise ValueError('{}: correlation matrix of {} has {} rows for {} parameters'.format(file_name, fit, n, len(names)))
+        corr = np.frombuffer(matrix.GetMatrixArray(), dtype=np.float64, count=n*n).reshape(n, n).copy()
+    finally:
+        f.Close()
+    return names, corr
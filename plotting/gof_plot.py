@@ -0,0 +1,215 @@
+import utils
+import graph_loader
+import render_context
+import config_matrix
+import instrumentation
+import root_io
+import numpy as np
+import multiprocessing
+import os
+import sys
+
+
+"""
+Create goodness-of-fit plots (saturated, KS or AD) from combine GoodnessOfFit outputs.
+The test statistics of the toys are read in chunks from all toy files (one worker process per file)
+and filled into a histogram with a fixed binning, the p-value is counted while filling.
+Only the histogram and the counters are kept, never the test statistics of all toys.
+
+usage: python plotting/gof_plot.py gof_config.yml
+"""
+
+# imported when the plot is drawn, so that a config can be checked without loading ROOT (--dry-run)
+ROOT = utils.LazyModule('ROOT')
+cosmetics = utils.LazyModule('root_cosmetics')
+
+
+class ToyHistogram(object):
+    """
+    counts of the toy test statistics in fixed bins, with under- and overflow,
+    and the number of toys at or above the observed value
+    """
+
+    def __init__(self, edges, observed):
+        self.edges = np.asarray(edges, dtype=np.float64)
+        self.observed = observed
+        self.counts = np.zeros(len(self.edges) + 1, dtype=np.int64)
+        self.n_toys = 0
+        self.n_above = 0
+
+    def update(self, values): # -> None
+        values = np.asarray(values, dtype=np.float64)
+        values = values[np.isfinite(values)]
+        # bin 0 is the underflow and bin len(edges) the overflow, as in a TH1
+        index = np.searchsorted(self.edges, values, side='right')
+        index[values == self.edges[-1]] = len(self.edges) - 1
+        self.counts += np.bincount(index, minlength=len(self.counts))
+        self.n_toys += len(values)
+        self.n_above += np.count_nonzero(values >= self.observed)
+
+    def merge(self, other): # -> None
+        self.counts += other.counts
+        self.n_toys += other.n_toys
+        self.n_above += other.n_above
+
+    def p_value(self): # -> float
+        return self.n_above / float(self.n_toys) if self.n_toys else np.nan
+
+
+def read_observed(file_name, chunk_size=100000): # -> float
+    """
+    observed test statistic of a GoodnessOfFit output without toys (entry with iToy == 0)
+    """
+    observed = np.nan
+    for chunk in root_io.iterate_tree(file_name, ['iToy', 'limit'], chunk_size):
+        data = chunk['limit'][chunk['iToy'] == 0]
+        if len(data):
+            observed = data[-1]
+    if not np.isfinite(observed):
+        raise ValueError('{}: no observed test statistic (iToy == 0) found'.format(file_name))
+    return observed
+
+
+def fill_toys(file_name, edges, observed, chunk_size=100000): # -> ToyHistogram
+    """
+    fill the toy test statistics (iToy > 0) of one file chunk by chunk into a ToyHistogram
+    """
+    hist = ToyHistogram(edges, observed)
+    for chunk in root_io.iterate_tree(file_name, ['iToy', 'limit'], chunk_size):
+        hist.update(chunk['limit'][chunk['iToy'] > 0])
+    return hist
+
+
+def _fill_toys_job(args): # -> tuple
+    file_name, edges, observed, chunk_size = args
+    try:
+        return file_name, fill_toys(file_name, edges, observed, chunk_size), None
+    except Exception as exc:
+        return file_name, None, '{}: {}'.format(type(exc).__name__, exc)
+
+
+def fill_all_toys(files, edges, observed, n_jobs=1, chunk_size=100000): # -> ToyHistogram
+    """
+    fill the toys of all files, one file per job in a pool of n_jobs worker processes.
+    files that cannot be read are reported and skipped.
+    returns ToyHistogram of all files
+    """
+    hist = ToyHistogram(edges, observed)
+    jobs = [(f, edges, observed, chunk_size) for f in files]
+    pool = multiprocessing.Pool(min(n_jobs, len(jobs))) if n_jobs > 1 and len(jobs) > 1 else None
+    try:
+        # the histogram of each file is merged as soon as it arrives, so that only a few are held at once
+        results = pool.imap_unordered(_fill_toys_job, jobs) if pool is not None else (_fill_toys_job(job) for job in jobs)
+        for file_name, file_hist, error in results:
+            if error is None:
+                hist.merge(file_hist)
+            else:
+                print('WARNING: skipping {} ({})'.format(file_name, error))
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    if hist.n_toys == 0:
+        raise ValueError('no toys found in {} files'.format(len(files)))
+    return hist
+
+
+def make_gof_plot(config, style=None): # -> str
+    """
+    create goodness-of-fit plot from a config dict.
+    an existing TStyle can be passed to avoid building the CMS style again.
+    returns file name of the plot
+    """
+    # --- Settings
+    observed_file = config.get('observed_file')                 # GoodnessOfFit output of the data
+    toy_files = config_matrix.expand_patterns(config.get('toy_files',[]))  # GoodnessOfFit outputs of the toys or glob patterns
+    algorithm = config.get('algorithm','saturated')             # name of the test statistic, shown in the legend
+    n_bins = config.get('n_bins',40)                            # number of histogram bins
+    hist_range = config.get('range')                            # [low, high] of the histogram, read from the toy files if not given
+    chunk_size = config.get('chunk_size',100000)                # tree entries read at once
+    n_jobs = config.get('n_jobs',1)                             # worker processes reading the files (not inside batch_plot.py)
+    x_axis_title = config.get('x_axis_title','Test statistic')  # x axis title
+    y_axis_title = config.get('y_axis_title','Toys')            # y axis title
+
+    profile = instrumentation.sequence(plot='gof', input=observed_file)
+
+    # --- Read observed value and fill toys
+    profile.next('read')
+    observed = read_observed(observed_file, chunk_size)
+    if hist_range is None:
+        low, high = root_io.branch_ranges(toy_files, ['limit'], chunk_size, n_jobs=n_jobs)['limit']
+        if not np.isfinite([low, high]).all():
+            raise ValueError('no toys found in {} files'.format(len(toy_files)))
+        hist_range = [min(low, observed), max(high, observed)]
+        # margin, so that the largest toy and the observed value are not on the edge
+        hist_range[1] += 0.05 * (hist_range[1] - hist_range[0])
+    edges = np.linspace(hist_range[0], hist_range[1], n_bins + 1)
+    toys = fill_all_toys(toy_files, edges, observed, n_jobs, chunk_size)
+    p_value = toys.p_value()
+
+    # --- Plotting
+    profile.next('draw')
+    with render_context.RenderContext(style, 'gof') as context:
+        c = context.canvas('gof_canvas',600,600)
+        pad = context.keep(cosmetics.SetupPad(context.name('pad')))
+        pad.Draw()
+        pad.cd()
+        counts = toys.counts.astype(np.float64)
+        h_toys = graph_loader.make_hist(context.name('h_gof_toys'), edges, counts[1:-1], np.sqrt(counts[1:-1]))
+        h_toys.SetBinContent(0, counts[0])
+        h_toys.SetBinContent(n_bins + 1, counts[-1])
+        h_toys.SetLineColor(ROOT.kBlack)
+        h_toys.SetLineWidth(2)
+        h_toys.SetFillColor(ROOT.kAzure - 9)
+        h_toys.SetFillStyle(1001)
+        h_toys.GetXaxis().SetTitle(x_axis_title)
+        h_toys.GetYaxis().SetTitle(y_axis_title)
+        h_toys.GetYaxis().SetTitleOffset(1.25)
+        h_toys.SetMaximum(counts[1:-1].max() * 1.5)
+        h_toys.SetMinimum(0.)
+        h_toys.Draw('HIST')
+        # shade the toys at or above the observed value
+        h_above = h_toys.Clone(context.name('h_gof_above'))
+        h_above.SetDirectory(0)
+        centres = (edges[1:] + edges[:-1]) / 2.
+        for i in np.flatnonzero(centres < observed):
+            h_above.SetBinContent(int(i) + 1, 0.)
+        h_above.SetFillColor(ROOT.kAzure + 2)
+        h_above.Draw('HIST SAME')
+        arrow = ROOT.TArrow(observed, counts[1:-1].max() * 0.6, observed, 0., 0.02, '|>')
+        arrow.SetLineColor(ROOT.kRed)
+        arrow.SetFillColor(ROOT.kRed)
+        arrow.SetLineWidth(3)
+        arrow.Draw()
+
+        leg = ROOT.TLegend(0.55,0.72,0.95,0.88)
+        leg.SetBorderSize(0)
+        leg.SetFillStyle(0)
+        leg.SetTextSize(0.033)
+        leg.SetTextFont(42)
+        leg.AddEntry(h_toys, 'Toys ({}, {})'.format(algorithm, toys.n_toys), 'f')
+        leg.AddEntry(arrow, 'Observed', 'l')
+        leg.Draw()
+        p_text = ROOT.TLatex(0.59, 0.66, 'p-value = {:.3f}'.format(p_value))
+        p_text.SetNDC()
+        p_text.SetTextFont(42)
+        p_text.SetTextSize(0.04)
+        p_text.Draw()
+
+        profile.next('texts')
+        cosmetics.draw_texts(pad, config)
+        profile.next('print')
+        pad.RedrawAxis()
+        print('observed: {:.4g}, p-value: {:.4g} ({} of {} toys)'.format(observed, p_value, toys.n_above, toys.n_toys))
+        data = {'edges': edges, 'counts': toys.counts, 'observed': observed, 'p_value': p_value, 'n_toys': toys.n_toys}
+        plot_file_name = context.save(c, config, os.path.splitext(observed_file)[0] + '_gof', data, [h_toys, h_above, arrow, leg, p_text])
+    profile.done()
+    return plot_file_name
+
+
+if __name__ == '__main__':
+    config = utils.get_config(sys.argv[1])
+    if '--dry-run' in sys.argv[2:]:
+        import validate
+        sys.exit(validate.dry_run(config, 'gof', sys.argv[1]))
+    make_gof_plot(config)
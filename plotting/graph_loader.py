@@ -0,0 +1,284 @@
+import utils
+import numpy as np
+import csv
+import os
+
+
+"""
+Build TGraphs from column buffers and get numpy views of histogram and graph buffers.
+All graphs are filled in one call from contiguous float64 arrays instead of
+calling SetPoint/SetPointError once per row.
+Inputs can be .csv files or, with pyarrow, Parquet (.parquet) and Arrow/Feather (.arrow, .feather) files,
+of which only the requested columns and mass range are read.
+"""
+
+# imported when first used, so that the column lists can be used without loading ROOT and pandas
+ROOT = utils.LazyModule('ROOT')
+pd = utils.LazyModule('pandas')
+
+LIMIT_COLUMNS = ['mass', 'central', 'observed', 'low_68', 'high_68', 'low_95', 'high_95']
+THEORY_COLUMNS = ['mass', 'central', 'err']
+COLUMNAR_EXTENSIONS = ['.parquet', '.arrow', '.feather']
+
+_cache = {} # absolute file name -> (modification time, DataFrame) of preloaded .csv files
+
+
+def preload(file_names): # -> int
+    """
+    read .csv files completely into the in-memory cache used by read_columns.
+    worker processes forked afterwards share the cache instead of reading the files again.
+    returns number of files read
+    """
+    n_read = 0
+    for file_name in file_names:
+        path = os.path.abspath(file_name)
+        mtime = os.path.getmtime(path)
+        if path in _cache and _cache[path][0] == mtime:
+            continue
+        _cache[path] = (mtime, pd.read_csv(path))
+        n_read += 1
+    return n_read
+
+
+def clear_cache(): # -> None
+    _cache.clear()
+
+
+def read_columns(file_name, columns, text_columns=(), mass_range=None): # -> dict
+    """
+    read the given columns of a .csv file (or Parquet/Arrow file, see read_columnar).
+    numeric columns are returned as contiguous float64 arrays, text columns as lists of strings.
+    with mass_range = (low, high), only the rows with low <= mass <= high are returned.
+    files preloaded with preload() are taken from the cache as long as they did not change.
+    raises KeyError if one of the columns is missing.
+    """
+    if os.path.splitext(file_name)[1].lower() in COLUMNAR_EXTENSIONS:
+        return read_columnar(file_name, columns, text_columns, mass_range)
+    wanted = set(columns) | set(text_columns) | (set(['mass']) if mass_range is not None else set())
+    cached = _cache.get(os.path.abspath(file_name)) if _cache else None
+    if cached is not None and cached[0] == os.path.getmtime(file_name):
+        df = cached[1]
+    else:
+        df = pd.read_csv(file_name, usecols=lambda c: c in wanted)
+    missing = [c for c in wanted if c not in df.columns]
+    if missing:
+        raise KeyError('{}: missing column(s) {}'.format(file_name, ', '.join(sorted(missing))))
+    if mass_range is not None:
+        df = df[(df['mass'] >= mass_range[0]) & (df['mass'] <= mass_range[1])]
+    arrays = {}
+    for c in columns:
+        arrays[c] = as_buffer(df[c].values)
+    for c in text_columns:
+        arrays[c] = [str(s).strip() for s in df[c].values]
+    return arrays
+
+
+def read_columnar(file_name, columns, text_columns=(), mass_range=None): # -> dict
+    """
+    read the given columns of a Parquet (.parquet) or Arrow IPC/Feather (.arrow, .feather) file.
+    the file is memory-mapped and only the requested columns are read, for Parquet files
+    row groups outside of mass_range are skipped.
+    returns the same dict of arrays as read_columns
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError('{}: reading Parquet/Arrow files needs pyarrow'.format(file_name))
+    names = list(columns) + list(text_columns)
+    read = names + (['mass'] if mass_range is not None and 'mass' not in names else [])
+    if file_name.lower().endswith('.parquet'):
+        available = pq.read_schema(file_name).names
+        filters = None if mass_range is None else [('mass', '>=', mass_range[0]), ('mass', '<=', mass_range[1])]
+        table = None
+    else:
+        table = pa.ipc.open_file(pa.memory_map(file_name)).read_all()
+        available = table.schema.names
+    missing = [c for c in read if c not in available]
+    if missing:
+        raise KeyError('{}: missing column(s) {}'.format(file_name, ', '.join(missing)))
+    if table is None:
+        table = pq.read_table(file_name, columns=read, filters=filters, memory_map=True)
+    else:
+        table = table.select(read)
+        if mass_range is not None:
+            mass = table.column('mass')
+            table = table.filter(pc.and_(pc.greater_equal(mass, mass_range[0]), pc.less_equal(mass, mass_range[1])))
+    arrays = {}
+    for c in columns:
+        arrays[c] = as_buffer(table.column(c).to_numpy())
+    for c in text_columns:
+        arrays[c] = [str(s).strip() for s in table.column(c).to_pylist()]
+    return arrays
+
+
+def column_names(file_name): # -> list
+    """
+    names of the columns of a .csv, Parquet or Arrow file, read from the header or schema only
+    """
+    extension = os.path.splitext(file_name)[1].lower()
+    if extension == '.parquet':
+        import pyarrow.parquet as pq
+        return pq.read_schema(file_name).names
+    if extension in COLUMNAR_EXTENSIONS:
+        import pyarrow as pa
+        return pa.ipc.open_file(pa.memory_map(file_name)).schema.names
+    with open(file_name) as f:
+        return next(csv.reader(f), [])
+
+
+def as_buffer(values): # -> np.ndarray
+    """
+    convert values to a contiguous float64 array that can be passed to ROOT as Double_t*
+    """
+    return np.ascontiguousarray(values, dtype=np.float64)
+
+
+def make_graph(x, y): # -> TGraph
+    """
+    create TGraph from x and y arrays.
+    """
+    x, y = as_buffer(x), as_buffer(y)
+    return ROOT.TGraph(len(x), x, y)
+
+
+def make_error_graph(x, y, ey, ex=None): # -> TGraphErrors
+    """
+    create TGraphErrors from arrays, x errors default to zero.
+    """
+    x, y, ey = as_buffer(x), as_buffer(y), as_buffer(ey)
+    ex = np.zeros_like(x) if ex is None else as_buffer(ex)
+    return ROOT.TGraphErrors(len(x), x, y, ex, ey)
+
+
+def make_asymm_error_graph(x, y, exl, exh, eyl, eyh): # -> TGraphAsymmErrors
+    """
+    create TGraphAsymmErrors from arrays.
+    errors can be arrays or scalars, scalars are broadcast to all points.
+    """
+    x, y = as_buffer(x), as_buffer(y)
+    exl, exh, eyl, eyh = [as_buffer(np.broadcast_to(e, x.shape)) for e in (exl, exh, eyl, eyh)]
+    return ROOT.TGraphAsymmErrors(len(x), x, y, exl, exh, eyl, eyh)
+
+
+def make_hist(name, edges, contents, errors): # -> TH1D
+    """
+    create TH1D with the given bin edges, contents and errors are filled in one call.
+    the histogram is not attached to a file.
+    """
+    edges = as_buffer(edges)
+    n = len(edges) - 1
+    h = ROOT.TH1D(name, name, n, edges)
+    h.SetDirectory(0)
+    h.Sumw2()
+    h.SetContent(as_buffer(np.concatenate([[0.], contents, [0.]])))
+    h.SetError(as_buffer(np.concatenate([[0.], errors, [0.]])))
+    return h
+
+
+def get_graph(file_name, mass_range=None): # -> TGraph
+    """
+    create TGraph from .csv file.
+    returns TGraph
+    """
+    cols = read_columns(file_name, ['mass', 'central'], mass_range=mass_range)
+    return make_graph(cols['mass'], cols['central'])
+
+
+def get_error_graph(file_name, mass_range=None): # -> TGraphErrors
+    """
+    create TGraphErrors from .csv file.
+    returns TGraphErrors
+    """
+    cols = read_columns(file_name, THEORY_COLUMNS, mass_range=mass_range)
+    return make_error_graph(cols['mass'], cols['central'], cols['err'])
+
+
+def get_limit_graphs(file_name, mass_range=None): # -> dict
+    """
+    create expected, observed and 68%/95% band graphs from a limit .csv file.
+    returns dict of graphs and the column arrays they were built from
+    """
+    cols = read_columns(file_name, LIMIT_COLUMNS, mass_range=mass_range)
+    return make_limit_graphs(cols), cols
+
+
+def make_limit_graphs(cols): # -> dict
+    """
+    create expected, observed and 68%/95% band graphs from the column arrays of a limit .csv file.
+    returns dict of graphs
+    """
+    zeros = np.zeros_like(cols['mass'])
+    graphs = {
+        'expected': make_graph(cols['mass'], cols['central']),
+        'observed': make_graph(cols['mass'], cols['observed']),
+        'expected_68': make_asymm_error_graph(cols['mass'], cols['central'], zeros, zeros, cols['low_68'], cols['high_68']),
+        'expected_95': make_asymm_error_graph(cols['mass'], cols['central'], zeros, zeros, cols['low_95'], cols['high_95']),
+    }
+    return graphs
+
+
+def hist_to_arrays(h): # -> dict
+    """
+    get bin edges, contents and errors of a TH1 as numpy arrays without under- and overflow bins.
+    contents and errors of TH1F/TH1D are views of the histogram buffers, they are only valid as long as h exists.
+    returns dict with 'edges', 'contents' and 'errors'
+    """
+    n = h.GetNbinsX()
+    axis = h.GetXaxis()
+    if axis.GetXbins().GetSize() == n + 1:
+        edges = np.frombuffer(axis.GetXbins().GetArray(), dtype=np.float64, count=n+1).copy()
+    else:
+        edges = np.linspace(axis.GetXmin(), axis.GetXmax(), n+1)
+    if isinstance(h, ROOT.TArrayD):
+        contents = np.frombuffer(h.GetArray(), dtype=np.float64, count=n+2)[1:-1]
+    elif isinstance(h, ROOT.TArrayF):
+        contents = np.frombuffer(h.GetArray(), dtype=np.float32, count=n+2)[1:-1]
+    else:
+        contents = np.array([h.GetBinContent(i) for i in range(1, n+1)])
+    if h.GetSumw2N() == n + 2:
+        errors = np.sqrt(np.frombuffer(h.GetSumw2().GetArray(), dtype=np.float64, count=n+2)[1:-1])
+    else:
+        errors = np.sqrt(np.abs(contents))
+    return {'edges': edges, 'contents': contents, 'errors': errors}
+
+
+def hist2d_to_arrays(h): # -> dict
+    """
+    get the bin contents of a TH2 as (ny, nx) numpy array without under- and overflow bins and the x bin labels.
+    the contents of TH2F/TH2D are views of the histogram buffer, they are only valid as long as h exists.
+    returns dict with 'contents' and 'labels'
+    """
+    nx, ny = h.GetNbinsX(), h.GetNbinsY()
+    if isinstance(h, ROOT.TArrayD):
+        contents = np.frombuffer(h.GetArray(), dtype=np.float64, count=(nx+2)*(ny+2))
+    elif isinstance(h, ROOT.TArrayF):
+        contents = np.frombuffer(h.GetArray(), dtype=np.float32, count=(nx+2)*(ny+2))
+    else:
+        contents = np.array([h.GetBinContent(i) for i in range((nx+2)*(ny+2))])
+    # global bin = x + (nx + 2) * y
+    contents = contents.reshape(ny+2, nx+2)[1:-1, 1:-1]
+    labels = [h.GetXaxis().GetBinLabel(i) for i in range(1, nx+1)]
+    return {'contents': contents, 'labels': labels}
+
+
+def graph_to_arrays(g): # -> dict
+    """
+    get points and y errors of a TGraph as numpy views of the graph buffers.
+    for TGraphErrors the low and high y errors are the same, for a plain TGraph they are zero.
+    returns dict with 'x', 'y', 'eyl' and 'eyh'
+    """
+    n = g.GetN()
+    if n == 0:
+        return dict((k, np.zeros(0)) for k in ('x', 'y', 'eyl', 'eyh'))
+    x = np.frombuffer(g.GetX(), dtype=np.float64, count=n)
+    y = np.frombuffer(g.GetY(), dtype=np.float64, count=n)
+    if isinstance(g, ROOT.TGraphAsymmErrors):
+        eyl = np.frombuffer(g.GetEYlow(), dtype=np.float64, count=n)
+        eyh = np.frombuffer(g.GetEYhigh(), dtype=np.float64, count=n)
+    elif isinstance(g, ROOT.TGraphErrors):
+        eyl = eyh = np.frombuffer(g.GetEY(), dtype=np.float64, count=n)
+    else:
+        eyl = eyh = np.zeros(n)
+    return {'x': x, 'y': y, 'eyl': eyl, 'eyh': eyh}
@@ -0,0 +1,141 @@
+import graph_loader
+import argparse
+import fnmatch
+import hashlib
+import os
+import sqlite3
+import sys
+
+
+"""
+Persistent SQLite index of harvested combine output files.
+For each file the path, size, mtime and content hash are stored together with the extracted limits,
+so that a re-harvest only has to read the files that changed.
+
+usage: python plotting/harvest_cache.py info cache.sqlite
+       python plotting/harvest_cache.py invalidate cache.sqlite ['*mH2400*' ...]
+       python plotting/harvest_cache.py compact cache.sqlite
+"""
+
+VALUE_COLUMNS = ['name'] + graph_loader.LIMIT_COLUMNS
+
+
+def file_hash(file_name, block_size=1 << 20): # -> str
+    """
+    sha1 of the file content
+    """
+    sha = hashlib.sha1()
+    with open(file_name, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+class HarvestCache(object):
+    """
+    cache of harvested limits keyed on the absolute file path.
+    an entry is valid if size and mtime are unchanged, or if only the mtime changed but the content hash is the same.
+    """
+
+    def __init__(self, file_name):
+        self.file_name = file_name
+        self.db = sqlite3.connect(file_name)
+        self.db.execute('CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, size INTEGER, mtime REAL, hash TEXT, {})'.format(
+            ', '.join('{} {}'.format(c, 'TEXT' if c == 'name' else 'REAL') for c in VALUE_COLUMNS)))
+        self.db.commit()
+
+    def close(self): # -> None
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def lookup(self, files): # -> tuple
+        """
+        split files into cached and stale ones.
+        returns (list of cached rows as dicts, list of files that have to be read again)
+        """
+        query = 'SELECT size, mtime, hash, {} FROM files WHERE path = ?'.format(', '.join(VALUE_COLUMNS))
+        rows = []
+        stale = []
+        for file_name in files:
+            path = os.path.abspath(file_name)
+            entry = self.db.execute(query, (path,)).fetchone()
+            st = os.stat(path)
+            if entry is not None:
+                size, mtime, sha = entry[:3]
+                valid = size == st.st_size and mtime == st.st_mtime
+                if not valid and size == st.st_size and sha == file_hash(path):
+                    # touched but unchanged file, just remember the new mtime
+                    self.db.execute('UPDATE files SET mtime = ? WHERE path = ?', (st.st_mtime, path))
+                    valid = True
+                if valid:
+                    rows.append(dict(zip(VALUE_COLUMNS, entry[3:])))
+                    continue
+            stale.append(file_name)
+        self.db.commit()
+        return rows, stale
+
+    def update(self, file_name, row): # -> None
+        """
+        store the harvested row of a file together with its size, mtime and hash
+        """
+        path = os.path.abspath(file_name)
+        st = os.stat(path)
+        self.db.execute('INSERT OR REPLACE INTO files VALUES ({})'.format(', '.join(['?'] * (4 + len(VALUE_COLUMNS)))),
+                        [path, st.st_size, st.st_mtime, file_hash(path)] + [row[c] for c in VALUE_COLUMNS])
+
+    def commit(self): # -> None
+        self.db.commit()
+
+    def invalidate(self, patterns=None): # -> int
+        """
+        remove the entries whose path matches one of the glob patterns, or all entries if no patterns are given.
+        returns number of removed entries
+        """
+        if not patterns:
+            n = self.db.execute('DELETE FROM files').rowcount
+        else:
+            paths = [p for (p,) in self.db.execute('SELECT path FROM files')
+                     if any(fnmatch.fnmatch(p, pattern) for pattern in patterns)]
+            self.db.executemany('DELETE FROM files WHERE path = ?', [(p,) for p in paths])
+            n = len(paths)
+        self.db.commit()
+        return n
+
+    def compact(self): # -> int
+        """
+        remove the entries of files that no longer exist and shrink the database file.
+        returns number of removed entries
+        """
+        paths = [p for (p,) in self.db.execute('SELECT path FROM files') if not os.path.exists(p)]
+        self.db.executemany('DELETE FROM files WHERE path = ?', [(p,) for p in paths])
+        self.db.commit()
+        self.db.execute('VACUUM')
+        return len(paths)
+
+    def __len__(self):
+        return self.db.execute('SELECT COUNT(*) FROM files').fetchone()[0]
+
+
+def main(argv=None): # -> int
+    parser = argparse.ArgumentParser(description='Inspect and maintain the harvest cache.')
+    parser.add_argument('command', choices=['info', 'invalidate', 'compact'])
+    parser.add_argument('cache', help='cache file')
+    parser.add_argument('patterns', nargs='*', help='glob patterns of the files to invalidate (default: all)')
+    args = parser.parse_args(argv)
+
+    with HarvestCache(args.cache) as cache:
+        if args.command == 'invalidate':
+            print('invalidated {} entries'.format(cache.invalidate(args.patterns)))
+        elif args.command == 'compact':
+            print('removed {} entries of missing files'.format(cache.compact()))
+        print('{}: {} entries, {} bytes'.format(args.cache, len(cache), os.path.getsize(args.cache)))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
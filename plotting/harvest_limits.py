@@ -0,0 +1,172 @@
+import graph_loader
+import harvest_cache
+import root_io
+import utils
+import numpy as np
+import argparse
+import fnmatch
+import multiprocessing
+import os
+import re
+import sys
+
+
+"""
+Harvest asymptotic limits from combine output files into the .csv format used by limit_plot.py.
+The 'limit' tree of every higgsCombine*.AsymptoticLimits.mH*.root file is read in one go
+and the files are processed in a pool of worker processes.
+
+With --cache, the limits are kept in a persistent index and only new or changed files are read again
+(see harvest_cache.py for invalidation and compaction).
+
+usage: python plotting/harvest_limits.py output_dir/ -o limits.csv [--cache harvest.sqlite]
+"""
+
+# imported when the harvested limits are collected, so that the file helpers work without pandas
+pd = utils.LazyModule('pandas')
+
+FILE_PATTERN = 'higgsCombine*.AsymptoticLimits.mH*.root'
+FILE_REGEX = re.compile(r'^higgsCombine(?P<name>.*)\.AsymptoticLimits\.mH(?P<mass>\d+(?:\.\d+)?)\.root$')
+
+# quantileExpected of the entries in the limit tree (-1 is the observed limit)
+QUANTILES = [('observed', -1.), ('q_025', 0.025), ('q_16', 0.16), ('central', 0.5), ('q_84', 0.84), ('q_975', 0.975)]
+
+
+def find_files(paths, pattern=FILE_PATTERN): # -> list
+    """
+    find all combine output files in the given directories (searched recursively) or files.
+    returns sorted list of file names
+    """
+    files = []
+    for path in paths:
+        if os.path.isfile(path):
+            files.append(path)
+            continue
+        for root, dirs, names in os.walk(path):
+            for name in fnmatch.filter(names, pattern):
+                files.append(os.path.join(root, name))
+    return sorted(set(files))
+
+
+def parse_file_name(file_name): # -> tuple
+    """
+    get the name and mass from a combine output file name.
+    returns (name, mass)
+    """
+    match = FILE_REGEX.match(os.path.basename(file_name))
+    if match is None:
+        raise ValueError('{}: not a combine AsymptoticLimits output file'.format(file_name))
+    return match.group('name'), float(match.group('mass'))
+
+
+def limits_from_quantiles(quantiles, limits): # -> dict
+    """
+    convert quantileExpected and limit arrays of one file to a row of the limit .csv format.
+    the band columns are distances to the median expected limit, as used by limit_plot.py.
+    quantiles that are missing in the file are set to NaN.
+    """
+    values = {}
+    for key, q in QUANTILES:
+        match = np.flatnonzero(np.isclose(quantiles, q, atol=1e-3))
+        values[key] = limits[match[-1]] if len(match) else np.nan
+    central = values['central']
+    return {
+        'central': central,
+        'observed': values['observed'],
+        'low_68': central - values['q_16'],
+        'high_68': values['q_84'] - central,
+        'low_95': central - values['q_025'],
+        'high_95': values['q_975'] - central,
+    }
+
+
+def read_limit_file(file_name): # -> dict
+    """
+    read the limits of one combine output file.
+    returns dict with name, mass and the limit columns
+    """
+    name, mass = parse_file_name(file_name)
+    arrays = root_io.read_tree(file_name, ['quantileExpected', 'limit'])
+    row = limits_from_quantiles(arrays['quantileExpected'], arrays['limit'])
+    row['name'] = name
+    row['mass'] = mass
+    return row
+
+
+def _read_limit_file_job(file_name): # -> tuple
+    try:
+        return file_name, read_limit_file(file_name), None
+    except Exception as exc:
+        return file_name, None, '{}: {}'.format(type(exc).__name__, exc)
+
+
+def harvest(files, n_jobs=None, cache=None): # -> pd.DataFrame
+    """
+    read the limits of all files in a pool of n_jobs worker processes.
+    if a HarvestCache is given, only files that are not cached or changed are read and the cache is updated.
+    files that cannot be read are reported and skipped.
+    returns DataFrame with one row per file, sorted by name and mass
+    """
+    rows = []
+    if cache is not None:
+        rows, files = cache.lookup(files)
+    if files:
+        n_jobs = min(n_jobs or multiprocessing.cpu_count(), len(files))
+        pool = multiprocessing.Pool(n_jobs)
+        try:
+            for file_name, row, error in pool.imap_unordered(_read_limit_file_job, files, chunksize=16):
+                if error is None:
+                    rows.append(row)
+                    if cache is not None:
+                        cache.update(file_name, row)
+                else:
+                    print('WARNING: skipping {} ({})'.format(file_name, error))
+        finally:
+            pool.close()
+            pool.join()
+            if cache is not None:
+                cache.commit()
+    df = pd.DataFrame(rows, columns=['name'] + graph_loader.LIMIT_COLUMNS)
+    return df.sort_values(['name', 'mass']).reset_index(drop=True)
+
+
+def write_limits(df, output): # -> list
+    """
+    write harvested limits to .csv files with the columns read by limit_plot.py.
+    if output contains '{name}', one file is written per name, otherwise all rows must have the same name.
+    returns list of written file names
+    """
+    names = list(df['name'].unique())
+    if '{name}' not in output and len(names) > 1:
+        raise ValueError('found several names ({}), use "{{name}}" in the output file name'.format(', '.join(names)))
+    written = []
+    for name, group in df.groupby('name', sort=True):
+        file_name = output.format(name=name)
+        group[graph_loader.LIMIT_COLUMNS].to_csv(file_name, index=False)
+        written.append(file_name)
+    return written
+
+
+def main(argv=None): # -> int
+    parser = argparse.ArgumentParser(description='Harvest combine AsymptoticLimits output into limit .csv files.')
+    parser.add_argument('paths', nargs='+', help='directories (searched recursively) or combine output files')
+    parser.add_argument('-o', '--output', default='limits.csv', help='output .csv file, may contain "{name}" (default: limits.csv)')
+    parser.add_argument('-p', '--pattern', default=FILE_PATTERN, help='file name pattern (default: {})'.format(FILE_PATTERN))
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='number of worker processes (default: number of CPUs)')
+    parser.add_argument('-c', '--cache', default=None, help='cache file, only new or changed files are read')
+    args = parser.parse_args(argv)
+
+    files = find_files(args.paths, args.pattern)
+    if args.cache is None:
+        df = harvest(files, args.jobs)
+    else:
+        with harvest_cache.HarvestCache(args.cache) as cache:
+            df = harvest(files, args.jobs, cache)
+    for file_name in write_limits(df, args.output):
+        print('written {}'.format(file_name))
+    print('{} files, {} limits harvested'.format(len(files), len(df)))
+    return 0 if len(df) == len(files) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,206 @@
+import argparse
+import json
+import os
+import resource
+import sys
+import time
+
+
+"""
+Lightweight per-stage timing and memory instrumentation of the plot scripts.
+For each stage (config, read, fill, draw, texts, print, ...) the wall time, CPU time and RSS change are
+written as one JSON line. It is enabled with the environment variable COMBINETOOLS_PROFILE
+(file name of the JSON lines, '-' for stderr) or with enable(). When disabled, stage() and
+sequence() return shared no-op objects, so the instrumented code costs nothing measurable.
+
+usage: COMBINETOOLS_PROFILE=profile.jsonl python plotting/limit_plot.py config.yml
+       python plotting/instrumentation.py profile.jsonl
+"""
+
+ENV_VARIABLE = 'COMBINETOOLS_PROFILE'
+
+_file_name = None # output of the JSON lines, None if disabled
+_output = None    # open output file of this process
+_pid = None       # process that opened _output
+
+
+def rss_mb(): # -> float
+    """
+    current resident memory of the process in MB (peak memory if /proc is not available)
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * resource.getpagesize() / 1024.**2
+    except IOError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.
+
+
+def enable(file_name='-'): # -> None
+    """
+    write the stage records to file_name ('-' for stderr)
+    """
+    global _file_name, _output, _pid
+    disable()
+    _file_name = file_name
+
+
+def disable(): # -> None
+    global _file_name, _output, _pid
+    if _output is not None and _output is not sys.stderr and _pid == os.getpid():
+        _output.close()
+    _file_name = _output = _pid = None
+
+
+def enabled(): # -> bool
+    return _file_name is not None
+
+
+def write_record(record): # -> None
+    """
+    append one record as JSON line, every process opens the output on its own in append mode
+    """
+    global _output, _pid
+    if _pid != os.getpid():
+        _output = sys.stderr if _file_name == '-' else open(_file_name, 'a')
+        _pid = os.getpid()
+    _output.write(json.dumps(record, sort_keys=True) + '\n')
+    _output.flush()
+
+
+class _NullStage(object):
+    """
+    no-op replacement of Stage and Sequence when the instrumentation is disabled
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def next(self, name):
+        pass
+
+    def done(self):
+        pass
+
+
+_NULL = _NullStage()
+
+
+class Stage(object):
+    """
+    context manager measuring one stage
+    """
+
+    def __init__(self, name, fields):
+        self.name = name
+        self.fields = fields
+
+    def __enter__(self):
+        self.rss = rss_mb()
+        self.cpu = time.process_time()
+        self.wall = time.time()
+        return self
+
+    def __exit__(self, exc_type, *args):
+        wall = time.time() - self.wall
+        cpu = time.process_time() - self.cpu
+        rss = rss_mb()
+        record = dict(self.fields)
+        record.update({'stage': self.name, 'wall': wall, 'cpu': cpu, 'rss_mb': rss,
+                       'rss_delta_mb': rss - self.rss, 'pid': os.getpid(), 'time': time.time()})
+        if exc_type is not None:
+            record['failed'] = True
+        write_record(record)
+        return False
+
+
+class Sequence(object):
+    """
+    consecutive stages of a plot without nesting the code: next() ends the current stage and starts the next one
+    """
+
+    def __init__(self, fields):
+        self.fields = fields
+        self.current = None
+
+    def next(self, name): # -> None
+        self.done()
+        self.current = Stage(name, self.fields).__enter__()
+
+    def done(self): # -> None
+        if self.current is not None:
+            self.current.__exit__(None)
+            self.current = None
+
+
+def stage(name, **fields): # -> Stage
+    """
+    measure the code in a with block as stage name, fields are added to the record (e.g. plot='limit')
+    """
+    if _file_name is None:
+        return _NULL
+    return Stage(name, fields)
+
+
+def sequence(**fields): # -> Sequence
+    """
+    measure consecutive stages, see Sequence
+    """
+    if _file_name is None:
+        return _NULL
+    return Sequence(fields)
+
+
+def read_records(file_names): # -> list
+    records = []
+    for file_name in file_names:
+        with open(file_name) as f:
+            records.extend(json.loads(line) for line in f if line.strip())
+    return records
+
+
+def summarize(records): # -> dict
+    """
+    aggregate the records per stage.
+    returns dict of stage -> count, total and maximum wall time, total CPU time and maximum RSS change
+    """
+    summary = {}
+    for r in records:
+        s = summary.setdefault(r['stage'], {'count': 0, 'wall': 0., 'wall_max': 0., 'cpu': 0., 'rss_delta_mb_max': 0.})
+        s['count'] += 1
+        s['wall'] += r['wall']
+        s['wall_max'] = max(s['wall_max'], r['wall'])
+        s['cpu'] += r['cpu']
+        s['rss_delta_mb_max'] = max(s['rss_delta_mb_max'], r['rss_delta_mb'])
+    return summary
+
+
+def print_summary(summary): # -> None
+    print('{:<12} {:>6} {:>10} {:>10} {:>10} {:>14}'.format('stage', 'count', 'wall [s]', 'max [s]', 'cpu [s]', 'max dRSS [MB]'))
+    for name, s in sorted(summary.items(), key=lambda item: -item[1]['wall']):
+        print('{:<12} {:>6} {:>10.3f} {:>10.3f} {:>10.3f} {:>14.1f}'.format(
+            name, s['count'], s['wall'], s['wall_max'], s['cpu'], s['rss_delta_mb_max']))
+
+
+def main(argv=None): # -> int
+    parser = argparse.ArgumentParser(description='Summarize stage records written with {}.'.format(ENV_VARIABLE))
+    parser.add_argument('files', nargs='+', help='JSON lines files')
+    parser.add_argument('--json', action='store_true', help='print the summary as JSON')
+    args = parser.parse_args(argv)
+
+    summary = summarize(read_records(args.files))
+    if args.json:
+        print(json.dumps(summary, indent=1, sort_keys=True))
+    else:
+        print_summary(summary)
+    return 0
+
+
+if os.environ.get(ENV_VARIABLE):
+    enable(os.environ[ENV_VARIABLE])
+
+
+if __name__ == '__main__':
+    sys.exit(main())
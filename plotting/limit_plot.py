@@ -1,210 +1,183 @@
-import ROOT
-import root_cosmetics as cosmetics
 import utils
-import pandas as pd
+import graph_loader
+import mass_limits
+import render_context
+import instrumentation
+import os
 import sys
 
-def find_intersection(g1, g2): # -> float # can put this somewhere else?
-    """
-    find intersection of two TGraphs, assuming only one intersection.
-    returns x value of intersection
-    """
-    precision = 0.01
-    max_calls = 10000
-    x1 = g1.GetHistogram().GetXaxis().GetXmin()
-    x2 = g1.GetHistogram().GetXaxis().GetXmax()
-    calls = 0
-    while ((abs(x1-x2) > precision) and (calls < max_calls)):
-        # find intersection using Newton bisection method
-        y1 = g1.Eval(x1) - g2.Eval(x1)
-        y2 = g1.Eval((x1+x2)/2) - g2.Eval((x1+x2)/2)
-        if (y1*y2 < 0): x2 = (x1+x2)/2
-        else: x1 = (x1+x2)/2
-        calls += 1
-
-    if (calls >= max_calls):
-      print 'WARNING: find_interseciont() terminated because max calls was reached.'
+# imported when the plot is drawn, so that a config can be checked without loading ROOT (--dry-run)
+ROOT = utils.LazyModule('ROOT')
+cosmetics = utils.LazyModule('root_cosmetics')
 
-    return (x1+x2)/2
 
-
-def get_graph(file_name): # -> TGraph
+def make_limit_plot(config, style=None): # -> str
     """
-    create TGraph from .csv file.
-    returns TGraph
+    create limit plot from a config dict (see examples/example_limit_config.yml).
+    an existing TStyle can be passed to avoid building the CMS style again.
+    returns file name of the plot
     """
-    g = ROOT.TGraph()
-    df = pd.read_csv(file_name)
-    for i, row in df.iterrows():
-        g.SetPoint(i,row['mass'],row['central'])
-    return g
+    # --- Settings
+    limit_file_name = config.get('limit_file_name')                                 # name of the observed and expected limits input file
+    theory_file_name = config.get('theory_file_name')                               # name of the theory prediction input file
+    compare_graphs = config.get('compare_graphs',[])                                # additional graphs in the form {'file':'', 'color':0, 'title':''}
+    b_logy = config.get('b_logy',True)                                              # draw logarithmic y axis
+    b_theory_err = config.get('b_theory_err',False)                                 # draw theory curve with errors
+    expected_title = config.get('expected_title','Median expected' )                # name of expected curve in legend
+    theory_title = config.get('theory_title', 'Theory')
+    x_axis_title = config.get('x_axis_title','M_{tW} [TeV]')                        # x axis title
+    y_axis_title = config.get('y_axis_title','#sigma(b*)')                          # y axis title
+    mass_range = config.get('mass_range')                                           # [low, high]: only read and draw these masses
 
+    profile = instrumentation.sequence(plot='limit', input=limit_file_name)
 
-def get_error_graph(file_name): # -> TGraphErrors
-    """
-    create TGraphErrors from .csv file.
-    returns TGraphErrors
-    """
-    g = ROOT.TGraphErrors()
-    df = pd.read_csv(file_name)
-    for i, row in df.iterrows():
-        g.SetPoint(i,row['mass'],row['central'])
-        g.SetPointError(i,0.0,row['err'])
-    return g
+    # ---  Read data from csv
+    profile.next('read')
+    limits = graph_loader.read_columns(limit_file_name, graph_loader.LIMIT_COLUMNS, mass_range=mass_range)
+    theory = None                               # theory prediction as column arrays
+    if (theory_file_name != ''):
+        theory_columns = graph_loader.THEORY_COLUMNS if b_theory_err else ['mass', 'central']
+        theory = graph_loader.read_columns(theory_file_name, theory_columns, mass_range=mass_range)
+    compares = []                               # expected limits for comparison as column arrays, in the order of compare_graphs
+    for compare_graph in compare_graphs:
+        compares.append(graph_loader.read_columns(compare_graph['file'], ['mass', 'central'], mass_range=mass_range))
 
-# --- Settings
-# note: this is not very elegant, but I was lazy coding something nicer, sorry ...
-config = utils.get_config(sys.argv[1])
+    # --- Create TGraphs
+    profile.next('fill')
+    limit_graphs = graph_loader.make_limit_graphs(limits)
+    g_expected = limit_graphs['expected']       # expected limits
+    g_observed = limit_graphs['observed']       # observed limits
+    g_expected_68 = limit_graphs['expected_68'] # 1 sigma band
+    g_expected_95 = limit_graphs['expected_95'] # 2 sigma band
+    g_theory = None                             # theory prediction
+    if (theory_file_name != ''):
+        if (b_theory_err):
+            g_theory = graph_loader.make_error_graph(theory['mass'], theory['central'], theory['err'])
+        else:
+            g_theory = graph_loader.make_graph(theory['mass'], theory['central'])
+    g_compares = [graph_loader.make_graph(compare['mass'], compare['central']) for compare in compares]
 
-limit_file_name = config.get('limit_file_name')                                 # name of the observed and expected limits input file
-theory_file_name = config.get('theory_file_name')                               # name of the theory prediction input file
-compare_graphs = config.get('compare_graphs',[])                                # additional graphs in the form {'file':'', 'color':0, 'title':''}
-b_logy = config.get('b_logy',True)                                              # draw logarithmic y axis
-b_theory_err = config.get('b_theory_err',False)                                 # draw theory curve with errors
-expected_title = config.get('expected_title','Median expected' )                # name of expected curve in legend
-theory_title = config.get('theory_title', 'Theory')
-x_axis_title = config.get('x_axis_title','M_{tW} [TeV]')                        # x axis title
-y_axis_title = config.get('y_axis_title','#sigma(b*)')                          # y axis title
+    # --- Plotting
+    profile.next('draw')
+    with render_context.RenderContext(style, 'limit') as context:
+        c = context.canvas('limit_canvas',600,600)
+        pad = context.keep(cosmetics.SetupPad(context.name('pad'))) # get default pad
+        pad.Draw()
+        pad.cd()
+        pad.SetLogy(b_logy)
+        # set cosmetics for TGraphs
+        # expected
+        g_expected.SetLineWidth(2)
+        g_expected.SetLineStyle(7)
+        g_expected.SetLineColor(ROOT.kBlack)
+        # 1 sigma
+        g_expected_68.SetFillStyle(1001)
+        g_expected_68.SetFillColor(ROOT.kGreen + 1) # recommended color
+        # 2 sigma
+        g_expected_95.SetFillStyle(1001)
+        g_expected_95.SetFillColor(ROOT.kOrange) # recommended color
+        # observed
+        g_observed.SetLineWidth(2)
+        g_observed.SetLineStyle(1)
+        g_observed.SetLineColor(ROOT.kBlack)
+        # draw TGraphs
+        g_expected_95.Draw('A3')
+        g_expected_68.Draw('SAME3')
+        g_expected.Draw('SAME')
+        g_observed.Draw('SAME')
+        # set y-axis range
+        xmin = limits['mass'][0]
+        xmax = limits['mass'][-1]
+        ymax = max(10., g_expected.GetHistogram().GetMaximum()) * 3;
+        ymin = min(0.001, g_expected.GetHistogram().GetMinimum()) * 0.33;
+        # add theory curve if given
+        if (theory_file_name != ''):
+            theory_draw_options = 'SAMEL3' if b_theory_err else 'SAME'
+            theory_legend_options = 'fl' if b_theory_err else 'l'
+            # set cosmetics
+            g_theory.SetLineWidth(2)
+            g_theory.SetLineStyle(1)
+            g_theory.SetLineColor(ROOT.kRed)
+            g_theory.SetFillColor(ROOT.kRed-7)
+            g_theory.SetFillStyle(3001)
+            # draw
+            g_theory.Draw(theory_draw_options)
+            # create theory graph legend
+            pred_leg = context.keep(ROOT.TLegend(0.55,0.87,0.95,0.92))
+            pred_leg.SetBorderSize(0)
+            pred_leg.SetFillStyle(0)
+            pred_leg.SetTextSize(0.033)
+            pred_leg.SetTextFont(42)
+            pred_leg.AddEntry(g_theory, theory_title, theory_legend_options)
+            pred_leg.Draw()
 
-# --- Create TGraphs
-style = cosmetics.get_cms_style()
-style.cd()
-g_expected = ROOT.TGraph()                  # expected limits
-g_observed = ROOT.TGraph()                  # observed limits
-g_expected_68 = ROOT.TGraphAsymmErrors()    # 1 sigma band
-g_expected_95 = ROOT.TGraphAsymmErrors()    # 2 sigma band
-g_theory = ROOT.TGraphErrors()              # theory prediction
-g_compares = []                             # list holding expect limits for comparison
+        # create legends for observed and expected limits
+        obs_leg = ROOT.TLegend(0.55,0.77,0.95,0.87)
+        obs_leg.SetBorderSize(0)
+        obs_leg.SetFillStyle(0)
+        obs_leg.SetTextSize(0.033)
+        obs_leg.SetTextFont(62)
+        obs_leg.SetHeader('95% CL upper limits')
+        obs_leg.SetTextFont(42)
+        obs_leg.AddEntry(g_observed, 'Observed', 'l')
+        obs_leg.Draw()
+        exp_leg_ylow = 0.59 - len(compare_graphs) * 0.06 # calculate lower edge of legend based on number of entries
+        exp_leg = ROOT.TLegend(0.55,exp_leg_ylow,0.95,0.77)
+        exp_leg.SetBorderSize(0)
+        exp_leg.SetFillStyle(0)
+        exp_leg.SetTextSize(0.033)
+        # add additional expected limits if given
+        if len(compare_graphs)> 0:
+            exp_leg.SetTextFont(62)
+            exp_leg.SetHeader('Median expected')
+            exp_leg.SetTextFont(42)
+            for j in range(0,len(compare_graphs)):
+                g_compare = g_compares[j]
+                g_compare.SetLineWidth(2)
+                g_compare.SetLineStyle(7)
+                g_compare.SetLineColor(compare_graphs[j]['color'])
+                g_compare.Draw('SAME')
+                exp_leg.AddEntry(g_compare, compare_graphs[j]['title'], 'l')
+            exp_leg.AddEntry(g_expected, expected_title, 'l')
+            exp_leg.AddEntry(g_expected_68, '68% expected', 'f')
+            exp_leg.AddEntry(g_expected_95, '95% expected', 'f')
+        else:
+          exp_leg.SetTextFont(42);
+          exp_leg.AddEntry(g_expected, expected_title, 'l')
+          exp_leg.AddEntry(g_expected_68, '68% expected', 'f')
+          exp_leg.AddEntry(g_expected_95, '95% expected', 'f')
+        exp_leg.Draw();
+        # setup axes
+        g_expected_95.GetHistogram().SetXTitle(x_axis_title)
+        g_expected_95.GetHistogram().SetYTitle(y_axis_title)
+        g_expected_95.GetHistogram().GetYaxis().SetTitleOffset(1.25)
+        g_expected_95.GetHistogram().GetXaxis().SetLimits(xmin,xmax)
+        g_expected_95.GetHistogram().GetYaxis().SetRangeUser(ymin,ymax)
 
-# ---  Read data from csv
-df = pd.read_csv(limit_file_name)
-for i, row in df.iterrows():
-    g_expected.SetPoint(i,row['mass'],row['central'])
-    g_observed.SetPoint(i,row['mass'],row['observed'])
-    g_expected_68.SetPoint(i,row['mass'],row['central'])
-    g_expected_68.SetPointError(i,0.,0.,row['low_68'],row['high_68'])
-    g_expected_95.SetPoint(i,row['mass'],row['central'])
-    g_expected_95.SetPointError(i,0.,0.,row['low_95'],row['high_95'])
+        # draw cms logo and run information
+        profile.next('texts')
+        cosmetics.draw_texts(pad, config)
+        # safe as figure
+        profile.next('print')
+        pad.RedrawAxis()
+        compare_data = [dict(compare, title=g['title']) for g, compare in zip(compare_graphs, compares)]
+        data = {'limits': limits, 'theory': theory, 'compare': compare_data}
+        keep = [g_expected, g_observed, g_expected_68, g_expected_95, g_theory, obs_leg, exp_leg] + g_compares
+        plot_file_name = context.save(c, config, os.path.splitext(limit_file_name)[0], data, keep)
 
-# --- Plotting
-c = ROOT.TCanvas('limit_canvas','limit_canvas',600,600)
-pad = cosmetics.SetupPad() # get default pad
-pad.Draw()
-pad.cd()
-pad.SetLogy(b_logy)
-# set cosmetics for TGraphs
-# expected
-g_expected.SetLineWidth(2)
-g_expected.SetLineStyle(7)
-g_expected.SetLineColor(ROOT.kBlack)
-# 1 sigma
-g_expected_68.SetFillStyle(1001)
-g_expected_68.SetFillColor(ROOT.kGreen + 1) # recommended color
-# 2 sigma
-g_expected_95.SetFillStyle(1001)
-g_expected_95.SetFillColor(ROOT.kOrange) # recommended color
-# observed
-g_observed.SetLineWidth(2)
-g_observed.SetLineStyle(1)
-g_observed.SetLineColor(ROOT.kBlack)
-# draw TGraphs
-g_expected_95.Draw('A3')
-g_expected_68.Draw('SAME3')
-g_expected.Draw('SAME')
-g_observed.Draw('SAME')
-# set y-axis range
-xmin = ROOT.Double(0)
-xmax = ROOT.Double(0)
-ymin = ROOT.Double(0)
-ymax = ROOT.Double(0)
-g_expected.GetPoint(0, xmin,ymin);
-g_expected.GetPoint(df.shape[0]-1, xmax,ymax);
-ymax = max(10., g_expected.GetHistogram().GetMaximum()) * 3;
-ymin = min(0.001, g_expected.GetHistogram().GetMinimum()) * 0.33;
-# add theory curve if given
-if (theory_file_name != ''):
-    # create theory graph from .csv file
-    theory_draw_options = ''
-    theory_legend_options = ''
-    if (b_theory_err):
-        g_theory = get_error_graph(theory_file_name)
-        theory_draw_options = 'SAMEL3'
-        theory_legend_options = 'fl'
-    else:
-        g_theory = get_graph(theory_file_name)
-        theory_draw_options = 'SAME'
-        theory_legend_options = 'l'
-    # set cosmetics
-    g_theory.SetLineWidth(2)
-    g_theory.SetLineStyle(1)
-    g_theory.SetLineColor(ROOT.kRed)
-    g_theory.SetFillColor(ROOT.kRed-7)
-    g_theory.SetFillStyle(3001)
-    # draw
-    g_theory.Draw(theory_draw_options)
-    # create theory graph legend
-    pred_leg = ROOT.TLegend(0.55,0.87,0.95,0.92)
-    pred_leg.SetBorderSize(0)
-    pred_leg.SetFillStyle(0)
-    pred_leg.SetTextSize(0.033)
-    pred_leg.SetTextFont(42)
-    pred_leg.AddEntry(g_theory, theory_title, theory_legend_options)
-    pred_leg.Draw()
+    # calculated expected and observed mass limits
+    profile.next('mass_limits')
+    if (theory_file_name != ''):
+        for name, crossings in mass_limits.get_mass_limits(limits, theory).items():
+            print('{}: {} TeV'.format(name, ', '.join('{:.4g}'.format(x) for x in crossings) or 'none'))
+    profile.done()
 
-# create legends for observed and expected limits
-obs_leg = ROOT.TLegend(0.55,0.77,0.95,0.87)
-obs_leg.SetBorderSize(0)
-obs_leg.SetFillStyle(0)
-obs_leg.SetTextSize(0.033)
-obs_leg.SetTextFont(62)
-obs_leg.SetHeader('95% CL upper limits')
-obs_leg.SetTextFont(42)
-obs_leg.AddEntry(g_observed, 'Observed', 'l')
-obs_leg.Draw()
-exp_leg_ylow = 0.59 - len(compare_graphs) * 0.06 # calculate lower edge of legend based on number of entries
-exp_leg = ROOT.TLegend(0.55,exp_leg_ylow,0.95,0.77)
-exp_leg.SetBorderSize(0)
-exp_leg.SetFillStyle(0)
-exp_leg.SetTextSize(0.033)
-# add additional expected limits if given
-if len(compare_graphs)> 0:
-    exp_leg.SetTextFont(62)
-    exp_leg.SetHeader('Median expected')
-    exp_leg.SetTextFont(42)
-    for j in range(0,len(compare_graphs)):
-        g_compare = get_graph(compare_graphs[j]['file'])
-        g_compare.SetLineWidth(2)
-        g_compare.SetLineStyle(7)
-        g_compare.SetLineColor(compare_graphs[j]['color'])
-        g_compare.Draw('SAME')
-        exp_leg.AddEntry(g_compare, compare_graphs[j]['title'], 'l')
-        g_compares.append(g_compare)
-    exp_leg.AddEntry(g_expected, expected_title, 'l')
-    exp_leg.AddEntry(g_expected_68, '68% expected', 'f')
-    exp_leg.AddEntry(g_expected_95, '95% expected', 'f')
-else:
-  exp_leg.SetTextFont(42);
-  exp_leg.AddEntry(g_expected, expected_title, 'l')
-  exp_leg.AddEntry(g_expected_68, '68% expected', 'f')
-  exp_leg.AddEntry(g_expected_95, '95% expected', 'f')
-exp_leg.Draw();
-# setup axes
-g_expected_95.GetHistogram().SetXTitle(x_axis_title)
-g_expected_95.GetHistogram().SetYTitle(y_axis_title)
-g_expected_95.GetHistogram().GetYaxis().SetTitleOffset(1.25)
-g_expected_95.GetHistogram().GetXaxis().SetLimits(xmin,xmax)
-g_expected_95.GetHistogram().GetYaxis().SetRangeUser(ymin,ymax)
+    return plot_file_name
 
-# draw cms logo and run information
-cosmetics.draw_texts(pad, config)
-# safe as figure
-pad.RedrawAxis()
-plot_name = limit_file_name.replace('.csv','')
-#c.Print(plot_name+'.eps');
-#c.Print(plot_name+'.png');
-c.Print(str(plot_name+'.pdf'))
 
-# calculated expected and observed mass limits
-if (theory_file_name != ''):
-    print 'expected: {} TeV'.format(find_intersection(g_expected, g_theory))
-    print 'observed: {} TeV'.format(find_intersection(g_observed, g_theory))
+if __name__ == '__main__':
+    config = utils.get_config(sys.argv[1])
+    if '--dry-run' in sys.argv[2:]:
+        import validate
+        sys.exit(validate.dry_run(config, 'limit', sys.argv[1]))
+    make_limit_plot(config)
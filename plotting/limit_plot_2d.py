@@ -0,0 +1,199 @@
+import utils
+import graph_loader
+import contours
+import render_context
+import instrumentation
+import numpy as np
+import os
+import sys
+
+
+"""
+Create 2D exclusion plots for scans of mass and a second parameter (e.g. a coupling or width).
+The limit .csv file has the columns of limit_plot.py plus the column of the second parameter,
+the theory .csv file the columns mass, <parameter> and central. Without theory file, the limits are
+taken as signal strengths r directly. r = limit / theory is put on a grid over the plane and the
+r = 1 contours of the observed, expected and +-1/2 sigma expected limits are drawn.
+
+usage: python plotting/limit_plot_2d.py limit_2d_config.yml
+"""
+
+# imported when the plot is drawn, so that a config can be checked without loading ROOT (--dry-run)
+ROOT = utils.LazyModule('ROOT')
+cosmetics = utils.LazyModule('root_cosmetics')
+pd = utils.LazyModule('pandas')
+
+# contours in drawing order
+CONTOUR_NAMES = ['expected_95_low', 'expected_95_high', 'expected_68_low', 'expected_68_high', 'expected', 'observed']
+
+
+def contour_lines(): # -> list
+    """
+    line attributes of the contours in drawing order, built when drawing so that ROOT is not needed before.
+    returns list of (name, line color, line style, line width, legend title)
+    """
+    return [
+        ('expected_95_low', ROOT.kOrange, 3, 2, '95% expected'),
+        ('expected_95_high', ROOT.kOrange, 3, 2, None),
+        ('expected_68_low', ROOT.kRed, 3, 2, '68% expected'),
+        ('expected_68_high', ROOT.kRed, 3, 2, None),
+        ('expected', ROOT.kRed, 7, 3, 'Median expected'),
+        ('observed', ROOT.kBlack, 1, 3, 'Observed'),
+    ]
+
+
+def signal_strengths(limits, theory=None, keys=('mass',)): # -> dict
+    """
+    observed, expected and expected band limits divided by the theory cross section.
+    limits and theory are DataFrames, the theory is matched to the limits by the key columns.
+    returns dict of column arrays with the key columns and one column per contour
+    """
+    keys = list(keys)
+    if theory is not None:
+        limits = limits.merge(theory[keys + ['central']].rename(columns={'central': 'theory'}), on=keys)
+        if len(limits) == 0:
+            raise ValueError('no theory prediction for any point of the limits')
+        xsec = limits['theory'].values
+    else:
+        xsec = 1.
+    central = limits['central'].values
+    r = dict((c, limits[c].values) for c in keys)
+    r['observed'] = limits['observed'].values / xsec
+    r['expected'] = central / xsec
+    r['expected_68_low'] = (central - limits['low_68'].values) / xsec
+    r['expected_68_high'] = (central + limits['high_68'].values) / xsec
+    r['expected_95_low'] = (central - limits['low_95'].values) / xsec
+    r['expected_95_high'] = (central + limits['high_95'].values) / xsec
+    return r
+
+
+def find_exclusion_contours(x, y, grids, logx=False, logy=False): # -> dict
+    """
+    r = 1 contours of the grids of r, interpolated in log(r) (and log(x), log(y) for logarithmic axes).
+    returns dict of name -> list of (n, 2) arrays of points
+    """
+    gx = np.log(x) if logx else x
+    gy = np.log(y) if logy else y
+    lines = {}
+    for name, grid in grids.items():
+        with np.errstate(invalid='ignore', divide='ignore'):
+            log_r = np.where(grid > 0, np.log(grid), np.nan)
+        lines[name] = contours.find_contours(gx, gy, log_r, 0.)
+        for line in lines[name]:
+            if logx:
+                line[:, 0] = np.exp(line[:, 0])
+            if logy:
+                line[:, 1] = np.exp(line[:, 1])
+    return lines
+
+
+def axis_edges(axis): # -> np.ndarray
+    """
+    bin edges around the nodes of a grid axis, halfway between the nodes
+    """
+    if len(axis) == 1:
+        return np.array([axis[0] - 0.5, axis[0] + 0.5])
+    mid = (axis[1:] + axis[:-1]) / 2.
+    return np.concatenate([[2. * axis[0] - mid[0]], mid, [2. * axis[-1] - mid[-1]]])
+
+
+def make_grid_hist(name, x, y, grid): # -> TH2D
+    """
+    create TH2D with one bin per grid node, filled in one call
+    """
+    x_edges, y_edges = graph_loader.as_buffer(axis_edges(x)), graph_loader.as_buffer(axis_edges(y))
+    h = ROOT.TH2D(name, name, len(x), x_edges, len(y), y_edges)
+    h.SetDirectory(0)
+    content = np.zeros((len(y) + 2, len(x) + 2))
+    content[1:-1, 1:-1] = np.nan_to_num(grid)
+    h.SetContent(graph_loader.as_buffer(content.ravel()))
+    return h
+
+
+def make_limit_plot_2d(config, style=None): # -> str
+    """
+    create 2D exclusion plot from a config dict.
+    an existing TStyle can be passed to avoid building the CMS style again.
+    returns file name of the plot
+    """
+    # --- Settings
+    limit_file_name = config.get('limit_file_name')             # limits with the columns of limit_plot.py and y_column
+    theory_file_name = config.get('theory_file_name')           # theory cross sections with mass, y_column and central (optional)
+    y_column = config.get('y_column','coupling')                # name of the second scan parameter
+    mass_range = config.get('mass_range')                       # [low, high]: only read and draw these masses
+    grid_bins = config.get('grid_bins')                         # [nx, ny]: average scattered points in bins instead of one node per point
+    b_logx = config.get('b_logx',False)                         # draw logarithmic x axis
+    b_logy = config.get('b_logy',False)                         # draw logarithmic y axis
+    b_draw_r = config.get('b_draw_r',True)                      # draw the observed r as colour map
+    x_axis_title = config.get('x_axis_title','M [TeV]')         # x axis title
+    y_axis_title = config.get('y_axis_title',y_column)          # y axis title
+    z_axis_title = config.get('z_axis_title','#sigma_{95% CL}/#sigma_{theory}')
+
+    profile = instrumentation.sequence(plot='limit_2d', input=limit_file_name)
+
+    # --- Read limits and theory, put r on the grid
+    profile.next('read')
+    limits = pd.DataFrame(graph_loader.read_columns(limit_file_name, graph_loader.LIMIT_COLUMNS + [y_column], mass_range=mass_range))
+    theory = None
+    if theory_file_name:
+        theory = pd.DataFrame(graph_loader.read_columns(theory_file_name, ['mass', y_column, 'central'], mass_range=mass_range))
+    profile.next('fill')
+    r = signal_strengths(limits, theory, ['mass', y_column])
+    x, y, grids = contours.grid_points(r['mass'], r[y_column], dict((n, r[n]) for n in CONTOUR_NAMES), grid_bins)
+    profile.next('contours')
+    lines = find_exclusion_contours(x, y, grids, b_logx, b_logy)
+
+    # --- Plotting
+    profile.next('draw')
+    with render_context.RenderContext(style, 'limit_2d') as context:
+        c = context.canvas('limit_2d_canvas',600,600)
+        pad = context.keep(cosmetics.SetupPad(context.name('pad')))
+        pad.SetRightMargin(0.17 if b_draw_r else 0.05)
+        pad.Draw()
+        pad.cd()
+        pad.SetLogx(b_logx)
+        pad.SetLogy(b_logy)
+        pad.SetLogz(True)
+
+        h_r = make_grid_hist(context.name('h_r_observed'), x, y, grids['observed'])
+        h_r.GetXaxis().SetTitle(x_axis_title)
+        h_r.GetYaxis().SetTitle(y_axis_title)
+        h_r.GetZaxis().SetTitle(z_axis_title)
+        h_r.GetYaxis().SetTitleOffset(1.25)
+        h_r.Draw('COLZ' if b_draw_r else 'AXIS')
+
+        leg_xhigh = 0.80 if b_draw_r else 0.95
+        leg = ROOT.TLegend(leg_xhigh - 0.4,0.68,leg_xhigh,0.88)
+        leg.SetBorderSize(0)
+        leg.SetFillStyle(0)
+        leg.SetTextSize(0.033)
+        leg.SetTextFont(42)
+        graphs = []
+        for name, color, line_style, width, title in contour_lines():
+            for k, line in enumerate(lines[name]):
+                g = graph_loader.make_graph(line[:, 0], line[:, 1])
+                g.SetLineColor(color)
+                g.SetLineStyle(line_style)
+                g.SetLineWidth(width)
+                g.Draw('L SAME')
+                if k == 0 and title is not None:
+                    leg.AddEntry(g, title, 'l')
+                graphs.append(g)
+        leg.Draw()
+
+        profile.next('texts')
+        cosmetics.draw_texts(pad, config)
+        profile.next('print')
+        pad.RedrawAxis()
+        data = {'x': x, 'y': y, 'r': grids, 'contours': lines}
+        plot_file_name = context.save(c, config, os.path.splitext(limit_file_name)[0] + '_2d', data, [h_r, leg] + graphs)
+    profile.done()
+    return plot_file_name
+
+
+if __name__ == '__main__':
+    config = utils.get_config(sys.argv[1])
+    if '--dry-run' in sys.argv[2:]:
+        import validate
+        sys.exit(validate.dry_run(config, 'limit_2d', sys.argv[1]))
+    make_limit_plot_2d(config)
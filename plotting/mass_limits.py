@@ -0,0 +1,67 @@
+import numpy as np
+from collections import OrderedDict
+
+
+"""
+Mass limits from the crossings of limit and theory curves.
+The curves are treated as piecewise log-linear between their points,
+so all crossings are found exactly without evaluating the curves iteratively.
+"""
+
+
+def find_intersections(x1, y1, x2, y2, logy=True): # -> np.ndarray
+    """
+    find all intersections of two curves given by their points.
+    the curves are interpolated linearly in log(y) (or y if logy is False)
+    and only compared where both are defined. with logy, points with y <= 0 are dropped with a warning.
+    returns sorted array of x values of the intersections
+    """
+    x1, y1, x2, y2 = [np.asarray(a, dtype=np.float64) for a in (x1, y1, x2, y2)]
+    if logy:
+        positive1, positive2 = y1 > 0, y2 > 0
+        n_dropped = np.count_nonzero(~positive1) + np.count_nonzero(~positive2)
+        if n_dropped:
+            print('WARNING: find_intersections: dropping {} points with y <= 0 from the logarithmic interpolation'.format(n_dropped))
+        x1, y1, x2, y2 = x1[positive1], np.log(y1[positive1]), x2[positive2], np.log(y2[positive2])
+    if len(x1) == 0 or len(x2) == 0:
+        return np.array([])
+    o1, o2 = np.argsort(x1), np.argsort(x2)
+    x1, y1, x2, y2 = x1[o1], y1[o1], x2[o2], y2[o2]
+    lo = max(x1[0], x2[0])
+    hi = min(x1[-1], x2[-1])
+    if lo > hi:
+        return np.array([])
+    # between two nodes of the union both curves are linear, so is their difference
+    x = np.union1d(x1, x2)
+    x = x[(x >= lo) & (x <= hi)]
+    d = np.interp(x, x1, y1) - np.interp(x, x2, y2)
+    i = np.flatnonzero(d[:-1] * d[1:] < 0)
+    crossings = x[i] - d[i] * (x[i+1] - x[i]) / (d[i+1] - d[i])
+    touches = x[d == 0]
+    return np.unique(np.concatenate([crossings, touches]))
+
+
+def get_mass_limits(limits, theory): # -> OrderedDict
+    """
+    calculate observed, expected and expected band mass limits.
+    limits and theory are dicts of column arrays as returned by graph_loader.read_columns.
+    if the theory has an 'err' column, the expected limits for the theory band edges are added as well.
+    returns OrderedDict of name -> array of intersections
+    """
+    mass = limits['mass']
+    central = limits['central']
+    curves = OrderedDict([
+        ('observed', limits['observed']),
+        ('expected', central),
+        ('expected_68_low', central - limits['low_68']),
+        ('expected_68_high', central + limits['high_68']),
+        ('expected_95_low', central - limits['low_95']),
+        ('expected_95_high', central + limits['high_95']),
+    ])
+    mass_limits = OrderedDict()
+    for name, y in curves.items():
+        mass_limits[name] = find_intersections(mass, y, theory['mass'], theory['central'])
+    if 'err' in theory:
+        mass_limits['theory_low'] = find_intersections(mass, central, theory['mass'], theory['central'] - theory['err'])
+        mass_limits['theory_high'] = find_intersections(mass, central, theory['mass'], theory['central'] + theory['err'])
+    return mass_limits
@@ -1,82 +1,215 @@
-import ROOT
-import root_cosmetics
+import graph_loader
+import export
+import render_context
+import fit_diagnostics
+import numpy as np
+import utils
+import instrumentation
+import heapq
+import os
+import re
 import sys
-import pandas as pd
 
 
 """
-Create nuisance pull plot from .csv file.
+Create nuisance pull plot from .csv file or directly from the fit diagnostics output.
+The nuisances can be filtered by a regular expression, ranked by pull or constraint,
+reduced to the top N and split over several pages of one .pdf file.
+The _up and _down errors of the pulls (.csv columns) are drawn to the left and to the right of the pull.
 """
 
-file_name = sys.argv[1]
-# read .csv file as pandas dataframe
-df = pd.read_csv(file_name)
-df = df.iloc[::-1].reset_index()
-
-style = root_cosmetics.get_cms_style()
-style.cd()
-
-g_postfit_b = ROOT.TGraphAsymmErrors() # post-fit NP of background only fit
-g_postfit_b.SetLineColor(ROOT.kBlack)
-g_postfit_b.SetMarkerStyle(20)
-g_postfit_b.SetMarkerColor(ROOT.kBlack)
-g_postfit_s = ROOT.TGraphAsymmErrors() # post-fit NP of signal+background fit
-g_postfit_s.SetLineColor(ROOT.kGray+1)
-g_postfit_s.SetMarkerStyle(20)
-g_postfit_s.SetMarkerColor(ROOT.kGray+1)
-h = ROOT.TH1F("h","axis",df.shape[0],0,df.shape[0]) # use histogram to draw NP names on y-axis
-h.SetFillStyle(0)
-h.SetFillColor(0)
-
-# fill graphs
-for i, row in df.iterrows():
-    g_postfit_b.SetPoint(i,row["postfit_b"],i+0.35)
-    g_postfit_b.SetPointError(i,row["postfit_b_up"],row["postfit_b_down"],0,0)
-    g_postfit_s.SetPoint(i,row["postfit_s"],i+0.65)
-    g_postfit_s.SetPointError(i,row["postfit_s_up"],row["postfit_s_down"],0,0)
-    h.GetXaxis().SetBinLabel(i+1,df["label"][i])
-    h.SetBinContent(i, -20) # set bin content to some negative value to hide histogram
-
-# create legend
-leg = ROOT.TLegend(0.3,0.95,0.9,0.99)
-leg.SetNColumns(2)
-leg.SetBorderSize(0)
-leg.SetFillStyle(0)
-leg.SetTextSize(0.025)
-leg.SetTextFont(42)
-leg.AddEntry(g_postfit_b, "background only fit","pl")
-leg.AddEntry(g_postfit_s, "signal+background fit","pl")
-
-c = ROOT.TCanvas("nuisance_canvas","nuisance_canvas",600,800)
-pad = ROOT.TPad("pad","pad",0.01,0.01,0.99,0.99)
-pad.SetTopMargin(0.05)
-pad.SetBottomMargin(0.075)
-pad.SetLeftMargin(0.25)
-pad.SetRightMargin(0.05)
-pad.Draw()
-pad.cd()
-# Draw 1 and 2 sigma bands as boxes
-box_68 = ROOT.TBox(-1,0,1,df.shape[0])
-box_68.SetFillStyle(1001)
-box_68.SetFillColor(ROOT.kGreen+1)
-box_95 = ROOT.TBox(-2,0,2,df.shape[0])
-box_95.SetFillStyle(1001)
-box_95.SetFillColor(ROOT.kOrange)
-
-h.Draw("hbar") # draw horizontal histogram to get the axis right
-h.GetYaxis().SetTitle("nuisance parameter pull")
-h.GetXaxis().SetLabelSize(0.033)
-h.GetYaxis().SetLabelSize(0.033)
-h.GetYaxis().SetTitleSize(0.04)
-h.GetYaxis().SetTitleOffset(0.9)
-h.GetYaxis().CenterTitle(True)
-h.GetYaxis().SetRangeUser(-2.49,2.49)
-box_95.Draw()
-box_68.Draw()
-g_postfit_s.Draw("PSAME")
-g_postfit_b.Draw("PSAME")
-leg.Draw()
-ROOT.gPad.RedrawAxis()
-
-plot_name = file_name.replace('.csv','')
-c.Print(str(plot_name+'.pdf'))
+# imported when the plot is drawn, so that a config can be checked without loading ROOT (--dry-run)
+ROOT = utils.LazyModule('ROOT')
+
+NUISANCE_COLUMNS = ['postfit_b', 'postfit_b_up', 'postfit_b_down', 'postfit_s', 'postfit_s_up', 'postfit_s_down']
+
+
+def rank_keys(cols, sort_by): # -> np.ndarray
+    """
+    ranking key of every nuisance, larger keys are shown first.
+    'pull': largest absolute pull of both fits
+    'constraint': strongest constraint of both fits (1 - mean post-fit error)
+    """
+    if sort_by == 'pull':
+        return np.maximum(np.abs(cols['postfit_b']), np.abs(cols['postfit_s']))
+    if sort_by == 'constraint':
+        sigma_b = (cols['postfit_b_up'] + cols['postfit_b_down']) / 2.
+        sigma_s = (cols['postfit_s_up'] + cols['postfit_s_down']) / 2.
+        return 1. - np.minimum(sigma_b, sigma_s)
+    raise ValueError('unknown sort_by "{}", use "pull" or "constraint"'.format(sort_by))
+
+
+def select_nuisances(cols, sort_by=None, top_n=None, pattern=None): # -> list
+    """
+    select the nuisances to plot.
+    nuisances whose label does not match the regular expression pattern are dropped,
+    the rest is ranked by sort_by and reduced to the top_n (heap selection, without sorting all).
+    without sort_by the order of the file is kept.
+    returns list of row indices in drawing order
+    """
+    indices = range(len(cols['label']))
+    if pattern is not None:
+        regex = re.compile(pattern)
+        indices = [i for i in indices if regex.search(cols['label'][i])]
+    indices = list(indices)
+    if sort_by is None:
+        return indices[:top_n] if top_n is not None else indices
+    keys = rank_keys(cols, sort_by)
+    if top_n is not None:
+        return heapq.nlargest(top_n, indices, key=keys.__getitem__)
+    return sorted(indices, key=keys.__getitem__, reverse=True)
+
+
+def iter_pages(indices, per_page=None): # -> generator
+    """
+    split the selected nuisances into pages of at most per_page entries
+    """
+    per_page = per_page or max(len(indices), 1)
+    for start in range(0, max(len(indices), 1), per_page):
+        yield indices[start:start+per_page]
+
+
+def draw_nuisance_page(pad, cols, indices, name="h"): # -> list
+    """
+    draw the pulls of the given nuisances on a pad, the first index is drawn on top.
+    name is the name of the axis histogram, it should be unique if several plots are drawn at the same time.
+    returns list of the drawn objects, they have to be kept alive until the pad is printed
+    """
+    page = dict((k, [v[i] for i in reversed(indices)] if k == 'label' else v[indices[::-1]]) for k, v in cols.items())
+    n = len(indices)
+    y = np.arange(n, dtype=np.float64)
+
+    # post-fit NP of background only fit
+    g_postfit_b = graph_loader.make_asymm_error_graph(page['postfit_b'], y+0.35, page['postfit_b_up'], page['postfit_b_down'], 0., 0.)
+    g_postfit_b.SetLineColor(ROOT.kBlack)
+    g_postfit_b.SetMarkerStyle(20)
+    g_postfit_b.SetMarkerColor(ROOT.kBlack)
+    # post-fit NP of signal+background fit
+    g_postfit_s = graph_loader.make_asymm_error_graph(page['postfit_s'], y+0.65, page['postfit_s_up'], page['postfit_s_down'], 0., 0.)
+    g_postfit_s.SetLineColor(ROOT.kGray+1)
+    g_postfit_s.SetMarkerStyle(20)
+    g_postfit_s.SetMarkerColor(ROOT.kGray+1)
+    h = ROOT.TH1F(name,"axis",n,0,n) # use histogram to draw NP names on y-axis
+    h.SetDirectory(0)
+    h.SetFillStyle(0)
+    h.SetFillColor(0)
+    h.SetContent(graph_loader.as_buffer(np.full(n+2, -20.))) # set bin content to some negative value to hide histogram
+    for i, label in enumerate(page['label']):
+        h.GetXaxis().SetBinLabel(i+1,label)
+
+    # create legend
+    leg = ROOT.TLegend(0.3,0.95,0.9,0.99)
+    leg.SetNColumns(2)
+    leg.SetBorderSize(0)
+    leg.SetFillStyle(0)
+    leg.SetTextSize(0.025)
+    leg.SetTextFont(42)
+    leg.AddEntry(g_postfit_b, "background only fit","pl")
+    leg.AddEntry(g_postfit_s, "signal+background fit","pl")
+
+    pad.cd()
+    # Draw 1 and 2 sigma bands as boxes
+    box_68 = ROOT.TBox(-1,0,1,n)
+    box_68.SetFillStyle(1001)
+    box_68.SetFillColor(ROOT.kGreen+1)
+    box_95 = ROOT.TBox(-2,0,2,n)
+    box_95.SetFillStyle(1001)
+    box_95.SetFillColor(ROOT.kOrange)
+
+    h.Draw("hbar") # draw horizontal histogram to get the axis right
+    h.GetYaxis().SetTitle("nuisance parameter pull")
+    h.GetXaxis().SetLabelSize(0.033)
+    h.GetYaxis().SetLabelSize(0.033)
+    h.GetYaxis().SetTitleSize(0.04)
+    h.GetYaxis().SetTitleOffset(0.9)
+    h.GetYaxis().CenterTitle(True)
+    h.GetYaxis().SetRangeUser(-2.49,2.49)
+    box_95.Draw()
+    box_68.Draw()
+    g_postfit_s.Draw("PSAME")
+    g_postfit_b.Draw("PSAME")
+    leg.Draw()
+    pad.RedrawAxis()
+
+    return [g_postfit_b, g_postfit_s, h, leg, box_68, box_95]
+
+
+def make_nuisance_plot(config, style=None): # -> str
+    """
+    create nuisance pull plot from a config dict with the .csv file as 'file_name'
+    or the fit diagnostics output as 'fit_diagnostics_file'.
+    an existing TStyle can be passed to avoid building the CMS style again.
+    returns file name of the plot
+    """
+    file_name = config.get('file_name')                 # .csv file with the nuisance pulls
+    fit_diagnostics_file = config.get('fit_diagnostics_file') # read the pulls from this fit diagnostics file instead
+    dump_file = config.get('dump_file')                 # write the pulls read from fit diagnostics to this .csv file
+    sort_by = config.get('sort_by')                     # rank nuisances by 'pull' or 'constraint' (default: order of the file)
+    top_n = config.get('top_n')                         # only draw the first top_n nuisances after ranking
+    pattern = config.get('filter')                      # only draw nuisances whose label matches this regular expression
+    per_page = config.get('per_page')                   # number of nuisances per page (default: all on one page)
+
+    profile = instrumentation.sequence(plot='nuisance', input=file_name or fit_diagnostics_file)
+    profile.next('read')
+    if fit_diagnostics_file is not None:
+        df = fit_diagnostics.read_nuisance_pulls(fit_diagnostics_file)
+        if dump_file is not None:
+            df.to_csv(dump_file, index=False)
+        cols = dict((c, graph_loader.as_buffer(df[c].values)) for c in NUISANCE_COLUMNS)
+        cols['label'] = list(df['label'])
+        plot_name = file_name or os.path.splitext(fit_diagnostics_file)[0] + '_pulls'
+    else:
+        cols = graph_loader.read_columns(file_name, NUISANCE_COLUMNS, text_columns=['label'])
+        plot_name = file_name
+    profile.next('select')
+    indices = select_nuisances(cols, sort_by, top_n, pattern)
+    if len(indices) == 0:
+        raise ValueError('{}: no nuisances selected'.format(file_name or fit_diagnostics_file))
+
+    profile.next('draw')
+    plot_name = os.path.splitext(plot_name)[0]
+    with render_context.RenderContext(style, 'nuisance') as context:
+        c = context.canvas("nuisance_canvas",600,800)
+        pad = context.keep(ROOT.TPad(context.name("pad"),"pad",0.01,0.01,0.99,0.99))
+        pad.SetTopMargin(0.05)
+        pad.SetBottomMargin(0.075)
+        pad.SetLeftMargin(0.25)
+        pad.SetRightMargin(0.05)
+        pad.Draw()
+
+        data = dict((k, [v[i] for i in indices] if k == 'label' else v[indices]) for k, v in cols.items())
+        if per_page is None or len(indices) <= per_page:
+            objects = draw_nuisance_page(pad, cols, indices, context.name("h"))
+            profile.next('print')
+            plot_file_name = context.save(c, config, plot_name, data, objects)
+        else:
+            # several pages go to one .pdf file, they are drawn one after the other and
+            # the objects of a page are released before the next one is drawn
+            def draw_pages():
+                for page_indices in iter_pages(indices, per_page):
+                    profile.next('draw')
+                    objects = draw_nuisance_page(pad, cols, page_indices, context.name("h"))
+                    profile.next('print')
+                    yield
+                    pad.Clear()
+                    del objects
+
+            output_name = export.get_output_name(config, plot_name)
+            plot_file_name = export.write_pages(c, output_name, export.get_formats(config), draw_pages(), data)[0]
+    profile.done()
+
+    return plot_file_name
+
+
+if __name__ == '__main__':
+    # accept the .csv file, the fit diagnostics file directly or a config file
+    if sys.argv[1].endswith('.csv'):
+        config = {'file_name': sys.argv[1]}
+    elif sys.argv[1].endswith('.root'):
+        config = {'fit_diagnostics_file': sys.argv[1]}
+    else:
+        config = utils.get_config(sys.argv[1])
+    if '--dry-run' in sys.argv[2:]:
+        import validate
+        sys.exit(validate.dry_run(config, 'nuisance', sys.argv[1]))
+    make_nuisance_plot(config)
@@ -1,154 +1,410 @@
-import ROOT
 import array
-import root_cosmetics as cosmetics
+import graph_loader
+import shape_cache
+import render_context
 import utils
+import instrumentation
+import numpy as np
 import sys
 
+# imported when the plot is drawn, so that a config can be checked without loading ROOT (--dry-run)
+ROOT = utils.LazyModule('ROOT')
+cosmetics = utils.LazyModule('root_cosmetics')
 
-config = utils.get_config(sys.argv[1])
-# Settings
-file_name = config.get('file_name')                         # file name of fit diagnostics output
-channel = config.get('channel')                             # channel
-xbins = config.get('xbins')                                 # binning of distribution (maybe I can  remove this)
-prefix = config.get('shapes','shapes_fit_b/')               # name of shapes
+
+def open_shapes(config): # -> TFile or ShapeCache
+    """
+    open the fit diagnostics file, or the shape cache 'shape_cache' if given.
+    the cache is extracted from the fit diagnostics file if it does not exist or the file changed.
+    """
+    file_name = config.get('file_name')                         # file name of fit diagnostics output
+    cache_dir = config.get('shape_cache')                       # directory of the shape cache (see shape_cache.py)
+    if cache_dir is None:
+        return ROOT.TFile(file_name)
+    if not shape_cache.is_current(cache_dir, file_name):
+        shape_cache.extract(file_name, cache_dir)
+    return shape_cache.ShapeCache(cache_dir)
+
+
+def get_object(f, path): # -> TObject
+    """
+    get a copy of an object from an open ROOT file (or shape cache) that is independent of the file.
+    raises KeyError if the object does not exist
+    """
+    if isinstance(f, shape_cache.ShapeCache):
+        return f.get_object(path)
+    obj = f.Get(path)
+    if not obj:
+        raise KeyError('{}: object {} not found'.format(f.GetName(), path))
+    obj = obj.Clone()
+    if hasattr(obj, 'SetDirectory'):
+        obj.SetDirectory(0)
+    return obj
+
+
+def list_channels(f, prefix): # -> list
+    """
+    get the names of all channel directories below a shapes prefix (e.g. 'shapes_fit_b/')
+    """
+    if isinstance(f, shape_cache.ShapeCache):
+        return f.list_channels(prefix)
+    directory = f.Get(prefix.rstrip('/'))
+    if not directory:
+        raise KeyError('{}: directory {} not found'.format(f.GetName(), prefix))
+    return [key.GetName() for key in directory.GetListOfKeys()
+            if ROOT.TClass.GetClass(key.GetClassName()).InheritsFrom('TDirectory')]
+
+
+def read_shapes(f, prefix, channel, config): # -> dict
+    """
+    read data, background, total background and signal shapes of one channel from an open fit diagnostics file.
+    returns dict with 'data', 'backgrounds', 'total_background' and 'signal'
+    """
+    xbins = config.get('xbins')                                 # binning of distribution (maybe I can  remove this)
+                                                                #   (dict of channel -> binning for several channels,
+                                                                #    binning of the file if not given)
+    background_samples = config.get('background_samples',[])    # background samples in the form {'name':'', 'title':'', 'color':0}
+    signal_sample = config.get('signal_sample',{})              # signal sample in the form {'name':'', 'title':'', 'prefit_name':''}
+                                                                #   (signal is normalised to the prefit sample 'prefit_name',
+                                                                #    default is 'name')
+    if isinstance(xbins, dict):
+        xbins = xbins.get(channel)
+    if xbins is not None:
+        nbins = len(xbins) - 1
+        xbins = array.array('d',xbins) # convert xbins list to array
+    def set_bins(h):
+        if xbins is not None:
+            h.SetBins(nbins, xbins)
+
+    path = prefix.rstrip('/') + '/' + channel + '/'
+    # get data
+    h_data = get_object(f, path + 'data')
+    # get background shapes
+    h_bkg_list = []
+    for sample in background_samples:
+        h_bkg = get_object(f, path + sample['name'])
+        h_bkg.SetTitle(sample['title'])
+        set_bins(h_bkg)
+        h_bkg_list.append(h_bkg)
+        h_bkg.SetFillColor(sample['color'])
+        h_bkg.SetLineWidth(0)
+    # get total background shape for uncertainty drawing
+    h_err = get_object(f, path + 'total_background')
+    set_bins(h_err)
+    # get signal
+    h_signal = get_object(f, 'shapes_fit_s/' + channel + '/' + signal_sample['name'])
+    set_bins(h_signal)
+    prefit_name = signal_sample.get('prefit_name', signal_sample['name'])
+    h_signal.Scale(get_object(f, 'shapes_prefit/' + channel + '/' + prefit_name).Integral()/h_signal.Integral())
+    h_signal.SetLineColor(1)
+    h_signal.SetLineStyle(2)
+    h_signal.SetLineWidth(2)
+
+    return {'data': h_data, 'backgrounds': h_bkg_list, 'total_background': h_err, 'signal': h_signal}
+
+
+def read_covariance(f, prefix, name='overall_total_covar'): # -> tuple
+    """
+    read the covariance matrix of all bins of a shapes prefix from an open fit diagnostics file (or shape cache).
+    returns list of bin labels (<channel>_<bin>) and the matrix as (n, n) array
+    """
+    path = prefix.rstrip('/') + '/' + name
+    if isinstance(f, shape_cache.ShapeCache):
+        arrays, kind = f.arrays(path)
+        return arrays['labels'], np.array(arrays['contents'])
+    arrays = graph_loader.hist2d_to_arrays(get_object(f, path))
+    return arrays['labels'], np.array(arrays['contents'], dtype=np.float64)
+
+
+def compute_ratio(edges, num, err_num, den, err_den): # -> dict
+    """
+    compute data/background ratio, its uncertainty and the relative background uncertainty
+    as well as the data points and errors normalised to the bin width.
+    bins without background are left out of the ratio ('filled' is False) and have no background uncertainty.
+    returns dict of arrays 'x', 'width', 'ratio', 'ratio_err', 'bkg_rel_err', 'data', 'data_err' and 'filled'
+    """
+    edges = np.asarray(edges, dtype=np.float64)
+    num, err_num, den, err_den = [np.asarray(a, dtype=np.float64) for a in (num, err_num, den, err_den)]
+    width = np.diff(edges)
+    filled = den > 0
+    safe_den = np.where(filled, den, 1.)
+    return {
+        'x': edges[:-1] + width/2.,
+        'width': width,
+        'ratio': np.where(filled, num / safe_den, 0.),
+        'ratio_err': np.where(filled, err_num / safe_den, 0.),
+        'bkg_rel_err': np.where(filled, err_den / safe_den, 0.),
+        'data': num / width,
+        'data_err': err_num / width,
+        'filled': filled,
+    }
+
+
+def covariance_of_sum(labels, matrix, channels, n_bins): # -> np.ndarray
+    """
+    covariance of the bin by bin sum of channels with n_bins bins each.
+    the rows of the channels are selected from the full matrix by the bin labels (<channel>_<bin>)
+    and propagated with the jacobian J of the sum: C_sum = J^T C J.
+    returns (n_bins, n_bins) array
+    """
+    index = dict((label, i) for i, label in enumerate(labels))
+    rows = []
+    for channel in channels:
+        for k in range(n_bins):
+            label = '{}_{}'.format(channel, k)
+            if label not in index:
+                raise KeyError('covariance matrix: no bin {}'.format(label))
+            rows.append(index[label])
+    sub = matrix[np.ix_(rows, rows)]
+    jacobian = np.tile(np.eye(n_bins), (len(channels), 1))
+    return jacobian.T.dot(sub).dot(jacobian)
+
+
+def sum_shapes(shapes_list, covariance=None): # -> dict
+    """
+    sum the shapes of several channels with the same binning bin by bin.
+    the histograms of the first channel are reused, so they keep their cosmetics.
+    the total background uncertainty is taken from the covariance of the sum if given,
+    otherwise the errors are added in quadrature as if the channels were uncorrelated.
+    returns dict with 'data', 'backgrounds', 'total_background' and 'signal'
+    """
+    def sum_hists(hists, errors=None):
+        arrays = [graph_loader.hist_to_arrays(h) for h in hists]
+        for a in arrays[1:]:
+            if not np.allclose(a['edges'], arrays[0]['edges']):
+                raise ValueError('cannot sum channels with different binning')
+        contents = np.sum([a['contents'] for a in arrays], axis=0)
+        if errors is None:
+            errors = np.sqrt(np.sum([np.square(a['errors']) for a in arrays], axis=0))
+        h = hists[0]
+        h.SetContent(graph_loader.as_buffer(np.concatenate([[0.], contents, [0.]])))
+        h.SetError(graph_loader.as_buffer(np.concatenate([[0.], errors, [0.]])))
+        return h
+
+    first = shapes_list[0]
+    n_backgrounds = len(first['backgrounds'])
+    total_errors = None if covariance is None else np.sqrt(np.clip(np.diag(covariance), 0., None))
+    data = [graph_loader.graph_to_arrays(s['data']) for s in shapes_list]
+    x = data[0]['x']
+    h_data = graph_loader.make_asymm_error_graph(x, np.sum([d['y'] for d in data], axis=0), 0., 0.,
+                                                 np.sqrt(np.sum([np.square(d['eyl']) for d in data], axis=0)),
+                                                 np.sqrt(np.sum([np.square(d['eyh']) for d in data], axis=0)))
+    return {
+        'data': h_data,
+        'backgrounds': [sum_hists([s['backgrounds'][i] for s in shapes_list]) for i in range(n_backgrounds)],
+        'total_background': sum_hists([s['total_background'] for s in shapes_list], total_errors),
+        'signal': sum_hists([s['signal'] for s in shapes_list]),
+    }
+
+
+def draw_postfit_plot(shapes, config, plot_name, style=None): # -> str
+    """
+    draw postfit plot with ratio pad from the shapes of one channel and save it (default name: plot_name).
+    returns file name of the plot
+    """
+    signal_sample = config.get('signal_sample',{})              # signal sample in the form {'name':'', 'title':'', ...}
+    b_logy = config.get('b_logy', False)                        # draw logarithmic y axis?
+    x_axis_title = config.get('x_axis_title','Mass [TeV]')      # x axis title
+    y_axis_title = config.get('y_axis_title','Events/TeV')      # y axis title
+
+    h_data = shapes['data']
+    h_bkg_list = shapes['backgrounds']
+    h_err = shapes['total_background']
+    h_signal = shapes['signal']
+    profile = instrumentation.sequence(plot='postfit', input=plot_name)
+
+    # ratio and uncertainties from the histogram and graph buffers
+    profile.next('fill')
+    bkg = graph_loader.hist_to_arrays(h_err)
+    data = graph_loader.graph_to_arrays(h_data)
+    if len(data['y']) != len(bkg['contents']):
+        raise ValueError('{} data points for {} bins'.format(len(data['y']), len(bkg['contents'])))
+    err_data = np.sqrt((data['eyl']**2 + data['eyh']**2) / 2.) # same as TGraphAsymmErrors::GetErrorY
+    ratio = compute_ratio(bkg['edges'], data['y'], err_data, bkg['contents'], bkg['errors'])
+    filled = ratio['filled']
+    g_ratio = graph_loader.make_error_graph(ratio['x'][filled], ratio['ratio'][filled], ratio['ratio_err'][filled], ex=ratio['width'][filled]/2.)
+    g_ratio_err = graph_loader.make_error_graph(ratio['x'], np.ones_like(ratio['x']), ratio['bkg_rel_err'], ex=ratio['width']/2.)
+    h_data = graph_loader.make_asymm_error_graph(ratio['x'], ratio['data'], 0., 0., ratio['data_err'], ratio['data_err'])
+    h_data.SetLineColor(1)
+    h_data.SetMarkerStyle(8)
+
+    for h_bkg in h_bkg_list:
+        h_bkg.Scale(1., 'width')
+    h_err.Scale(1., "width")
+
+    # drawing
+    profile.next('draw')
+    with render_context.RenderContext(style, 'postfit') as context:
+        h_bkg_stack = ROOT.THStack(context.name("hs"),"")
+        for h_bkg in h_bkg_list:
+            h_bkg_stack.Add(h_bkg, 'hist')
+
+        c = context.canvas("postfit_canvas",600,600)
+        c.cd()
+        pad_top = context.keep(cosmetics.SetupRatioPadTop(context.name("pad")))
+        pad_top.Draw()
+        c.cd()
+        pad_bot = context.keep(cosmetics.SetupRatioPad(context.name("rpad")))
+        pad_bot.Draw()
+        pad_top.cd()
+        pad_top.SetLogy(b_logy)
+
+        h_bkg_stack.SetMaximum(max(h_bkg_stack.GetMaximum()*3, h_data.GetMaximum())*3)
+        h_bkg_stack.SetMinimum(1e-1)
+        h_err.SetFillColor(921)
+        h_err.SetLineWidth(0)
+        h_err.SetFillStyle(3005)
+        h_bkg_stack.Draw()
+        h_bkg_stack.GetYaxis().SetTitle(y_axis_title);
+        h_bkg_stack.GetXaxis().SetLabelSize(h_bkg_stack.GetXaxis().GetLabelSize()/0.65) # adapt label size to smaller the pad
+        h_bkg_stack.GetYaxis().SetLabelSize(h_bkg_stack.GetYaxis().GetLabelSize()/0.65)
+        h_bkg_stack.GetXaxis().SetTitleSize(h_bkg_stack.GetXaxis().GetTitleSize()/0.65)
+        h_bkg_stack.GetYaxis().SetTitleSize(h_bkg_stack.GetYaxis().GetTitleSize()/0.65)
+        h_bkg_stack.GetYaxis().SetTitleOffset(1.)
+        h_err.Draw("E2SAME")
+        h_signal.Draw("HIST SAME")
+        h_data.Draw("PZSAME")
+
+        leg_ylow = 0.725-0.075*len(h_bkg_list)
+        leg = ROOT.TLegend(0.55,leg_ylow,0.95,0.9)
+        leg.SetBorderSize(0)
+        leg.SetFillStyle(0)
+        leg.AddEntry(h_data, "Data", "pl")
+        for h_bkg in reversed(h_bkg_list):
+            leg.AddEntry(h_bkg, h_bkg.GetTitle(), "f")
+        leg.AddEntry(h_err, "Tot. uncertainty", "f")
+        leg.AddEntry(h_signal, signal_sample['title'], "l")
+        leg.Draw()
+
+        profile.next('texts')
+        cosmetics.draw_texts(pad_top,config)
+
+        profile.next('draw')
+        pad_top.RedrawAxis()
+
+        pad_bot.cd()
+        pad_bot.SetLogy(False)
+        g_ratio_err.GetXaxis().SetLimits(h_err.GetXaxis().GetXmin(), h_err.GetXaxis().GetXmax())
+        g_ratio_err.SetFillColor(921)
+        g_ratio_err.GetYaxis().SetRangeUser(0.35, 1.65)
+        g_ratio_err.GetYaxis().CenterTitle()
+        g_ratio_err.GetYaxis().SetTitle("data/bkg")
+        g_ratio_err.GetXaxis().SetTitle(x_axis_title)
+        g_ratio_err.GetXaxis().SetLabelSize(g_ratio_err.GetXaxis().GetLabelSize()/0.32) # adapt label size to smaller the pad
+        g_ratio_err.GetYaxis().SetLabelSize(g_ratio_err.GetYaxis().GetLabelSize()/0.32)
+        g_ratio_err.GetXaxis().SetTitleSize(g_ratio_err.GetXaxis().GetTitleSize()/0.32)
+        g_ratio_err.GetYaxis().SetTitleSize(g_ratio_err.GetYaxis().GetTitleSize()/0.32)
+        g_ratio_err.GetYaxis().SetTitleOffset(.5)
+        g_ratio_err.GetXaxis().SetNdivisions(505)
+        g_ratio_err.GetYaxis().SetNdivisions(505)
+        g_ratio.SetMarkerStyle(8)
+        g_ratio_err.Draw("A2")
+        g_ratio.Draw("SAME PZ0")
+        pad_bot.RedrawAxis()
+
+        data = dict(ratio)
+        data['edges'] = bkg['edges']
+        keep = [h_data, h_bkg_stack, h_err, h_signal, leg, g_ratio, g_ratio_err] + h_bkg_list
+        profile.next('print')
+        plot_file_name = context.save(c, config, plot_name, data, keep)
+    profile.done()
+    return plot_file_name
+
+
+def make_postfit_plot(config, style=None): # -> str
+    """
+    create postfit plot of one channel from a config dict.
+    an existing TStyle can be passed to avoid building the CMS style again.
+    returns file name of the plot
+    """
+    channel = config.get('channel')                             # channel
+    prefix = config.get('shapes','shapes_fit_b/')               # name of shapes
                                                                 #   ('shapes_prefit' = prefit)
                                                                 #   ('shapes_fit_b'  = background only)
                                                                 #   ('shapes_fit_s'  = signal+background)
-background_samples = config.get('background_samples',[])    # background samples in the form {'name':'', 'title':'', 'color':0}
-signal_sample = config.get('signal_sample',{})                # signal sample in the form {'name':'', 'title':'', ...}
-b_logy = config.get('b_logy', False)                        # draw logarithmic y axis?
-x_axis_title = config.get('x_axis_title','Mass [TeV]')    # x axis title
-y_axis_title = config.get('y_axis_title','Events/TeV')      # y axis title
-
-f = ROOT.TFile(file_name)
-nbins = len(xbins) - 1
-xbins = array.array('d',xbins) # convert xbins list to array
-# get data
-h_data = f.Get(prefix + channel + '/data').Clone()
-h_data.SetLineColor(1)
-h_data.SetMarkerStyle(8)
-# get background shapes
-h_bkg_list = []
-for sample in background_samples:
-    h_bkg = f.Get(prefix + channel + '/' + sample['name']).Clone()
-    h_bkg.SetTitle(sample['title'])
-    h_bkg.SetDirectory(0)
-    h_bkg.SetBins(nbins,xbins)
-    h_bkg_list.append(h_bkg)
-    h_bkg.SetFillColor(sample['color'])
-    h_bkg.SetLineWidth(0)
-# get total background shape for uncertainty drawing
-h_err = f.Get(prefix + channel + '/total_background').Clone()
-h_err.SetDirectory(0)
-h_err.SetBins(nbins, xbins)
-# get signal
-h_signal = f.Get("shapes_fit_s/" + channel +'/' + signal_sample['name']).Clone()
-h_signal.SetDirectory(0)
-h_signal.SetBins(nbins, xbins)
-h_signal.Scale(f.Get("shapes_prefit/" + channel + "/BstarToTW2400LH").Integral()/h_signal.Integral())
-h_signal.SetLineColor(1)
-h_signal.SetLineStyle(2)
-h_signal.SetLineWidth(2)
-
-f.Close()
-del f
-
-g_ratio = ROOT.TGraphErrors(h_err.GetNbinsX())
-g_ratio_err = ROOT.TGraphErrors(h_err.GetNbinsX())
-
-for i in range(1,nbins+1):
-    err_tot = h_err.GetBinError(i)
-    err_num = h_data.GetErrorY(i-1)
-    x = ROOT.Double(0)
-    num = ROOT.Double(0) # numerator for ratio plot
-    den = h_err.GetBinContent(i) # denominator for ratio plot
-    h_data.GetPoint(i-1, x, num)
-    x = h_err.GetBinCenter(i)
-    w = h_err.GetBinWidth(i) # bin width
-    ratio_err_bkg = err_tot / den     # relative error on background
-    ratio_err_data = err_num / num    # relative error on data
-    g_ratio.SetPoint(i-1, x, num / den)
-    g_ratio.SetPointError(i-1, w/2., ratio_err_data * (num/den))
-    g_ratio_err.SetPoint(i-1, x,1.)
-    g_ratio_err.SetPointError(i-1, w/2., ratio_err_bkg)
-    num /= w
-    err_num /= w
-    h_data.SetPoint(i-1, x, num)
-    h_data.SetPointError(i-1, 0, 0, err_num, err_num)
-
-style = cosmetics.get_cms_style()
-style.cd()
-
-h_bkg_stack = ROOT.THStack("hs","")
-for h_bkg in h_bkg_list:
-    h_bkg.Scale(1., 'width')
-    h_bkg_stack.Add(h_bkg, 'hist')
-
-h_err.Scale(1., "width")
-
-# drawing
-c = ROOT.TCanvas("postfit_canvas","postfit_canvas",600,600)
-c.cd()
-pad_top = cosmetics.SetupRatioPadTop()
-pad_top.Draw()
-c.cd()
-pad_bot = cosmetics.SetupRatioPad()
-pad_bot.Draw()
-pad_top.cd()
-pad_top.SetLogy(b_logy)
-
-h_bkg_stack.SetMaximum(max(h_bkg_stack.GetMaximum()*3, h_data.GetMaximum())*3)
-h_bkg_stack.SetMinimum(1e-1)
-h_err.SetFillColor(921)
-h_err.SetLineWidth(0)
-h_err.SetFillStyle(3005)
-h_bkg_stack.Draw()
-h_bkg_stack.GetYaxis().SetTitle(y_axis_title);
-h_bkg_stack.GetXaxis().SetLabelSize(h_bkg_stack.GetXaxis().GetLabelSize()/0.65) # adapt label size to smaller the pad
-h_bkg_stack.GetYaxis().SetLabelSize(h_bkg_stack.GetYaxis().GetLabelSize()/0.65)
-h_bkg_stack.GetXaxis().SetTitleSize(h_bkg_stack.GetXaxis().GetTitleSize()/0.65)
-h_bkg_stack.GetYaxis().SetTitleSize(h_bkg_stack.GetYaxis().GetTitleSize()/0.65)
-h_bkg_stack.GetYaxis().SetTitleOffset(1.)
-h_err.Draw("E2SAME")
-h_signal.Draw("HIST SAME")
-h_data.Draw("PZSAME")
-
-leg_ylow = 0.725-0.075*len(h_bkg_list)
-leg = ROOT.TLegend(0.55,leg_ylow,0.95,0.9)
-leg.SetBorderSize(0)
-leg.SetFillStyle(0)
-leg.AddEntry(h_data, "Data", "pl")
-for h_bkg in reversed(h_bkg_list):
-    leg.AddEntry(h_bkg, h_bkg.GetTitle(), "f")
-leg.AddEntry(h_err, "Tot. uncertainty", "f")
-leg.AddEntry(h_signal, signal_sample['title'], "l")
-leg.Draw()
-
-cosmetics.draw_texts(pad_top,config)
-
-ROOT.gPad.RedrawAxis()
-
-pad_bot.cd()
-pad_bot.SetLogy(False)
-g_ratio_err.GetXaxis().SetLimits(h_err.GetXaxis().GetXmin(), h_err.GetXaxis().GetXmax())
-g_ratio_err.SetFillColor(921)
-g_ratio_err.GetYaxis().SetRangeUser(0.35, 1.65)
-g_ratio_err.GetYaxis().CenterTitle()
-g_ratio_err.GetYaxis().SetTitle("data/bkg")
-g_ratio_err.GetXaxis().SetTitle(x_axis_title)
-g_ratio_err.GetXaxis().SetLabelSize(g_ratio_err.GetXaxis().GetLabelSize()/0.32) # adapt label size to smaller the pad
-g_ratio_err.GetYaxis().SetLabelSize(g_ratio_err.GetYaxis().GetLabelSize()/0.32)
-g_ratio_err.GetXaxis().SetTitleSize(g_ratio_err.GetXaxis().GetTitleSize()/0.32)
-g_ratio_err.GetYaxis().SetTitleSize(g_ratio_err.GetYaxis().GetTitleSize()/0.32)
-g_ratio_err.GetYaxis().SetTitleOffset(.5)
-g_ratio_err.GetXaxis().SetNdivisions(505)
-g_ratio_err.GetYaxis().SetNdivisions(505)
-g_ratio.SetMarkerStyle(8)
-g_ratio_err.Draw("A2")
-g_ratio.Draw("SAME PZ0")
-ROOT.gPad.RedrawAxis()
-
-plot_name = channel
-# c.Print(hist_name+".eps")
-# c.Print(hist_name+".png")
-c.Print(str(plot_name+".pdf"))
+
+    with instrumentation.stage('read', plot='postfit', input=channel):
+        f = open_shapes(config)
+        try:
+            shapes = read_shapes(f, prefix, channel, config)
+        finally:
+            f.Close()
+    return draw_postfit_plot(shapes, config, channel, style)
+
+
+def make_postfit_plots(config, style=None): # -> list
+    """
+    create postfit plots of all channels and shape sets in one pass over the fit diagnostics file (or shape cache).
+    'shapes' can be a list of prefixes, 'channels' a list of channels or 'all' (default) for every channel
+    directory below each prefix. the plots are called <prefix>_<channel>, 'output_name' can contain
+    '{shapes}' and '{channel}' to change this.
+    channels that cannot be plotted are reported and skipped.
+    returns list of file names of the plots
+    """
+    prefixes = config.get('shapes',['shapes_prefit/', 'shapes_fit_b/', 'shapes_fit_s/'])
+    channels = config.get('channels','all')                     # list of channels or 'all'
+    output_name = config.get('output_name','{shapes}_{channel}')# name of the plots
+    if not isinstance(prefixes, list):
+        prefixes = [prefixes]
+
+    plot_names = []
+    f = open_shapes(config)
+    try:
+        for prefix in prefixes:
+            for channel in (list_channels(f, prefix) if channels == 'all' else channels):
+                plot_name = output_name.format(shapes=prefix.rstrip('/'), channel=channel)
+                try:
+                    with instrumentation.stage('read', plot='postfit', input=plot_name):
+                        shapes = read_shapes(f, prefix, channel, config)
+                except KeyError as exc:
+                    print('WARNING: skipping {} ({})'.format(plot_name, exc))
+                    continue
+                channel_config = dict(config, output_name=plot_name)
+                plot_names.append(draw_postfit_plot(shapes, channel_config, plot_name, style))
+    finally:
+        f.Close()
+    return plot_names
+
+
+def make_combined_postfit_plot(config, style=None): # -> str
+    """
+    create one postfit plot of the sum of several channels (e.g. years or categories) with the same binning.
+    the uncertainty of the summed background is propagated with the covariance matrix of the fit
+    ('covariance', default overall_total_covar of the shapes prefix), so correlations between the channels are kept.
+    returns file name of the plot
+    """
+    prefix = config.get('shapes','shapes_fit_b/')               # name of shapes
+    channels = config.get('channels','all')                     # list of channels to sum or 'all'
+    covariance_name = config.get('covariance','overall_total_covar') # covariance matrix of all bins, None for uncorrelated channels
+    plot_name = config.get('output_name','{}_combined'.format(prefix.rstrip('/')))
+
+    with instrumentation.stage('read', plot='postfit_combined', input=plot_name):
+        f = open_shapes(config)
+        try:
+            if channels == 'all':
+                channels = list_channels(f, prefix)
+            shapes_list = [read_shapes(f, prefix, channel, config) for channel in channels]
+            covariance = None
+            if covariance_name is not None:
+                labels, matrix = read_covariance(f, prefix, covariance_name)
+        finally:
+            f.Close()
+    with instrumentation.stage('fill', plot='postfit_combined', input=plot_name):
+        if covariance_name is not None:
+            n_bins = shapes_list[0]['total_background'].GetNbinsX()
+            covariance = covariance_of_sum(labels, matrix, channels, n_bins)
+        shapes = sum_shapes(shapes_list, covariance)
+    return draw_postfit_plot(shapes, config, plot_name, style)
+
+
+if __name__ == '__main__':
+    config = utils.get_config(sys.argv[1])
+    if '--dry-run' in sys.argv[2:]:
+        import validate
+        sys.exit(validate.dry_run(config, 'postfit_combined' if config.get('combined', False) else 'postfit', sys.argv[1]))
+    if 'channel' in config:
+        make_postfit_plot(config)
+    elif config.get('combined', False):
+        make_combined_postfit_plot(config)
+    else:
+        make_postfit_plots(config)
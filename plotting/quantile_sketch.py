@@ -0,0 +1,102 @@
+import numpy as np
+
+
+"""
+Quantiles of data streams that do not fit into memory.
+TDigest keeps a bounded number of weighted centroids, dense in the tails where the
+expected band quantiles (2.5% and 97.5%) are taken. ExactQuantiles keeps all values
+and is meant for validating the sketch on smaller samples.
+Both are filled chunk by chunk with update() and evaluated with quantile().
+"""
+
+
+class TDigest(object):
+    """
+    merging t-digest with the arcsine scale function.
+    new values are buffered and merged into the centroids when the buffer is full, so the memory
+    is bounded by the compression (about compression centroids plus buffer_size buffered values).
+    """
+
+    def __init__(self, compression=200, buffer_size=None):
+        self.compression = compression
+        self.buffer_size = buffer_size or 10 * compression
+        self.means = np.zeros(0)
+        self.weights = np.zeros(0)
+        self.buffer = []
+        self.n_buffered = 0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def __len__(self):
+        return int(self.weights.sum()) + self.n_buffered
+
+    def update(self, values): # -> None
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[np.isfinite(values)]
+        if len(values) == 0:
+            return
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+        self.buffer.append(values)
+        self.n_buffered += len(values)
+        if self.n_buffered >= self.buffer_size:
+            self.compress()
+
+    def compress(self): # -> None
+        """
+        merge the buffered values into the centroids.
+        neighbouring centroids are merged as long as they stay within one unit of the scale function.
+        """
+        if not self.buffer:
+            return
+        means = np.concatenate([self.means] + self.buffer)
+        weights = np.concatenate([self.weights, np.ones(self.n_buffered)])
+        self.buffer = []
+        self.n_buffered = 0
+        order = np.argsort(means, kind='mergesort')
+        means, weights = means[order], weights[order]
+        total = weights.sum()
+        q = (np.cumsum(weights) - weights / 2.) / total
+        k = self.compression / np.pi * np.arcsin(np.clip(2. * q - 1., -1., 1.))
+        group = np.floor(k - k[0]).astype(np.int64)
+        # groups are contiguous because q is sorted, merge them with weighted means
+        self.weights = np.bincount(group, weights=weights)
+        self.means = np.bincount(group, weights=weights * means)
+        filled = self.weights > 0
+        self.weights = self.weights[filled]
+        self.means = self.means[filled] / self.weights
+
+    def quantile(self, q): # -> np.ndarray
+        """
+        estimate the quantiles q (scalar or array in [0, 1])
+        """
+        self.compress()
+        if len(self.weights) == 0:
+            return np.full(np.shape(q), np.nan)
+        total = self.weights.sum()
+        centres = np.cumsum(self.weights) - self.weights / 2.
+        x = np.concatenate([[0.], centres, [total]])
+        y = np.concatenate([[self.min], self.means, [self.max]])
+        return np.interp(np.asarray(q, dtype=np.float64) * total, x, y)
+
+
+class ExactQuantiles(object):
+    """
+    keeps all values, for validation of TDigest
+    """
+
+    def __init__(self):
+        self.chunks = []
+
+    def __len__(self):
+        return sum(len(c) for c in self.chunks)
+
+    def update(self, values): # -> None
+        values = np.asarray(values, dtype=np.float64).ravel()
+        self.chunks.append(values[np.isfinite(values)])
+
+    def quantile(self, q): # -> np.ndarray
+        values = np.concatenate(self.chunks) if self.chunks else np.zeros(0)
+        if len(values) == 0:
+            return np.full(np.shape(q), np.nan)
+        return np.quantile(values, q)
@@ -0,0 +1,75 @@
+import argparse
+import json
+import os
+import socket
+import sys
+import tempfile
+
+
+"""
+Thin client for the render server (render_server.py).
+Sends a plot job and prints the file name of the plot, without importing ROOT.
+
+usage: python plotting/render_client.py examples/example_limit_config.yml [-t limit]
+       python plotting/render_client.py --shutdown
+"""
+
+DEFAULT_SOCKET = os.path.join(tempfile.gettempdir(), 'combinetools_render_{}.sock'.format(os.getuid()))
+
+
+def send_request(request, socket_path=DEFAULT_SOCKET): # -> dict
+    """
+    send one request to the render server and wait for the reply
+    """
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        s.connect(socket_path)
+        s.sendall((json.dumps(request) + '\n').encode('utf-8'))
+        reply = b''
+        while not reply.endswith(b'\n'):
+            chunk = s.recv(65536)
+            if not chunk:
+                break
+            reply += chunk
+    finally:
+        s.close()
+    if not reply:
+        raise IOError('render server at {} closed the connection without reply'.format(socket_path))
+    return json.loads(reply.decode('utf-8'))
+
+
+def render(config_file, plot_type=None, socket_path=DEFAULT_SOCKET): # -> dict
+    """
+    render the plot of a config file on the server.
+    relative paths in the config are resolved from the current directory.
+    """
+    request = {'config_file': os.path.abspath(config_file), 'cwd': os.getcwd()}
+    if plot_type is not None:
+        request['plot_type'] = plot_type
+    return send_request(request, socket_path)
+
+
+def main(argv=None): # -> int
+    parser = argparse.ArgumentParser(description='Render a plot on the render server.')
+    parser.add_argument('config', nargs='?', help='config file')
+    parser.add_argument('-t', '--plot-type', default=None, help='plot type if not given in the config')
+    parser.add_argument('-s', '--socket', default=DEFAULT_SOCKET, help='server socket (default: {})'.format(DEFAULT_SOCKET))
+    parser.add_argument('--shutdown', action='store_true', help='stop the server')
+    args = parser.parse_args(argv)
+
+    if args.shutdown:
+        reply = send_request({'command': 'shutdown'}, args.socket)
+    elif args.config is None:
+        parser.error('a config file is needed')
+    else:
+        reply = render(args.config, args.plot_type, args.socket)
+    if reply.get('status') != 'ok':
+        sys.stderr.write('ERROR: {}\n'.format(reply.get('error')))
+        return 1
+    if 'output' in reply:
+        print(reply['output'])
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,150 @@
+import utils
+import export
+import itertools
+import os
+
+
+"""
+Render contexts that let several plots be made in one process, one after the other or from several threads.
+
+Each plot gets its own RenderContext with
+    - unique names for its canvas, pads and histograms ('<name>_<pid>_<n>'), so that a new plot never deletes
+      or replaces the objects of another plot that is still being drawn or written by the background export,
+    - its own copy of the style, so that changing the style of one plot does not change the others,
+    - a list of the objects drawn on the canvas, which are released when the context is closed.
+
+ROOT graphics are not thread-safe: the current style (gStyle), the current pad, the PostScript/PDF output and the
+lists of canvases and styles are global. So the drawing of the plots (inside 'with RenderContext(style) as context:')
+and the writing of the canvases (export.write_files, also in the background export thread) take the same lock
+and never overlap. Only reading the inputs and filling the arrays, before the context is entered, run in parallel
+with the drawing or writing of other plots. Contexts are not nested.
+The canvas is written when the context exits, after the lock was released, so that a full background
+export queue never blocks while the lock is held.
+
+usage: with render_context.RenderContext(style, 'limit') as context:
+           c = context.canvas('limit_canvas', 600, 600)
+           pad = context.keep(cosmetics.SetupPad(context.name('pad')))
+           ...
+           plot_file_name = context.save(c, config, default_name, data)
+"""
+
+# imported when the first context is opened
+ROOT = utils.LazyModule('ROOT')
+cosmetics = utils.LazyModule('root_cosmetics')
+
+_lock = export.lock          # serializes drawing and writing, ROOT graphics are global
+_counter = itertools.count() # number of the next context of this process
+_default_style = None        # CMS style copied by contexts without a style, built once per process
+
+
+def default_style(): # -> TStyle
+    """
+    CMS style of this process, built when first used.
+    creating a TStyle deletes any other style of the same name, so it is built only once.
+    """
+    global _default_style
+    with _lock:
+        if _default_style is None:
+            _default_style = cosmetics.get_cms_style()
+        return _default_style
+
+
+class RenderContext(object):
+    """
+    names, style and drawn objects of one plot.
+    the objects are released by close(), or by the background export once the canvas is written.
+    """
+
+    def __init__(self, style=None, prefix='plot'):
+        self.id = '{}_{}_{}'.format(prefix, os.getpid(), next(_counter))
+        self.base_style = style
+        self.style = None
+        self.objects = []
+        self.canvases = []
+        self.pending = []
+        self.queued = False
+        self.previous_style = None
+
+    def name(self, base): # -> str
+        """
+        unique name of an object of this plot
+        """
+        return '{}_{}'.format(base, self.id)
+
+    def __enter__(self): # -> RenderContext
+        _lock.acquire()
+        try:
+            ROOT.EnableThreadSafety()
+            # copy of the style, so that the plot can change it without changing other plots
+            self.style = ROOT.TStyle(self.base_style if self.base_style is not None else default_style())
+            self.style.SetName(self.name('style'))
+            self.previous_style = ROOT.gStyle
+            self.style.cd()
+        except Exception:
+            _lock.release()
+            raise
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback): # -> bool
+        try:
+            if self.previous_style is not None:
+                self.previous_style.cd()
+                self.previous_style = None
+        finally:
+            _lock.release()
+        try:
+            if exc_type is None:
+                self.write()
+        finally:
+            self.close()
+        return False
+
+    def keep(self, obj): # -> TObject
+        """
+        keep obj alive until the plot is written.
+        returns obj
+        """
+        self.objects.append(obj)
+        return obj
+
+    def canvas(self, base, width, height): # -> TCanvas
+        """
+        create a canvas with a unique name, it is closed with the context
+        """
+        c = ROOT.TCanvas(self.name(base), self.name(base), width, height)
+        self.canvases.append(c)
+        return c
+
+    def save(self, canvas, config, default_name, data=None, keep=()): # -> str
+        """
+        save the canvas with export.save when the context exits, keep holds further objects drawn on the canvas.
+        returns file name of the first format
+        """
+        plot_file_name = export.output_file_name(config, default_name)
+        self.pending.append((canvas, config, default_name, data, list(keep)))
+        return plot_file_name
+
+    def write(self): # -> None
+        """
+        write the saved canvases. with background export, the canvas and all objects of the context
+        are handed over to the export queue.
+        """
+        pending, self.pending = self.pending, []
+        for canvas, config, default_name, data, keep in pending:
+            objects = self.objects + self.canvases + keep + [self.style]
+            export.save(canvas, config, default_name, data, objects, self.style)
+            self.queued = self.queued or export.in_background()
+
+    def close(self): # -> None
+        """
+        release the objects of the plot.
+        canvases still queued for the background export are released by the export queue after they are written.
+        """
+        with _lock:
+            if not self.queued:
+                for c in self.canvases:
+                    c.Close()
+            self.pending = []
+            self.canvases = []
+            self.objects = []
+            self.style = None
@@ -0,0 +1,194 @@
+import ROOT
+import utils
+import batch_plot
+import instrumentation
+import render_client
+import argparse
+import gc
+import importlib
+import importlib.util
+import json
+import os
+import socketserver
+import sys
+
+
+"""
+Long-lived render server that keeps ROOT, pandas and the CMS style loaded.
+Plot jobs are sent over a Unix socket with render_client.py, one JSON request per line:
+    {"config_file": "...", "cwd": "...", "plot_type": "limit"}  or  {"config": {...}, ...}
+    {"command": "shutdown"}
+The reply is {"status": "ok", "output": <plot file name>} or {"status": "error", "error": <message>}.
+
+Modules of the plotting directory (e.g. root_cosmetics.py) that changed on disk are reloaded before a job, together
+with the modules importing them, so cosmetics can be tuned without restarting the server. All canvases are closed after each job.
+
+usage: python plotting/render_server.py [-s socket]
+"""
+
+PLOT_DIR = os.path.dirname(os.path.abspath(__file__))
+# scripts running the server or the watch loop, they are never reloaded
+NO_RELOAD = ['__main__', 'render_server', 'render_client', 'watch']
+
+
+def module_file(name): # -> str
+    """
+    source file of a module of the plotting directory, found without importing the module.
+    returns None for modules outside of the plotting directory
+    """
+    if name in sys.modules:
+        file_name = getattr(sys.modules[name], '__file__', None)
+    else:
+        try:
+            spec = importlib.util.find_spec(name)
+        except (ImportError, ValueError):
+            return None
+        file_name = spec.origin if spec is not None else None
+    if file_name is None or os.path.dirname(os.path.abspath(file_name)) != PLOT_DIR:
+        return None
+    return os.path.abspath(file_name)
+
+
+def plot_dependencies(names): # -> list
+    """
+    the given modules and the modules of the plotting directory they import, directly, through other modules
+    or through utils.LazyModule, in dependency order (imported modules first).
+    modules that are not imported yet are listed without their own imports.
+    """
+    order = []
+    visiting = set()
+
+    def visit(name):
+        if name in visiting or name in NO_RELOAD or module_file(name) is None:
+            return
+        visiting.add(name)
+        if name in sys.modules:
+            for imported in utils.imported_module_names(sys.modules[name]):
+                visit(imported)
+        order.append(name)
+
+    for name in names:
+        visit(name)
+    return order
+
+
+def loaded_plot_modules(): # -> list
+    """
+    imported modules of the plotting directory in dependency order
+    """
+    return [name for name in plot_dependencies(list(sys.modules)) if name in sys.modules]
+
+
+def module_mtimes(): # -> dict
+    return dict((name, os.path.getmtime(module_file(name))) for name in loaded_plot_modules())
+
+
+def reload_changed(mtimes): # -> tuple
+    """
+    reload the plot modules that changed on disk since mtimes (from module_mtimes) and the modules importing them.
+    modules imported since mtimes was taken are read from disk anyway and are not reloaded.
+    returns list of changed modules and the new modification times
+    """
+    new_mtimes = module_mtimes()
+    changed = [name for name in new_mtimes if name in mtimes and new_mtimes[name] != mtimes[name]]
+    if changed:
+        # modules importing a changed module are reloaded as well, after it
+        stale = set(changed)
+        for name in loaded_plot_modules():
+            if name in stale or stale.intersection(utils.imported_module_names(sys.modules[name])):
+                stale.add(name)
+                importlib.reload(sys.modules[name])
+        if 'batch_plot' in sys.modules:
+            sys.modules['batch_plot']._style = None
+        new_mtimes = module_mtimes()
+    return changed, new_mtimes
+
+
+def cleanup(): # -> None
+    """
+    close all canvases and files left over from a job and free the python objects
+    """
+    for canvas in list(ROOT.gROOT.GetListOfCanvases()):
+        canvas.Close()
+    for f in list(ROOT.gROOT.GetListOfFiles()):
+        f.Close()
+    gc.collect()
+
+
+class RenderServer(socketserver.UnixStreamServer):
+    """
+    single threaded server, the jobs are rendered one after the other
+    """
+
+    def __init__(self, socket_path):
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        socketserver.UnixStreamServer.__init__(self, socket_path, RenderHandler)
+        self.mtimes = module_mtimes()
+        self.n_jobs = 0
+        self.running = True
+
+    def reload_changed(self): # -> list
+        """
+        reload the plot modules that changed on disk and rebuild the style.
+        returns list of reloaded modules
+        """
+        changed, self.mtimes = reload_changed(self.mtimes)
+        return changed
+
+    def render(self, request): # -> str
+        self.reload_changed()
+        if 'cwd' in request:
+            os.chdir(request['cwd'])
+        config = request.get('config')
+        if config is None:
+            config = utils.get_config(request['config_file'])
+        try:
+            return sys.modules['batch_plot'].render(config, request.get('plot_type', 'limit'))
+        finally:
+            cleanup()
+            self.n_jobs += 1
+
+    def server_close(self):
+        socketserver.UnixStreamServer.server_close(self)
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+
+
+class RenderHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline().decode('utf-8'))
+            if request.get('command') == 'shutdown':
+                reply = {'status': 'ok'}
+                self.server.running = False
+            else:
+                reply = {'status': 'ok', 'output': self.server.render(request)}
+        except Exception as exc:
+            reply = {'status': 'error', 'error': '{}: {}'.format(type(exc).__name__, exc)}
+        reply['jobs'] = self.server.n_jobs
+        reply['rss_mb'] = instrumentation.rss_mb()
+        self.wfile.write((json.dumps(reply) + '\n').encode('utf-8'))
+
+
+def main(argv=None): # -> int
+    parser = argparse.ArgumentParser(description='Render server keeping ROOT and the CMS style loaded.')
+    parser.add_argument('-s', '--socket', default=render_client.DEFAULT_SOCKET, help='server socket (default: {})'.format(render_client.DEFAULT_SOCKET))
+    args = parser.parse_args(argv)
+
+    batch_plot.init_worker()
+    server = RenderServer(args.socket)
+    print('render server listening on {}'.format(args.socket))
+    try:
+        while server.running:
+            server.handle_request()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,7 +1,8 @@
 import ROOT
-def SetupPad(): # -> TPad
+def SetupPad(name="pad"): # -> TPad
     """
     Create a default TPad for drawing plots (adapted from SFramePlotter)
+    name should be unique if several plots are drawn at the same time
 
     coordinates:
        |             |
@@ -21,7 +22,7 @@ def SetupPad(): # -> TPad
     x1 = 0.01
     x2 = 0.99
 
-    pad = ROOT.TPad("pad", "plot pad", x1, y1, x2, y3)
+    pad = ROOT.TPad(name, "plot pad", x1, y1, x2, y3)
     pad.SetTopMargin(0.05)
     pad.SetBottomMargin(0.12)
     pad.SetLeftMargin(0.14)
@@ -29,7 +30,7 @@ def SetupPad(): # -> TPad
 
     return pad
 
-def SetupRatioPad():
+def SetupRatioPad(name="rpad"):
     yplot = 0.65
     yratio = 0.33
     y3 = 0.99
@@ -38,7 +39,7 @@ def SetupRatioPad():
     x1 = 0.01
     x2 = 0.99
 
-    rpad = ROOT.TPad("rpad", "ratio pad", x1, y1, x2, y2)
+    rpad = ROOT.TPad(name, "ratio pad", x1, y1, x2, y2)
     rpad.SetTopMargin(0.0)
     rpad.SetBottomMargin(0.35)
     rpad.SetLeftMargin(0.19)
@@ -46,7 +47,7 @@ def SetupRatioPad():
 
     return rpad
 
-def SetupRatioPadTop():
+def SetupRatioPadTop(name="pad"):
     yplot = 0.65
     yratio = 0.33
     y3 = 0.99
@@ -55,7 +56,7 @@ def SetupRatioPadTop():
     x1 = 0.01
     x2 = 0.99
 
-    pad = ROOT.TPad("pad", "plot pad", x1, y2, x2, y3)
+    pad = ROOT.TPad(name, "plot pad", x1, y2, x2, y3)
     pad.SetTopMargin(0.065)
     pad.SetBottomMargin(0.0)
     pad.SetLeftMargin(0.19)
@@ -0,0 +1,86 @@
+import utils
+import numpy as np
+import multiprocessing
+
+
+"""
+Bulk reading of ROOT trees into numpy arrays, at once or in chunks of bounded size.
+"""
+
+# imported when the first tree is read
+ROOT = utils.LazyModule('ROOT')
+
+
+def read_tree(file_name, branches, tree_name='limit'): # -> dict
+    """
+    read the given branches of a tree into float64 arrays in one pass over the tree.
+    returns dict of branch name -> array
+    """
+    df = ROOT.RDataFrame(tree_name, file_name)
+    arrays = df.AsNumpy(list(branches))
+    return dict((b, np.asarray(arrays[b], dtype=np.float64)) for b in branches)
+
+
+def iterate_tree(file_name, branches, chunk_size=100000, tree_name='limit'): # -> generator
+    """
+    read the given branches of a tree in chunks of chunk_size entries, so that only one chunk is in memory.
+    yields dicts of branch name -> array
+    """
+    f = ROOT.TFile.Open(file_name)
+    if not f or f.IsZombie():
+        raise IOError('{}: cannot open file'.format(file_name))
+    try:
+        tree = f.Get(tree_name)
+        if not tree:
+            raise KeyError('{}: tree {} not found'.format(file_name, tree_name))
+        n_entries = tree.GetEntries()
+    finally:
+        f.Close()
+    for start in range(0, n_entries, chunk_size):
+        df = ROOT.RDataFrame(tree_name, file_name).Range(start, min(start + chunk_size, n_entries))
+        arrays = df.AsNumpy(list(branches))
+        yield dict((b, np.asarray(arrays[b], dtype=np.float64)) for b in branches)
+
+
+def file_ranges(file_name, branches, chunk_size=100000, tree_name='limit'): # -> dict
+    """
+    minimum and maximum of the finite values of the given branches in one file, read chunk by chunk.
+    returns dict of branch name -> [low, high], [inf, -inf] for branches without finite values
+    """
+    ranges = dict((b, [np.inf, -np.inf]) for b in branches)
+    for chunk in iterate_tree(file_name, branches, chunk_size, tree_name):
+        for b in branches:
+            values = chunk[b][np.isfinite(chunk[b])]
+            if len(values):
+                ranges[b] = [min(ranges[b][0], float(values.min())), max(ranges[b][1], float(values.max()))]
+    return ranges
+
+
+def _file_ranges_job(args): # -> tuple
+    file_name, branches, chunk_size, tree_name = args
+    try:
+        return file_name, file_ranges(file_name, branches, chunk_size, tree_name), None
+    except Exception as exc:
+        return file_name, None, '{}: {}'.format(type(exc).__name__, exc)
+
+
+def branch_ranges(files, branches, chunk_size=100000, tree_name='limit', n_jobs=1): # -> dict
+    """
+    minimum and maximum of the given branches over all files, one file per job in a pool of n_jobs worker processes.
+    files that cannot be read are skipped here, they are reported by the pass that reads their contents.
+    returns dict of branch name -> [low, high], [inf, -inf] for branches without finite values
+    """
+    ranges = dict((b, [np.inf, -np.inf]) for b in branches)
+    jobs = [(f, list(branches), chunk_size, tree_name) for f in files]
+    pool = multiprocessing.Pool(min(n_jobs, len(jobs))) if n_jobs > 1 and len(jobs) > 1 else None
+    try:
+        results = pool.imap_unordered(_file_ranges_job, jobs) if pool is not None else (_file_ranges_job(job) for job in jobs)
+        for file_name, found, error in results:
+            if error is None:
+                for b in branches:
+                    ranges[b] = [min(ranges[b][0], found[b][0]), max(ranges[b][1], found[b][1])]
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    return ranges
@@ -0,0 +1,307 @@
+import utils
+import graph_loader
+import contours
+import render_context
+import config_matrix
+import limit_plot_2d
+import mass_limits
+import instrumentation
+import root_io
+import numpy as np
+import multiprocessing
+import os
+import sys
+
+
+"""
+Create likelihood scan plots (2*deltaNLL) from combine MultiDimFit grid scans, in one or two parameters.
+The limit trees of all job files are read in chunks and the minimum deltaNLL of each grid cell is kept,
+so the memory is bounded by the number of cells and not by the number of scan points.
+1D scans are drawn as curve with the 1 and 2 sigma crossings, 2D scans as 2*deltaNLL map with the
+68% and 95% CL contours.
+
+usage: python plotting/scan_plot.py scan_config.yml
+"""
+
+# imported when the plot is drawn, so that a config can be checked without loading ROOT (--dry-run)
+ROOT = utils.LazyModule('ROOT')
+cosmetics = utils.LazyModule('root_cosmetics')
+
+# 2*deltaNLL levels: (level, line style, legend title)
+LEVELS_1D = [(1., 7, '68% CL'), (4., 3, '95% CL')]
+LEVELS_2D = [(2.30, 1, '68% CL'), (5.99, 7, '95% CL')]
+
+
+class ProfileGrid(object):
+    """
+    minimum deltaNLL and the parameter values where it was found, for each cell of a regular grid.
+    edges is a list of bin edges, one array per scan parameter
+    """
+
+    def __init__(self, edges):
+        self.edges = [np.asarray(e, dtype=np.float64) for e in edges]
+        self.shape = tuple(len(e) - 1 for e in reversed(self.edges))
+        n = int(np.prod(self.shape))
+        self.dnll = np.full(n, np.inf)
+        self.points = np.full((len(self.edges), n), np.nan)
+
+    def cell_index(self, values): # -> tuple
+        """
+        flat cell index of the points given as one array per parameter.
+        returns index array and mask of the points inside the grid
+        """
+        index = np.zeros(len(values[0]), dtype=np.int64)
+        inside = np.ones(len(values[0]), dtype=bool)
+        stride = 1
+        for edges, v in zip(self.edges, values):
+            i = np.searchsorted(edges, v, side='right') - 1
+            # points on the upper edge belong to the last cell
+            i[v == edges[-1]] = len(edges) - 2
+            inside &= (i >= 0) & (i < len(edges) - 1)
+            index += np.clip(i, 0, len(edges) - 2) * stride
+            stride *= len(edges) - 1
+        return index, inside
+
+    def fill(self, cells, dnll, points): # -> None
+        """
+        keep the smaller deltaNLL per cell, cells must be distinct
+        """
+        better = dnll < self.dnll[cells]
+        self.dnll[cells[better]] = dnll[better]
+        self.points[:, cells[better]] = points[:, better]
+
+    def update(self, values, dnll): # -> None
+        """
+        add scan points given as one array per parameter and their deltaNLL
+        """
+        values = [np.asarray(v, dtype=np.float64) for v in values]
+        dnll = np.asarray(dnll, dtype=np.float64)
+        index, inside = self.cell_index(values)
+        inside &= np.isfinite(dnll)
+        index, dnll = index[inside], dnll[inside]
+        points = np.array([v[inside] for v in values]).reshape(len(values), -1)
+        # minimum of each cell in the chunk: first entry per cell after sorting by cell and deltaNLL
+        order = np.lexsort((dnll, index))
+        index = index[order]
+        first = np.concatenate([[True], index[1:] != index[:-1]]) if len(index) else np.zeros(0, dtype=bool)
+        self.fill(index[first], dnll[order][first], points[:, order][:, first])
+
+    def merge(self, other): # -> None
+        self.fill(np.arange(len(self.dnll)), other.dnll, other.points)
+
+    def q(self): # -> np.ndarray
+        """
+        2*deltaNLL relative to the global minimum on the grid of shape (ny, nx) or (nx,), NaN for empty cells
+        """
+        q = 2. * (self.dnll - self.dnll.min())
+        q[~np.isfinite(self.dnll)] = np.nan
+        return q.reshape(self.shape)
+
+    def centres(self): # -> list
+        return [(e[1:] + e[:-1]) / 2. for e in self.edges]
+
+
+def profile_file(file_name, pois, edges, chunk_size=100000): # -> ProfileGrid
+    """
+    read the scan points of one file chunk by chunk into a ProfileGrid
+    """
+    grid = ProfileGrid(edges)
+    for chunk in root_io.iterate_tree(file_name, list(pois) + ['deltaNLL'], chunk_size):
+        grid.update([chunk[poi] for poi in pois], chunk['deltaNLL'])
+    return grid
+
+
+def _profile_job(args): # -> tuple
+    file_name, pois, edges, chunk_size = args
+    try:
+        return file_name, profile_file(file_name, pois, edges, chunk_size), None
+    except Exception as exc:
+        return file_name, None, '{}: {}'.format(type(exc).__name__, exc)
+
+
+def profile_scan(files, pois, edges, n_jobs=1, chunk_size=100000): # -> ProfileGrid
+    """
+    profile the scan points of all files on the grid, one file per job in a pool of n_jobs worker processes.
+    files that cannot be read are reported and skipped.
+    returns ProfileGrid of all files
+    """
+    grid = ProfileGrid(edges)
+    jobs = [(f, list(pois), edges, chunk_size) for f in files]
+    pool = multiprocessing.Pool(min(n_jobs, len(jobs))) if n_jobs > 1 and len(jobs) > 1 else None
+    try:
+        # the grid of each file is merged as soon as it arrives, so that only a few grids are held at once
+        results = pool.imap_unordered(_profile_job, jobs) if pool is not None else (_profile_job(job) for job in jobs)
+        for file_name, file_grid, error in results:
+            if error is None:
+                grid.merge(file_grid)
+            else:
+                print('WARNING: skipping {} ({})'.format(file_name, error))
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    if not np.isfinite(grid.dnll).any():
+        raise ValueError('no scan points of {} found in {} files'.format(', '.join(pois), len(files)))
+    return grid
+
+
+def find_crossings(x, q, level): # -> np.ndarray
+    """
+    parameter values where the 1D scan crosses the 2*deltaNLL level, linear interpolation between the points
+    """
+    return mass_limits.find_intersections(x, q, [x.min(), x.max()], [level, level], logy=False)
+
+
+def confidence_intervals(x, q, levels): # -> dict
+    """
+    best fit value and the crossings around it for each level.
+    returns dict with 'best_fit' and level -> (low, high), NaN where the scan does not cross the level
+    """
+    best_fit = x[np.argmin(q)]
+    intervals = {'best_fit': best_fit}
+    for level in levels:
+        crossings = find_crossings(x, q, level)
+        low, high = crossings[crossings < best_fit], crossings[crossings > best_fit]
+        intervals[level] = (low[-1] if len(low) else np.nan, high[0] if len(high) else np.nan)
+    return intervals
+
+
+def make_scan_plot(config, style=None): # -> str
+    """
+    create likelihood scan plot from a config dict.
+    an existing TStyle can be passed to avoid building the CMS style again.
+    returns file name of the plot
+    """
+    # --- Settings
+    files = config_matrix.expand_patterns(config.get('scan_files',[]))  # MultiDimFit output files or glob patterns
+    poi = config.get('poi','r')                                 # scanned parameter (branch of the limit tree)
+    poi2 = config.get('poi2')                                   # second scanned parameter for 2D scans (optional)
+    poi_range = config.get('poi_range')                         # [low, high] of the scan, read from the files if not given
+    poi2_range = config.get('poi2_range')                       # [low, high] of the second parameter
+    bins = config.get('bins')                                   # number of grid cells ([nx, ny] for 2D), best the number of scan points
+    chunk_size = config.get('chunk_size',100000)                # tree entries read at once
+    n_jobs = config.get('n_jobs',1)                             # worker processes reading the files (not inside batch_plot.py)
+    b_draw_q = config.get('b_draw_q',True)                      # draw 2*deltaNLL as colour map (2D)
+    x_axis_title = config.get('x_axis_title',poi)               # x axis title
+    y_axis_title = config.get('y_axis_title','-2 #Delta ln L' if poi2 is None else poi2)
+    z_axis_title = config.get('z_axis_title','-2 #Delta ln L')
+
+    pois = [poi] if poi2 is None else [poi, poi2]
+    levels = LEVELS_1D if poi2 is None else LEVELS_2D
+    profile = instrumentation.sequence(plot='scan', input=files[0] if files else None)
+
+    # --- Profile the scan points on the grid
+    profile.next('read')
+    ranges = [poi_range, poi2_range][:len(pois)]
+    if any(r is None for r in ranges):
+        found = root_io.branch_ranges(files, pois, chunk_size, n_jobs=n_jobs)
+        if not all(np.isfinite(found[p]).all() for p in pois):
+            raise ValueError('no scan points of {} found in {} files'.format(', '.join(pois), len(files)))
+        ranges = [r if r is not None else found[p] for r, p in zip(ranges, pois)]
+    if bins is None:
+        bins = [100] if poi2 is None else [50, 50]
+    elif not isinstance(bins, list):
+        bins = [bins] * len(pois)
+    edges = [np.linspace(r[0], r[1], n + 1) for r, n in zip(ranges, bins)]
+    grid = profile_scan(files, pois, edges, n_jobs, chunk_size)
+    profile.next('fill')
+    q = grid.q()
+
+    # --- Plotting
+    profile.next('draw')
+    with render_context.RenderContext(style, 'scan') as context:
+        c = context.canvas('scan_canvas',600,600)
+        pad = context.keep(cosmetics.SetupPad(context.name('pad')))
+        pad.SetRightMargin(0.17 if poi2 is not None and b_draw_q else 0.05)
+        pad.Draw()
+        pad.cd()
+        leg = ROOT.TLegend(0.55,0.72,0.95,0.88)
+        leg.SetBorderSize(0)
+        leg.SetFillStyle(0)
+        leg.SetTextSize(0.033)
+        leg.SetTextFont(42)
+        keep = [leg]
+
+        if poi2 is None:
+            filled = np.isfinite(q)
+            x, q = grid.points[0][filled], q[filled]
+            order = np.argsort(x)
+            x, q = x[order], q[order]
+            results = confidence_intervals(x, q, [level for level, line_style, title in levels])
+            g_scan = graph_loader.make_graph(x, q)
+            g_scan.SetLineWidth(3)
+            g_scan.SetLineColor(ROOT.kBlack)
+            g_scan.Draw('AL')
+            g_scan.GetHistogram().SetXTitle(x_axis_title)
+            g_scan.GetHistogram().SetYTitle(y_axis_title)
+            g_scan.GetHistogram().GetYaxis().SetTitleOffset(1.25)
+            g_scan.GetHistogram().GetXaxis().SetLimits(x[0], x[-1])
+            g_scan.GetHistogram().GetYaxis().SetRangeUser(0., max(2. * levels[-1][0], min(q.max(), 10.)) * 1.1)
+            leg.AddEntry(g_scan, 'Observed', 'l')
+            keep.append(g_scan)
+            for level, line_style, title in levels:
+                line = ROOT.TLine(x[0], level, x[-1], level)
+                line.SetLineColor(ROOT.kRed)
+                line.SetLineStyle(line_style)
+                line.SetLineWidth(2)
+                line.Draw()
+                leg.AddEntry(line, title, 'l')
+                keep.append(line)
+            low, high = results[levels[0][0]]
+            result_text = ROOT.TLatex(0.59, 0.66, '{} = {:.3g}^{{+{:.2g}}}_{{-{:.2g}}}'.format(
+                x_axis_title, results['best_fit'], high - results['best_fit'], results['best_fit'] - low))
+            result_text.SetNDC()
+            result_text.SetTextFont(42)
+            result_text.SetTextSize(0.04)
+            result_text.Draw()
+            keep.append(result_text)
+            print('{} = {:.4g}'.format(poi, results['best_fit']))
+            for level, line_style, title in levels:
+                print('{}: [{:.4g}, {:.4g}]'.format(title, *results[level]))
+            data = {'x': x, 'q': q, 'intervals': dict((str(k), v) for k, v in results.items())}
+        else:
+            x, y = grid.centres()
+            lines = dict((level, contours.find_contours(x, y, q, level)) for level, line_style, title in levels)
+            h_q = limit_plot_2d.make_grid_hist(context.name('h_q'), x, y, q)
+            h_q.GetXaxis().SetTitle(x_axis_title)
+            h_q.GetYaxis().SetTitle(y_axis_title)
+            h_q.GetZaxis().SetTitle(z_axis_title)
+            h_q.GetYaxis().SetTitleOffset(1.25)
+            h_q.Draw('COLZ' if b_draw_q else 'AXIS')
+            keep.append(h_q)
+            for level, line_style, title in levels:
+                for k, line in enumerate(lines[level]):
+                    g = graph_loader.make_graph(line[:, 0], line[:, 1])
+                    g.SetLineColor(ROOT.kBlack)
+                    g.SetLineStyle(line_style)
+                    g.SetLineWidth(3)
+                    g.Draw('L SAME')
+                    if k == 0:
+                        leg.AddEntry(g, title, 'l')
+                    keep.append(g)
+            best = np.nanargmin(q)
+            g_best = graph_loader.make_graph(grid.points[0][best:best + 1], grid.points[1][best:best + 1])
+            g_best.SetMarkerStyle(34)
+            g_best.SetMarkerSize(2)
+            g_best.Draw('P SAME')
+            leg.AddEntry(g_best, 'Best fit', 'p')
+            keep.append(g_best)
+            data = {'x': x, 'y': y, 'q': q, 'contours': dict((str(k), v) for k, v in lines.items())}
+        leg.Draw()
+
+        profile.next('texts')
+        cosmetics.draw_texts(pad, config)
+        profile.next('print')
+        pad.RedrawAxis()
+        default_name = os.path.splitext(os.path.basename(files[0]))[0] + '_scan' if files else 'scan'
+        plot_file_name = context.save(c, config, default_name, data, keep)
+    profile.done()
+    return plot_file_name
+
+
+if __name__ == '__main__':
+    config = utils.get_config(sys.argv[1])
+    if '--dry-run' in sys.argv[2:]:
+        import validate
+        sys.exit(validate.dry_run(config, 'scan', sys.argv[1]))
+    make_scan_plot(config)
@@ -0,0 +1,199 @@
+import graph_loader
+import utils
+import numpy as np
+import argparse
+import json
+import os
+import sys
+
+
+"""
+Columnar cache of the shapes in a fit diagnostics file.
+All 1D histograms (edges, contents, errors) and graphs (x, y, y errors) of every shapes prefix and channel
+as well as the covariance matrices (e.g. overall_total_covar) of each prefix are written once into one float64 array (shapes.npy) with an index of the offsets (index.json).
+The array is memory-mapped when the cache is opened, so a plot only reads the shapes it draws
+and the fit diagnostics file is not opened again.
+
+usage: python plotting/shape_cache.py fitDiagnostics.root -o shape_cache/
+"""
+
+# imported when a file is extracted
+ROOT = utils.LazyModule('ROOT')
+
+ARRAY_FILE = 'shapes.npy'
+INDEX_FILE = 'index.json'
+FIELDS = {
+    'hist': ['edges', 'contents', 'errors'],
+    'graph': ['x', 'y', 'eyl', 'eyh'],
+    'hist2d': ['contents'],
+}
+
+
+def field_sizes(kind, n): # -> list
+    """
+    lengths of the fields of an object with n bins or points
+    """
+    if kind == 'hist':
+        return [n + 1, n, n]
+    if kind == 'hist2d':
+        return [n * n]
+    return [n] * 4
+
+
+def extract(file_name, cache_dir): # -> int
+    """
+    write all 1D histograms and graphs of the shapes directories of a fit diagnostics file to cache_dir.
+    returns number of extracted objects
+    """
+    f = ROOT.TFile.Open(file_name)
+    if not f or f.IsZombie():
+        raise IOError('{}: cannot open file'.format(file_name))
+    objects = {}
+    chunks = []
+    offset = 0
+    try:
+        for prefix_key in f.GetListOfKeys():
+            if not prefix_key.GetName().startswith('shapes_'):
+                continue
+            prefix_dir = prefix_key.ReadObj()
+            if not prefix_dir.InheritsFrom('TDirectory'):
+                continue
+            for channel_key in prefix_dir.GetListOfKeys():
+                channel_dir = channel_key.ReadObj()
+                if channel_dir.InheritsFrom('TH2') and channel_dir.GetNbinsX() == channel_dir.GetNbinsY():
+                    # covariance matrix of all bins, the x labels name the bins (<channel>_<bin>)
+                    covar = channel_dir
+                    arrays = graph_loader.hist2d_to_arrays(covar)
+                    path = '/'.join([prefix_dir.GetName(), covar.GetName()])
+                    objects[path] = {'kind': 'hist2d', 'offset': offset, 'n': len(arrays['labels']),
+                                     'title': covar.GetTitle(), 'labels': arrays['labels']}
+                    chunks.append(np.array(arrays['contents'], dtype=np.float64).ravel())
+                    offset += len(chunks[-1])
+                    continue
+                if not channel_dir.InheritsFrom('TDirectory'):
+                    continue
+                for key in channel_dir.GetListOfKeys():
+                    obj = key.ReadObj()
+                    if obj.InheritsFrom('TH1') and obj.GetDimension() == 1:
+                        kind, arrays = 'hist', graph_loader.hist_to_arrays(obj)
+                    elif obj.InheritsFrom('TGraph'):
+                        kind, arrays = 'graph', graph_loader.graph_to_arrays(obj)
+                    else:
+                        continue
+                    n = len(arrays[FIELDS[kind][1]])
+                    path = '/'.join([prefix_dir.GetName(), channel_dir.GetName(), key.GetName()])
+                    objects[path] = {'kind': kind, 'offset': offset, 'n': n, 'title': obj.GetTitle()}
+                    for field in FIELDS[kind]:
+                        # copy, the arrays are views of the histogram buffers
+                        chunks.append(np.array(arrays[field], dtype=np.float64))
+                        offset += len(chunks[-1])
+    finally:
+        f.Close()
+
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+    np.save(os.path.join(cache_dir, ARRAY_FILE), np.concatenate(chunks) if chunks else np.zeros(0))
+    index = {'source': os.path.abspath(file_name), 'mtime': os.path.getmtime(file_name), 'objects': objects}
+    with open(os.path.join(cache_dir, INDEX_FILE), 'w') as out:
+        json.dump(index, out, indent=1, sort_keys=True)
+    return len(objects)
+
+
+def is_current(cache_dir, file_name=None): # -> bool
+    """
+    check that the cache exists and (if file_name is given) was extracted from the current version of file_name
+    """
+    index_file = os.path.join(cache_dir, INDEX_FILE)
+    if not os.path.exists(index_file) or not os.path.exists(os.path.join(cache_dir, ARRAY_FILE)):
+        return False
+    if file_name is None:
+        return True
+    with open(index_file) as f:
+        index = json.load(f)
+    return index['source'] == os.path.abspath(file_name) and index['mtime'] == os.path.getmtime(file_name)
+
+
+class ShapeCache(object):
+    """
+    read access to an extracted shape cache, the arrays are views of the memory-mapped store
+    """
+
+    def __init__(self, cache_dir):
+        with open(os.path.join(cache_dir, INDEX_FILE)) as f:
+            index = json.load(f)
+        self.name = cache_dir
+        self.source = index['source']
+        self.objects = index['objects']
+        self.store = np.load(os.path.join(cache_dir, ARRAY_FILE), mmap_mode='r')
+
+    def GetName(self): # -> str
+        return self.name
+
+    def Close(self): # -> None
+        """
+        release the memory map, same call as for a TFile
+        """
+        self.store = None
+
+    def arrays(self, path): # -> dict
+        """
+        arrays of the object at path (e.g. 'shapes_fit_b/ch1/data').
+        returns dict of field -> array and the kind ('hist', 'graph' or 'hist2d')
+        """
+        entry = self.objects.get(path.strip('/'))
+        if entry is None:
+            raise KeyError('{}: object {} not found'.format(self.name, path))
+        kind = entry['kind']
+        arrays = {}
+        start = entry['offset']
+        for field, size in zip(FIELDS[kind], field_sizes(kind, entry['n'])):
+            arrays[field] = self.store[start:start + size]
+            start += size
+        if kind == 'hist2d':
+            arrays['contents'] = arrays['contents'].reshape(entry['n'], entry['n'])
+            arrays['labels'] = entry['labels']
+        return arrays, kind
+
+    def get_object(self, path): # -> TObject
+        """
+        create a TH1D or TGraphAsymmErrors of the object at path
+        """
+        arrays, kind = self.arrays(path)
+        if kind == 'hist':
+            obj = graph_loader.make_hist(path.replace('/', '_'), arrays['edges'], arrays['contents'], arrays['errors'])
+        else:
+            obj = graph_loader.make_asymm_error_graph(arrays['x'], arrays['y'], 0., 0., arrays['eyl'], arrays['eyh'])
+            obj.SetName(path.replace('/', '_'))
+        obj.SetTitle(self.objects[path.strip('/')]['title'])
+        return obj
+
+    def list_channels(self, prefix): # -> list
+        """
+        names of all channels below a shapes prefix (e.g. 'shapes_fit_b/')
+        """
+        prefix = prefix.strip('/') + '/'
+        channels = []
+        for path in sorted(self.objects):
+            if path.startswith(prefix) and self.objects[path]['kind'] != 'hist2d':
+                channel = path[len(prefix):].split('/')[0]
+                if channel not in channels:
+                    channels.append(channel)
+        if not channels:
+            raise KeyError('{}: directory {} not found'.format(self.name, prefix))
+        return channels
+
+
+def main(argv=None): # -> int
+    parser = argparse.ArgumentParser(description='Extract the shapes of a fit diagnostics file into a memory-mapped array store.')
+    parser.add_argument('file', help='fit diagnostics .root file')
+    parser.add_argument('-o', '--output', default=None, help='cache directory (default: <file>_shapes/)')
+    args = parser.parse_args(argv)
+
+    cache_dir = args.output or os.path.splitext(args.file)[0] + '_shapes'
+    n = extract(args.file, cache_dir)
+    print('{} shapes written to {}'.format(n, cache_dir))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,124 @@
+import ROOT
+import graph_loader
+import numpy as np
+import pandas as pd
+import argparse
+import sys
+
+
+"""
+Generate synthetic inputs of configurable size for benchmarks:
+limit and theory .csv files with N mass points, nuisance pull .csv files with N rows and
+fitDiagnostics-like .root files with M channels x K bins x S background samples.
+
+usage: python plotting/synthetic_inputs.py limit limits.csv -n 10000
+       python plotting/synthetic_inputs.py nuisance pulls.csv -n 1000
+       python plotting/synthetic_inputs.py fit_diagnostics fitDiagnostics.root --channels 10 --bins 100 --samples 5
+"""
+
+SHAPES = ['shapes_prefit', 'shapes_fit_b', 'shapes_fit_s']
+
+
+def write_limit_csv(file_name, n_points): # -> None
+    """
+    write a synthetic limit .csv file with n_points mass points
+    """
+    mass = np.linspace(500., 6000., n_points)
+    central = 10. * np.exp(-mass / 500.)
+    pd.DataFrame({
+        'mass': mass,
+        'central': central,
+        'observed': central * 1.1,
+        'low_68': central * 0.3,
+        'high_68': central * 0.4,
+        'low_95': central * 0.5,
+        'high_95': central * 0.9,
+    }, columns=graph_loader.LIMIT_COLUMNS).to_csv(file_name, index=False)
+
+
+def write_theory_csv(file_name, n_points): # -> None
+    """
+    write a synthetic theory .csv file with n_points mass points, crossing the limits of write_limit_csv
+    """
+    mass = np.linspace(500., 6000., n_points)
+    central = 1e3 * np.exp(-mass / 300.)
+    pd.DataFrame({'mass': mass, 'central': central, 'err': central * 0.1},
+                 columns=graph_loader.THEORY_COLUMNS).to_csv(file_name, index=False)
+
+
+def write_nuisance_csv(file_name, n_rows, seed=1): # -> None
+    """
+    write a synthetic nuisance pull .csv file with n_rows nuisances
+    """
+    rng = np.random.RandomState(seed)
+    pull = rng.normal(0., 0.5, n_rows)
+    err = rng.uniform(0.2, 1., n_rows)
+    pd.DataFrame({
+        'label': ['nuisance_{}'.format(i) for i in range(n_rows)],
+        'postfit_b': pull,
+        'postfit_b_up': err,
+        'postfit_b_down': err,
+        'postfit_s': pull + rng.normal(0., 0.05, n_rows),
+        'postfit_s_up': err,
+        'postfit_s_down': err,
+    }, columns=['label', 'postfit_b', 'postfit_b_up', 'postfit_b_down', 'postfit_s', 'postfit_s_up', 'postfit_s_down']).to_csv(file_name, index=False)
+
+
+def make_hist(name, contents, errors): # -> TH1D
+    """
+    create TH1D with unit bins from arrays of contents and errors
+    """
+    return graph_loader.make_hist(name, np.arange(len(contents) + 1.), contents, errors)
+
+
+def write_fit_diagnostics(file_name, n_channels, n_bins, n_samples, seed=1): # -> None
+    """
+    write a .root file with the shapes directories of the fitDiagnostics output:
+    shapes_prefit, shapes_fit_b and shapes_fit_s, each with n_channels channels ch<i> holding
+    n_bins bins of data, n_samples backgrounds bkg<j>, total_background and signal.
+    """
+    rng = np.random.RandomState(seed)
+    x = np.arange(n_bins) + 0.5
+    f = ROOT.TFile(file_name, 'RECREATE')
+    for shapes in SHAPES:
+        shapes_dir = f.mkdir(shapes)
+        for i in range(n_channels):
+            channel_dir = shapes_dir.mkdir('ch{}'.format(i))
+            channel_dir.cd()
+            backgrounds = [1e3 * np.exp(-x / (10. + j)) * rng.uniform(0.9, 1.1) for j in range(n_samples)]
+            total = np.sum(backgrounds, axis=0)
+            for j, bkg in enumerate(backgrounds):
+                make_hist('bkg{}'.format(j), bkg, np.sqrt(bkg)).Write()
+            make_hist('total_background', total, 0.1 * total).Write()
+            make_hist('signal', 50. * np.exp(-0.5 * ((x - n_bins / 2.) / 3.)**2), np.zeros(n_bins)).Write()
+            data = rng.poisson(total).astype(np.float64)
+            err = np.sqrt(data)
+            g = graph_loader.make_asymm_error_graph(x, data, 0.5, 0.5, err, err)
+            g.SetName('data')
+            g.Write('data')
+    f.Close()
+
+
+def main(argv=None): # -> int
+    parser = argparse.ArgumentParser(description='Generate synthetic inputs for benchmarks.')
+    parser.add_argument('kind', choices=['limit', 'theory', 'nuisance', 'fit_diagnostics'])
+    parser.add_argument('output', help='output file')
+    parser.add_argument('-n', type=int, default=1000, help='number of mass points or nuisances')
+    parser.add_argument('--channels', type=int, default=10)
+    parser.add_argument('--bins', type=int, default=100)
+    parser.add_argument('--samples', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    if args.kind == 'limit':
+        write_limit_csv(args.output, args.n)
+    elif args.kind == 'theory':
+        write_theory_csv(args.output, args.n)
+    elif args.kind == 'nuisance':
+        write_nuisance_csv(args.output, args.n)
+    else:
+        write_fit_diagnostics(args.output, args.channels, args.bins, args.samples)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
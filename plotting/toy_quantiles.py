@@ -0,0 +1,142 @@
+import graph_loader
+import harvest_limits
+import quantile_sketch
+import root_io
+import utils
+import numpy as np
+import argparse
+import multiprocessing
+import os
+import re
+import sys
+
+
+"""
+Harvest toy based (HybridNew) limits from combine output files into the .csv format used by limit_plot.py.
+The toy limits of all files of a mass point (e.g. one file per seed) are streamed chunk by chunk
+into a t-digest, so the memory does not grow with the number of toys. The expected band quantiles
+are taken from the sketch, the observed limit from the entries with iToy == 0.
+With --exact all toy limits are kept in memory and the quantiles are computed exactly, for validation.
+
+usage: python plotting/toy_quantiles.py output_dir/ -o limits.csv [--exact]
+"""
+
+# imported when the harvested limits are collected, so that the file helpers work without pandas
+pd = utils.LazyModule('pandas')
+
+FILE_PATTERN = 'higgsCombine*.HybridNew.mH*.root'
+# the seed is the last number before .root, a fractional part of the mass is only taken if a seed follows it
+# (combine appends the seed to toy outputs, so mH125.123 is mass 125 with seed 123)
+FILE_REGEX = re.compile(r'^higgsCombine(?P<name>.*)\.HybridNew\.mH(?P<mass>\d+(?:\.\d+(?=\.-?\d+\.root$))?)(?:\.(?P<seed>-?\d+))?\.root$')
+
+
+def parse_file_name(file_name): # -> tuple
+    """
+    get the name and mass from a combine HybridNew output file name.
+    returns (name, mass)
+    """
+    match = FILE_REGEX.match(os.path.basename(file_name))
+    if match is None:
+        raise ValueError('{}: not a combine HybridNew output file'.format(file_name))
+    return match.group('name'), float(match.group('mass'))
+
+
+def group_files(files): # -> dict
+    """
+    group output files by mass point.
+    returns dict of (name, mass) -> list of files
+    """
+    groups = {}
+    for file_name in files:
+        groups.setdefault(parse_file_name(file_name), []).append(file_name)
+    return groups
+
+
+def stream_toy_limits(files, sketch, chunk_size=100000): # -> float
+    """
+    fill the toy limits (iToy > 0) of all files into the sketch chunk by chunk.
+    returns the observed limit (entry with iToy == 0) or NaN if there is none
+    """
+    observed = np.nan
+    for file_name in files:
+        for chunk in root_io.iterate_tree(file_name, ['iToy', 'limit'], chunk_size):
+            toys = chunk['iToy'] > 0
+            sketch.update(chunk['limit'][toys])
+            data = chunk['limit'][~toys]
+            if len(data):
+                observed = data[-1]
+    return observed
+
+
+def toy_limits_row(name, mass, files, exact=False, compression=200, chunk_size=100000): # -> dict
+    """
+    harvest the limits of one mass point from its files.
+    returns dict with name, mass, the limit columns and the number of toys
+    """
+    sketch = quantile_sketch.ExactQuantiles() if exact else quantile_sketch.TDigest(compression)
+    observed = stream_toy_limits(files, sketch, chunk_size)
+    band_quantiles = [q for key, q in harvest_limits.QUANTILES if key != 'observed']
+    quantiles = np.array([-1.] + band_quantiles)
+    limits = np.concatenate([[observed], sketch.quantile(band_quantiles)])
+    row = harvest_limits.limits_from_quantiles(quantiles, limits)
+    row['name'] = name
+    row['mass'] = mass
+    row['n_toys'] = len(sketch)
+    return row
+
+
+def _toy_limits_job(args): # -> tuple
+    (name, mass), files, options = args
+    try:
+        return (name, mass), toy_limits_row(name, mass, files, **options), None
+    except Exception as exc:
+        return (name, mass), None, '{}: {}'.format(type(exc).__name__, exc)
+
+
+def harvest_toys(files, n_jobs=None, exact=False, compression=200, chunk_size=100000): # -> pd.DataFrame
+    """
+    harvest the toy limits of all mass points in a pool of n_jobs worker processes, one mass point per job.
+    mass points that cannot be read are reported and skipped.
+    returns DataFrame with one row per mass point, sorted by name and mass
+    """
+    options = {'exact': exact, 'compression': compression, 'chunk_size': chunk_size}
+    jobs = [(key, group, options) for key, group in sorted(group_files(files).items())]
+    rows = []
+    if jobs:
+        n_jobs = min(n_jobs or multiprocessing.cpu_count(), len(jobs))
+        pool = multiprocessing.Pool(n_jobs)
+        try:
+            for key, row, error in pool.imap_unordered(_toy_limits_job, jobs):
+                if error is None:
+                    rows.append(row)
+                else:
+                    print('WARNING: skipping {} mH{} ({})'.format(key[0], key[1], error))
+        finally:
+            pool.close()
+            pool.join()
+    df = pd.DataFrame(rows, columns=['name'] + graph_loader.LIMIT_COLUMNS + ['n_toys'])
+    return df.sort_values(['name', 'mass']).reset_index(drop=True)
+
+
+def main(argv=None): # -> int
+    parser = argparse.ArgumentParser(description='Harvest combine HybridNew toy limits into limit .csv files.')
+    parser.add_argument('paths', nargs='+', help='directories (searched recursively) or combine output files')
+    parser.add_argument('-o', '--output', default='limits.csv', help='output .csv file, may contain "{name}" (default: limits.csv)')
+    parser.add_argument('-p', '--pattern', default=FILE_PATTERN, help='file name pattern (default: {})'.format(FILE_PATTERN))
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='number of worker processes (default: number of CPUs)')
+    parser.add_argument('--exact', action='store_true', help='keep all toy limits in memory and compute exact quantiles')
+    parser.add_argument('--compression', type=int, default=200, help='number of t-digest centroids (default: 200)')
+    parser.add_argument('--chunk-size', type=int, default=100000, help='tree entries read at once (default: 100000)')
+    args = parser.parse_args(argv)
+
+    files = harvest_limits.find_files(args.paths, args.pattern)
+    df = harvest_toys(files, args.jobs, args.exact, args.compression, args.chunk_size)
+    for file_name in harvest_limits.write_limits(df, args.output):
+        print('written {}'.format(file_name))
+    for row in df.itertuples():
+        print('{} mH{:g}: {} toys'.format(row.name, row.mass, row.n_toys))
+    return 0 if len(df) == len(group_files(files)) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
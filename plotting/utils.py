@@ -1,13 +1,58 @@
+import instrumentation
+import importlib
+import sys
+import types
 import yaml
 
 def get_config(config_file): # -> dict # can be moved to utils
     """
     read configuration from file
     """
-    with open(config_file, 'r') as stream:
-        try:
-            config = yaml.safe_load(stream)
-            return config
-        except yaml.YAMLError as exc:
-            print(exc)
-            raise Exception("{}: Unable to parse config file!".format(sys.argv[0]))
+    with instrumentation.stage('config', input=config_file):
+        with open(config_file, 'r') as stream:
+            try:
+                config = yaml.safe_load(stream)
+                return config
+            except yaml.YAMLError as exc:
+                print(exc)
+                raise Exception("{}: Unable to parse config file!".format(sys.argv[0]))
+
+
+class LazyModule(object):
+    """
+    module that is imported when one of its attributes is used for the first time.
+    ROOT = utils.LazyModule('ROOT') keeps ROOT out of the start-up of a script until something is drawn,
+    so that a config can be checked without it (see validate.py)
+    """
+
+    def __init__(self, name):
+        self.__name = name
+        self.__module = None
+
+    def __getattr__(self, attr):
+        module = self.__module
+        if module is None:
+            # import_module waits if another thread is still importing the module,
+            # sys.modules would already hold the partly initialized module
+            module = self.__module = importlib.import_module(self.__name)
+        return getattr(module, attr)
+
+    @staticmethod
+    def name_of(lazy_module): # -> str
+        """
+        name of the module behind a LazyModule, without importing it
+        """
+        return lazy_module.__name
+
+
+def imported_module_names(module): # -> list
+    """
+    names of the modules a module imported: its module attributes and its LazyModule attributes, imported or not
+    """
+    names = []
+    for value in list(vars(module).values()):
+        if isinstance(value, types.ModuleType):
+            names.append(value.__name__)
+        elif isinstance(value, LazyModule):
+            names.append(LazyModule.name_of(value))
+    return names
@@ -0,0 +1,212 @@
+import utils
+import config_matrix
+import graph_loader
+import export
+import nuisance_plot
+import argparse
+import os
+import sys
+
+
+"""
+Check plot configs without making the plots and without loading ROOT or pandas:
+the keys and their types, the input files and the columns of the .csv (or Parquet/Arrow) inputs.
+Unknown keys are reported as warnings, they are usually typos. Configs with a 'matrix' entry are checked
+for every combination. The plot scripts do the same with --dry-run.
+
+usage: python plotting/validate.py 'configs/*.yml' [-t limit]
+       python plotting/limit_plot.py config.yml --dry-run
+"""
+
+NUMBER = (int, float)
+TEXT = (str,)
+FLAG = (bool,)
+LIST = (list,)
+TEXT_OR_LIST = (str, list)
+
+# keys of all plot types: output (export.py), texts (root_cosmetics.draw_texts) and batch options
+COMMON_KEYS = {
+    'plot_type': TEXT, 'matrix': (dict,), 'output_dir': TEXT, 'output_name': TEXT, 'output_formats': TEXT_OR_LIST,
+    'png_dpi': NUMBER, 'cms_text_upper': TEXT, 'cms_text_lower': TEXT, 'cms_text_run_parameters': TEXT, 'cms_text_align': TEXT,
+}
+AXIS_KEYS = {'x_axis_title': TEXT, 'y_axis_title': TEXT}
+POSTFIT_KEYS = dict(AXIS_KEYS, **{
+    'file_name': TEXT, 'shape_cache': TEXT, 'xbins': (list, dict), 'background_samples': LIST, 'signal_sample': (dict,),
+    'b_logy': FLAG, 'channel': TEXT, 'shapes': TEXT_OR_LIST, 'channels': TEXT_OR_LIST, 'covariance': (str, type(None)),
+    'combined': FLAG,
+})
+# plot type -> (known keys and their types, required keys)
+SCHEMA = {
+    'limit': (dict(AXIS_KEYS, **{
+        'limit_file_name': TEXT, 'theory_file_name': TEXT, 'compare_graphs': LIST, 'b_logy': FLAG, 'b_theory_err': FLAG,
+        'expected_title': TEXT, 'theory_title': TEXT, 'mass_range': LIST,
+    }), ['limit_file_name', 'theory_file_name']),
+    'limit_2d': (dict(AXIS_KEYS, **{
+        'limit_file_name': TEXT, 'theory_file_name': TEXT, 'y_column': TEXT, 'mass_range': LIST, 'grid_bins': LIST,
+        'b_logx': FLAG, 'b_logy': FLAG, 'b_draw_r': FLAG, 'z_axis_title': TEXT,
+    }), ['limit_file_name']),
+    'nuisance': ({
+        'file_name': TEXT, 'fit_diagnostics_file': TEXT, 'dump_file': TEXT, 'sort_by': TEXT, 'top_n': (int,),
+        'filter': TEXT, 'per_page': (int,),
+    }, []),
+    'correlation': ({
+        'file_name': TEXT, 'fit': TEXT, 'filter': TEXT, 'threshold': NUMBER, 'top_n': (int,), 'b_cluster': FLAG,
+        'max_bins': (int,), 'max_labels': (int,), 'palette': (int,),
+    }, ['file_name']),
+    'postfit': (POSTFIT_KEYS, ['file_name', 'signal_sample']),
+    'postfit_all': (POSTFIT_KEYS, ['file_name', 'signal_sample']),
+    'postfit_combined': (POSTFIT_KEYS, ['file_name', 'signal_sample']),
+    'scan': (dict(AXIS_KEYS, **{
+        'scan_files': TEXT_OR_LIST, 'poi': TEXT, 'poi2': TEXT, 'poi_range': LIST, 'poi2_range': LIST, 'bins': (int, list),
+        'chunk_size': (int,), 'n_jobs': (int,), 'b_draw_q': FLAG, 'z_axis_title': TEXT,
+    }), ['scan_files']),
+    'gof': (dict(AXIS_KEYS, **{
+        'observed_file': TEXT, 'toy_files': TEXT_OR_LIST, 'algorithm': TEXT, 'n_bins': (int,), 'range': LIST,
+        'chunk_size': (int,), 'n_jobs': (int,),
+    }), ['observed_file', 'toy_files']),
+}
+CHOICES = {'sort_by': ['pull', 'constraint'], 'cms_text_align': ['left', 'right'], 'fit': ['fit_s', 'fit_b']}
+# keys of the entries of list or dict settings
+ENTRY_KEYS = {'compare_graphs': ['file', 'title', 'color'], 'background_samples': ['name', 'title', 'color'],
+              'signal_sample': ['name', 'title']}
+
+
+def required_columns(config, plot_type): # -> list
+    """
+    columns the plot reads from its table inputs.
+    returns list of (file name, list of columns)
+    """
+    if plot_type == 'limit':
+        theory_columns = graph_loader.THEORY_COLUMNS if config.get('b_theory_err', False) else ['mass', 'central']
+        required = [(config.get('limit_file_name'), graph_loader.LIMIT_COLUMNS),
+                    (config.get('theory_file_name'), theory_columns)]
+        required += [(g.get('file'), ['mass', 'central']) for g in config.get('compare_graphs', []) if isinstance(g, dict)]
+    elif plot_type == 'limit_2d':
+        y_column = config.get('y_column', 'coupling')
+        required = [(config.get('limit_file_name'), graph_loader.LIMIT_COLUMNS + [y_column]),
+                    (config.get('theory_file_name'), ['mass', y_column, 'central'])]
+    elif plot_type == 'nuisance' and config.get('fit_diagnostics_file') is None:
+        required = [(config.get('file_name'), ['label'] + nuisance_plot.NUISANCE_COLUMNS)]
+    else:
+        required = []
+    return [(f, columns) for f, columns in required if f]
+
+
+def check_config(config, plot_type='limit'): # -> tuple
+    """
+    check the keys, input files and input columns of one (expanded) config.
+    returns list of errors and list of warnings
+    """
+    errors = []
+    warnings = []
+    if not isinstance(config, dict):
+        return ['config is not a mapping of keys to values'], warnings
+    plot_type = config.get('plot_type', plot_type)
+    if plot_type not in SCHEMA:
+        return ['unknown plot_type "{}", choose from {}'.format(plot_type, sorted(SCHEMA))], warnings
+
+    # keys and types
+    keys, required = SCHEMA[plot_type]
+    keys = dict(COMMON_KEYS, **keys)
+    for key in required:
+        if config.get(key) is None:
+            errors.append('missing required key "{}"'.format(key))
+    if plot_type == 'nuisance' and config.get('file_name') is None and config.get('fit_diagnostics_file') is None:
+        errors.append('missing required key "file_name" or "fit_diagnostics_file"')
+    for key, value in sorted(config.items()):
+        if key not in keys:
+            warnings.append('unknown key "{}" for plot_type "{}"'.format(key, plot_type))
+        elif value is not None and (not isinstance(value, keys[key]) or isinstance(value, bool) and bool not in keys[key]):
+            errors.append('"{}" should be {}, not {}'.format(key, ' or '.join(t.__name__ for t in keys[key]), type(value).__name__))
+        elif key in CHOICES and value not in CHOICES[key]:
+            errors.append('"{}" should be one of {}, not "{}"'.format(key, CHOICES[key], value))
+        elif key in ENTRY_KEYS and value is not None:
+            for entry in (value if isinstance(value, list) else [value]):
+                missing = [k for k in ENTRY_KEYS[key] if not isinstance(entry, dict) or k not in entry]
+                if missing:
+                    errors.append('entry {} of "{}" misses {}'.format(entry, key, ', '.join(missing)))
+        elif key == 'xbins' and isinstance(value, dict):
+            # binning per channel
+            for channel, bins in sorted(value.items()):
+                if not isinstance(bins, list):
+                    errors.append('"xbins" of channel "{}" should be list, not {}'.format(channel, type(bins).__name__))
+    try:
+        export.get_formats(config)
+    except ValueError as exc:
+        errors.append(str(exc))
+    if errors:
+        return errors, warnings
+
+    # input files and columns
+    for file_name in config_matrix.input_files(config, plot_type):
+        if not os.path.exists(file_name):
+            errors.append('input file {} does not exist'.format(file_name))
+    for file_name, columns in required_columns(config, plot_type):
+        if not os.path.exists(file_name):
+            continue
+        try:
+            available = graph_loader.column_names(file_name)
+        except Exception as exc:
+            errors.append('{}: cannot read the columns ({}: {})'.format(file_name, type(exc).__name__, exc))
+            continue
+        missing = [c for c in columns if c not in available]
+        if missing:
+            errors.append('{}: missing column(s) {}'.format(file_name, ', '.join(missing)))
+    return errors, warnings
+
+
+def check_config_file(config_file, plot_type='limit'): # -> list
+    """
+    check every matrix combination of a config file.
+    returns list of (job name, errors, warnings)
+    """
+    try:
+        jobs = config_matrix.expand_config(utils.get_config(config_file))
+    except Exception as exc:
+        return [(config_file, ['{}: {}'.format(type(exc).__name__, exc)], [])]
+    return [(config_matrix.job_name(config_file, variables), ) + check_config(config, plot_type) for variables, config in jobs]
+
+
+def print_results(results): # -> int
+    """
+    print the errors and warnings of checked configs.
+    returns number of configs with errors
+    """
+    n_failed = 0
+    for name, errors, warnings in results:
+        print('{}: {}'.format(name, 'FAILED' if errors else 'ok'))
+        for error in errors:
+            print('  ERROR: {}'.format(error))
+        for warning in warnings:
+            print('  WARNING: {}'.format(warning))
+        n_failed += bool(errors)
+    return n_failed
+
+
+def dry_run(config, plot_type, name='config'): # -> int
+    """
+    check a config instead of making the plot, for --dry-run of the plot scripts.
+    returns exit code
+    """
+    results = []
+    for variables, job_config in config_matrix.expand_config(config):
+        results.append((config_matrix.job_name(name, variables), ) + check_config(job_config, plot_type))
+    return 1 if print_results(results) else 0
+
+
+def main(argv=None): # -> int
+    parser = argparse.ArgumentParser(description='Check plot configs and their inputs without making the plots.')
+    parser.add_argument('configs', nargs='+', help='config files or glob patterns')
+    parser.add_argument('-t', '--plot-type', default='limit', choices=sorted(SCHEMA), help='plot type for configs without "plot_type"')
+    args = parser.parse_args(argv)
+
+    results = []
+    for config_file in config_matrix.expand_patterns(args.configs):
+        results += check_config_file(config_file, args.plot_type)
+    n_failed = print_results(results)
+    print('{} configs, {} failed'.format(len(results), n_failed))
+    return 1 if n_failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,189 @@
+import batch_plot
+import config_matrix
+import render_server
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+
+
+"""
+Incremental re-rendering of plots, only plots whose config, input files or plot modules
+(the plot script and the modules of the plotting directory it imports) changed are rendered again.
+The content hashes of the dependencies and the written plots of each job are stored in a state file.
+With --once, the outdated plots are rendered once (like make), otherwise the dependencies are polled
+and the plots are rendered again whenever one of them changes.
+
+usage: python plotting/watch.py 'configs/*.yml' [--once] [-j 8] [--interval 1]
+"""
+
+STATE_FILE = '.combinetools_watch.json'
+
+
+def file_hash(file_name, known=None): # -> str
+    """
+    sha1 of the content of a file, or '' if it does not exist.
+    known is a dict of file name -> [size, mtime, hash], the hash is only computed again if size or mtime changed.
+    """
+    try:
+        stat = os.stat(file_name)
+    except OSError:
+        return ''
+    if known is not None:
+        entry = known.get(file_name)
+        if entry is not None and entry[0] == stat.st_size and entry[1] == stat.st_mtime:
+            return entry[2]
+    digest = hashlib.sha1()
+    with open(file_name, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    if known is not None:
+        known[file_name] = [stat.st_size, stat.st_mtime, digest.hexdigest()]
+    return digest.hexdigest()
+
+
+def config_hash(config): # -> str
+    return hashlib.sha1(json.dumps(config, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def module_files(plot_type): # -> list
+    """
+    source files of the plot script of a plot type and of all modules of the plotting directory it imports
+    """
+    function = batch_plot.PLOT_FUNCTIONS.get(plot_type)
+    if function is None:
+        return []
+    return [render_server.module_file(name) for name in render_server.plot_dependencies([function.__module__])]
+
+
+def dependencies(config_file, config, plot_type): # -> list
+    """
+    files a plot depends on: the config file, the input files and the plot modules
+    """
+    plot_type = config.get('plot_type', plot_type)
+    return [os.path.abspath(config_file)] + config_matrix.input_files(config, plot_type) + module_files(plot_type)
+
+
+def load_state(state_file): # -> dict
+    if not os.path.exists(state_file):
+        return {'files': {}, 'jobs': {}}
+    with open(state_file) as f:
+        return json.load(f)
+
+
+def save_state(state, state_file): # -> None
+    tmp_file = state_file + '.tmp'
+    with open(tmp_file, 'w') as f:
+        json.dump(state, f, indent=1, sort_keys=True)
+    os.replace(tmp_file, state_file)
+
+
+def find_outdated(config_files, state, plot_type='limit'): # -> tuple
+    """
+    find the jobs of the config files whose dependencies changed or whose plots are missing.
+    returns list of outdated jobs, dict of job name -> record to store after rendering
+    and list of (config file, None, error message) of unusable configs
+    """
+    outdated = []
+    records = {}
+    failed = []
+    for config_file in config_files:
+        jobs, errors = batch_plot.load_jobs([config_file], plot_type)
+        failed += errors
+        for job in jobs:
+            name, config, job_plot_type = job
+            record = {
+                'config': config_hash(config),
+                'hashes': dict((f, file_hash(f, state['files'])) for f in dependencies(config_file, config, job_plot_type)),
+            }
+            records[name] = record
+            previous = state['jobs'].get(name)
+            if (previous is None or previous['outputs'] is None or previous['config'] != record['config']
+                    or previous['hashes'] != record['hashes'] or not all(os.path.exists(f) for f in previous['outputs'])):
+                outdated.append(job)
+    return outdated, records, failed
+
+
+def run_once(config_files, state, plot_type='limit', n_jobs=None): # -> list
+    """
+    render the outdated plots of the config files and update the state.
+    returns list of (job name, plot file name, error message) of the rendered jobs
+    """
+    outdated, records, failed = find_outdated(config_files, state, plot_type)
+    results = batch_plot.render_jobs(outdated, n_jobs)
+    for name, plot_file, error in results:
+        # failed jobs are kept without outputs, so that they are rendered again and their inputs are watched
+        if error is None:
+            records[name]['outputs'] = plot_file if isinstance(plot_file, list) else [plot_file]
+        else:
+            records[name]['outputs'] = None
+        state['jobs'][name] = records[name]
+    # forget jobs whose configs were removed
+    for name in list(state['jobs']):
+        if name not in records:
+            del state['jobs'][name]
+    return failed + results
+
+
+def watched_mtimes(patterns, state): # -> dict
+    """
+    modification times of all config files and known dependencies
+    """
+    files = set(config_matrix.expand_patterns(patterns))
+    for record in state['jobs'].values():
+        files.update(record['hashes'])
+    mtimes = {}
+    for f in files:
+        try:
+            mtimes[f] = os.path.getmtime(f)
+        except OSError:
+            mtimes[f] = None
+    return mtimes
+
+
+def print_results(results): # -> int
+    n_failed = 0
+    for name, plot_file, error in sorted(results, key=lambda r: r[0]):
+        if error is None:
+            print('{} -> {}'.format(name, plot_file))
+        else:
+            n_failed += 1
+            print('{} FAILED: {}'.format(name, error))
+    return n_failed
+
+
+def main(argv=None): # -> int
+    parser = argparse.ArgumentParser(description='Render only the plots whose configs, inputs or plot modules changed.')
+    parser.add_argument('configs', nargs='+', help='config files or glob patterns')
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='number of worker processes (default: number of CPUs)')
+    parser.add_argument('-t', '--plot-type', default='limit', choices=sorted(batch_plot.PLOT_FUNCTIONS), help='plot type for configs without "plot_type"')
+    parser.add_argument('-s', '--state', default=STATE_FILE, help='state file with the hashes (default: {})'.format(STATE_FILE))
+    parser.add_argument('--once', action='store_true', help='render the outdated plots once and exit')
+    parser.add_argument('--interval', type=float, default=1., help='seconds between checks for changes (default: 1)')
+    args = parser.parse_args(argv)
+
+    state = load_state(args.state)
+    mtimes = render_server.module_mtimes()
+    while True:
+        results = run_once(config_matrix.expand_patterns(args.configs), state, args.plot_type, args.jobs)
+        save_state(state, args.state)
+        n_failed = print_results(results)
+        print('{} plots rendered, {} failed'.format(len(results) - n_failed, n_failed))
+        if args.once:
+            return 1 if n_failed else 0
+        try:
+            watched = watched_mtimes(args.configs, state)
+            while watched_mtimes(args.configs, state) == watched:
+                time.sleep(args.interval)
+        except KeyboardInterrupt:
+            return 0
+        # plot modules changed on disk are reloaded before the workers are forked
+        changed, mtimes = render_server.reload_changed(mtimes)
+        if changed:
+            print('reloaded {}'.format(', '.join(changed)))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
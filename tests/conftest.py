@@ -0,0 +1,7 @@
+import os
+import sys
+
+# the plot scripts import their sibling modules directly
+PLOT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'plotting')
+if PLOT_DIR not in sys.path:
+    sys.path.insert(0, PLOT_DIR)
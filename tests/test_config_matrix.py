@@ -0,0 +1,20 @@
+import conftest
+import config_matrix
+import os
+
+
+def test_expand_patterns(tmpdir):
+    for name in ('b.yml', 'a.yml', 'c.txt'):
+        tmpdir.join(name).write('')
+    pattern = os.path.join(str(tmpdir), '*.yml')
+    files = config_matrix.expand_patterns([pattern, os.path.join(str(tmpdir), 'a.yml'), 'missing.yml'])
+    # sorted matches without duplicates, patterns without matches are kept
+    assert [os.path.basename(f) for f in files] == ['a.yml', 'b.yml', 'missing.yml']
+    assert config_matrix.expand_patterns(pattern) == files[:2]
+
+
+def test_expand_config():
+    config = {'matrix': {'year': [2017, 2018], 'chirality': ['LH']}, 'limit_file_name': 'limits_{year}_{chirality}.csv'}
+    jobs = config_matrix.expand_config(config)
+    assert sorted(c['limit_file_name'] for variables, c in jobs) == ['limits_2017_LH.csv', 'limits_2018_LH.csv']
+    assert all('matrix' not in c for variables, c in jobs)
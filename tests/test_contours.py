@@ -0,0 +1,25 @@
+import conftest
+import contours
+import numpy as np
+
+
+def test_circle_contour():
+    x = np.linspace(-2., 2., 81)
+    y = np.linspace(-2., 2., 81)
+    z = x[np.newaxis, :]**2 + y[:, np.newaxis]**2
+    lines = contours.find_contours(x, y, z, 1.)
+    assert len(lines) == 1
+    radius = np.hypot(lines[0][:, 0], lines[0][:, 1])
+    np.testing.assert_allclose(radius, 1., atol=0.01)
+
+
+def test_no_contour_outside_range():
+    x = y = np.arange(3.)
+    assert contours.find_contours(x, y, np.zeros((3, 3)), 1.) == []
+
+
+def test_grid_points_distinct_values():
+    x_axis, y_axis, grids = contours.grid_points([1., 2., 1., 2.], [5., 5., 6., 6.], {'r': [1., 2., 3., 4.]})
+    np.testing.assert_allclose(x_axis, [1., 2.])
+    np.testing.assert_allclose(y_axis, [5., 6.])
+    np.testing.assert_allclose(grids['r'], [[1., 2.], [3., 4.]])
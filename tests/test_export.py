@@ -0,0 +1,37 @@
+import conftest
+import export
+import json
+import numpy as np
+import pytest
+
+
+class FakeCanvas(object):
+    def __init__(self):
+        self.printed = []
+
+    def Print(self, file_name):
+        self.printed.append(file_name)
+
+
+def test_write_pages(tmpdir):
+    canvas = FakeCanvas()
+    output_name = str(tmpdir.join('plots', 'pulls'))
+    file_names = export.write_pages(canvas, output_name, ['pdf', 'json'], iter(range(3)), {'pull': [1.]})
+    assert file_names == [output_name + '.pdf', output_name + '.json']
+    assert canvas.printed == [output_name + '.pdf[']+[output_name + '.pdf']*3+[output_name + '.pdf]']
+    assert json.load(open(output_name + '.json')) == {'pull': [1.]}
+
+
+def test_write_pages_rejects_single_page_formats(tmpdir):
+    canvas = FakeCanvas()
+    with pytest.raises(ValueError):
+        export.write_pages(canvas, str(tmpdir.join('pulls')), ['pdf', 'png'], iter(range(3)))
+    assert canvas.printed == []
+
+
+def test_write_json_non_finite_values_are_null(tmpdir):
+    file_name = str(tmpdir.join('grid.json'))
+    export.write_json(file_name, {'q': np.array([[0., np.nan], [np.inf, 1.]]), 'best_fit': np.float64(np.nan), 'n': np.int64(3)})
+    text = open(file_name).read()
+    assert 'NaN' not in text and 'Infinity' not in text
+    assert json.loads(text) == {'q': [[0., None], [None, 1.]], 'best_fit': None, 'n': 3}
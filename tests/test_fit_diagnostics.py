@@ -0,0 +1,16 @@
+import conftest
+import fit_diagnostics
+import numpy as np
+
+
+def test_compute_pulls_asymmetric_errors():
+    prefit = {'name': ['a', 'b'], 'value': np.array([0., 1.]), 'error': np.array([1., 2.])}
+    postfit = {'name': ['r', 'b', 'a'], 'value': np.array([1., 2., 0.5]), 'error': np.array([1., 1., 0.5]),
+               'error_low': np.array([-1., -0.5, -0.2]), 'error_high': np.array([1., 1.5, 0.8])}
+    pulls = fit_diagnostics.compute_pulls(prefit, postfit)
+    assert pulls['name'] == ['b', 'a']
+    np.testing.assert_allclose(pulls['pull'], [0.5, 0.5])
+    # up is the error towards larger values (error_high), down towards smaller values, both positive
+    np.testing.assert_allclose(pulls['pull_up'], [0.75, 0.8])
+    np.testing.assert_allclose(pulls['pull_down'], [0.25, 0.2])
+    np.testing.assert_allclose(pulls['constraint'], [0.5, 0.5])
@@ -0,0 +1,42 @@
+import conftest
+import harvest_cache
+import os
+
+
+def make_row(mass):
+    row = dict((c, float(mass)) for c in harvest_cache.VALUE_COLUMNS if c != 'name')
+    row['name'] = 'test'
+    return row
+
+
+def test_lookup_update_invalidate(tmpdir):
+    input_file = tmpdir.join('higgsCombinetest.AsymptoticLimits.mH1000.root')
+    input_file.write('content')
+    with harvest_cache.HarvestCache(str(tmpdir.join('cache.sqlite'))) as cache:
+        rows, stale = cache.lookup([str(input_file)])
+        assert rows == [] and stale == [str(input_file)]
+        cache.update(str(input_file), make_row(1000))
+        cache.commit()
+        rows, stale = cache.lookup([str(input_file)])
+        assert stale == [] and rows[0]['mass'] == 1000.
+        # touched but unchanged: still valid
+        os.utime(str(input_file), (1, 1))
+        rows, stale = cache.lookup([str(input_file)])
+        assert stale == []
+        # changed content: read again
+        input_file.write('changed content')
+        rows, stale = cache.lookup([str(input_file)])
+        assert stale == [str(input_file)]
+        assert cache.invalidate(['*mH1000*']) == 1
+        assert len(cache) == 0
+
+
+def test_compact_removes_missing_files(tmpdir):
+    input_file = tmpdir.join('a.root')
+    input_file.write('x')
+    with harvest_cache.HarvestCache(str(tmpdir.join('cache.sqlite'))) as cache:
+        cache.update(str(input_file), make_row(1))
+        cache.commit()
+        input_file.remove()
+        assert cache.compact() == 1
+        assert len(cache) == 0
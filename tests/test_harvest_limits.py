@@ -0,0 +1,74 @@
+import conftest
+import harvest_limits
+import root_io
+import toy_quantiles
+import numpy as np
+import pytest
+
+
+# limit tree of an AsymptoticLimits output: quantileExpected -1 is the observed limit
+ASYMPTOTIC_TREE = {
+    'quantileExpected': np.array([0.025, 0.16, 0.5, 0.84, 0.975, -1.]),
+    'limit': np.array([0.5, 0.7, 1., 1.4, 2., 1.2]),
+}
+
+
+def fake_read_tree(file_name, branches, tree_name='limit'):
+    if 'broken' in file_name:
+        raise IOError('{}: cannot open file'.format(file_name))
+    mass = harvest_limits.parse_file_name(file_name)[1]
+    # the limits scale with the mass, so that the rows can be told apart
+    tree = dict(ASYMPTOTIC_TREE, limit=ASYMPTOTIC_TREE['limit'] * mass / 1000.)
+    return dict((b, tree[b]) for b in branches)
+
+
+def fake_iterate_tree(file_name, branches, chunk_size=100000, tree_name='limit'):
+    # HybridNew output of one seed: the observed limit (iToy == 0) and 1000 toys in chunks
+    seed = int(file_name.split('.')[-2])
+    values = np.random.RandomState(seed).normal(1., 0.1, 1000)
+    chunks = [{'iToy': np.array([0.]), 'limit': np.array([1.1])}] if seed == 1 else []
+    chunks += [{'iToy': np.ones(len(v)), 'limit': v} for v in np.array_split(values, 4)]
+    for chunk in chunks:
+        yield dict((b, chunk[b]) for b in branches)
+
+
+def test_parse_file_name():
+    assert harvest_limits.parse_file_name('out/higgsCombine.LH.AsymptoticLimits.mH1500.5.root') == ('.LH', 1500.5)
+    with pytest.raises(ValueError):
+        harvest_limits.parse_file_name('higgsCombine.LH.HybridNew.mH1500.root')
+
+
+def test_limits_from_quantiles():
+    row = harvest_limits.limits_from_quantiles(ASYMPTOTIC_TREE['quantileExpected'], ASYMPTOTIC_TREE['limit'])
+    assert row['central'] == 1. and row['observed'] == 1.2
+    np.testing.assert_allclose([row['low_68'], row['high_68'], row['low_95'], row['high_95']], [0.3, 0.4, 0.5, 1.])
+    # missing quantiles (e.g. a blinded file without the observed limit) become NaN
+    row = harvest_limits.limits_from_quantiles(ASYMPTOTIC_TREE['quantileExpected'][:-1], ASYMPTOTIC_TREE['limit'][:-1])
+    assert np.isnan(row['observed'])
+
+
+def test_harvest_and_write(tmpdir, monkeypatch):
+    pytest.importorskip('pandas')
+    monkeypatch.setattr(root_io, 'read_tree', fake_read_tree)
+    files = [str(tmpdir.join('higgsCombine.LH.AsymptoticLimits.mH{}.root'.format(m))) for m in (2000, 1000)]
+    files.append(str(tmpdir.join('higgsCombine.LH.AsymptoticLimits.mH3000.broken.root')))
+    df = harvest_limits.harvest(files, n_jobs=2)
+    # the broken file is skipped, the rows are sorted by mass
+    assert list(df['mass']) == [1000., 2000.]
+    np.testing.assert_allclose(df['central'], [1., 2.])
+    np.testing.assert_allclose(df['observed'], [1.2, 2.4])
+    written = harvest_limits.write_limits(df, str(tmpdir.join('limits_{name}.csv')))
+    assert written == [str(tmpdir.join('limits_.LH.csv'))]
+    assert open(written[0]).readline().strip().split(',') == harvest_limits.graph_loader.LIMIT_COLUMNS
+
+
+def test_toy_limits_row(monkeypatch):
+    monkeypatch.setattr(root_io, 'iterate_tree', fake_iterate_tree)
+    files = ['higgsCombine.LH.HybridNew.mH1000.{}.root'.format(seed) for seed in (1, 2)]
+    row = toy_quantiles.toy_limits_row('.LH', 1000., files, exact=True)
+    assert row['n_toys'] == 2000 and row['observed'] == 1.1
+    # normal toys with sigma 0.1: the 68% band is about +-0.1 around the median of 1
+    np.testing.assert_allclose(row['central'], 1., atol=0.01)
+    np.testing.assert_allclose([row['low_68'], row['high_68']], [0.1, 0.1], atol=0.01)
+    sketch_row = toy_quantiles.toy_limits_row('.LH', 1000., files)
+    np.testing.assert_allclose(sketch_row['central'], row['central'], atol=0.005)
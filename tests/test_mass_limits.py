@@ -0,0 +1,36 @@
+import conftest
+import mass_limits
+import numpy as np
+
+
+def test_single_crossing_log_interpolation():
+    # limit constant at 1, theory falls from 10 to 0.1: crossing in the middle in log(y)
+    x = mass_limits.find_intersections([1., 3.], [1., 1.], [1., 3.], [10., 0.1])
+    np.testing.assert_allclose(x, [2.])
+
+
+def test_several_crossings_and_unsorted_input():
+    x = mass_limits.find_intersections([3., 1., 2.], [0., 0., 0.], [1., 2., 3.], [-1., 1., -1.], logy=False)
+    np.testing.assert_allclose(x, [1.5, 2.5])
+
+
+def test_no_overlap():
+    assert len(mass_limits.find_intersections([1., 2.], [1., 1.], [3., 4.], [1., 2.])) == 0
+
+
+def test_get_mass_limits():
+    mass = np.array([1., 2., 3.])
+    ones = np.ones(3)
+    limits = {'mass': mass, 'central': ones, 'observed': ones, 'low_68': 0. * ones, 'high_68': 0. * ones,
+              'low_95': 0. * ones, 'high_95': 0. * ones}
+    theory = {'mass': mass, 'central': np.array([10., 1., 0.1])}
+    result = mass_limits.get_mass_limits(limits, theory)
+    np.testing.assert_allclose(result['observed'], [2.])
+    np.testing.assert_allclose(result['expected'], [2.])
+
+
+def test_non_positive_points_are_dropped():
+    # the point at x=2 with y=0 is dropped, the crossing is interpolated between x=1 and x=3
+    x = mass_limits.find_intersections([1., 2., 3.], [1., 0., 1.], [1., 3.], [10., 0.1])
+    np.testing.assert_allclose(x, [2.])
+    assert len(mass_limits.find_intersections([1., 2.], [-1., 0.], [1., 2.], [1., 2.])) == 0
@@ -0,0 +1,12 @@
+import conftest
+import nuisance_plot
+import os
+import pytest
+
+
+PULL_FILE = os.path.join(os.path.dirname(conftest.PLOT_DIR), 'examples', 'example_nuisance_pull.csv')
+
+
+def test_empty_selection_is_an_error():
+    with pytest.raises(ValueError):
+        nuisance_plot.make_nuisance_plot({'file_name': PULL_FILE, 'filter': '^no_such_nuisance$'})
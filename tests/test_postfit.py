@@ -0,0 +1,35 @@
+import conftest
+import postfit_plot
+import numpy as np
+
+
+def test_compute_ratio():
+    ratio = postfit_plot.compute_ratio([0., 1., 3.], [4., 2.], [2., 1.], [2., 0.], [1., 0.])
+    np.testing.assert_allclose(ratio['x'], [0.5, 2.])
+    np.testing.assert_allclose(ratio['width'], [1., 2.])
+    np.testing.assert_array_equal(ratio['filled'], [True, False])
+    np.testing.assert_allclose(ratio['ratio'], [2., 0.])
+    np.testing.assert_allclose(ratio['ratio_err'], [1., 0.])
+    np.testing.assert_allclose(ratio['bkg_rel_err'], [0.5, 0.])
+    np.testing.assert_allclose(ratio['data'], [4., 1.])
+    np.testing.assert_allclose(ratio['data_err'], [2., 0.5])
+
+
+def test_covariance_of_sum():
+    labels = ['b_0', 'b_1', 'a_0', 'a_1']
+    matrix = np.array([[4., 0., 1., 0.],
+                       [0., 9., 0., 2.],
+                       [1., 0., 1., 0.],
+                       [0., 2., 0., 1.]])
+    covariance = postfit_plot.covariance_of_sum(labels, matrix, ['a', 'b'], 2)
+    # var(a_k + b_k) = var(a_k) + var(b_k) + 2 cov(a_k, b_k)
+    np.testing.assert_allclose(covariance, [[7., 0.], [0., 14.]])
+
+
+def test_covariance_of_sum_missing_bin():
+    try:
+        postfit_plot.covariance_of_sum(['a_0'], np.ones((1, 1)), ['a'], 2)
+    except KeyError as exc:
+        assert 'a_1' in str(exc)
+    else:
+        assert False, 'missing bin not reported'
@@ -0,0 +1,26 @@
+import conftest
+import quantile_sketch
+import numpy as np
+
+
+def test_tdigest_matches_exact_quantiles():
+    values = np.random.RandomState(1).normal(size=200000)
+    digest = quantile_sketch.TDigest(compression=200)
+    exact = quantile_sketch.ExactQuantiles()
+    for chunk in np.array_split(values, 20):
+        digest.update(chunk)
+        exact.update(chunk)
+    q = np.array([0.025, 0.16, 0.5, 0.84, 0.975])
+    assert len(digest) == len(values)
+    np.testing.assert_allclose(digest.quantile(q), exact.quantile(q), atol=0.01)
+    # memory is bounded by the compression
+    assert len(digest.means) < 2 * digest.compression
+
+
+def test_ignores_non_finite_values_and_empty():
+    digest = quantile_sketch.TDigest()
+    assert np.isnan(digest.quantile(0.5))
+    digest.update([1., np.nan, np.inf, 3.])
+    assert len(digest) == 2
+    assert digest.quantile(0.) == 1.
+    assert digest.quantile(1.) == 3.
@@ -0,0 +1,81 @@
+import conftest
+import json
+import os
+import pytest
+import subprocess
+import sys
+
+
+"""
+Start-up budget of the plot scripts: importing them and a --dry-run of each must not load ROOT or pandas
+and must stay below COMBINETOOLS_STARTUP_BUDGET seconds (default 1), each in a fresh interpreter.
+"""
+
+BUDGET = float(os.environ.get('COMBINETOOLS_STARTUP_BUDGET', 1.))
+REPO_DIR = os.path.dirname(conftest.PLOT_DIR)
+PLOT_SCRIPTS = ['limit_plot', 'limit_plot_2d', 'nuisance_plot', 'postfit_plot', 'scan_plot', 'gof_plot', 'correlation_plot']
+# script -> (config, input files created empty, a .root input only needs to exist for the check)
+DRY_RUN_CONFIGS = {
+    'limit_plot_2d': ("limit_file_name: '{}'\ny_column: 'mass'\n".format(os.path.join(REPO_DIR, 'examples', 'example_limits.csv')), []),
+    'scan_plot': ("scan_files: ['scan.*.root']\npoi_range: [0, 3]\n", ['scan.0.root']),
+    'gof_plot': ("observed_file: 'observed.root'\ntoy_files: ['toys.*.root']\n", ['observed.root', 'toys.0.root']),
+    'correlation_plot': ("file_name: 'fitDiagnostics.root'\n", ['fitDiagnostics.root']),
+}
+
+# prints the wall time and the heavy modules that were loaded as JSON
+IMPORT_CODE = '''
+import json, sys, time
+start = time.time()
+import {}
+print(json.dumps({{'time': time.time() - start, 'ROOT': 'ROOT' in sys.modules, 'pandas': 'pandas' in sys.modules}}))
+'''
+DRY_RUN_CODE = '''
+import json, runpy, sys, time
+start = time.time()
+sys.argv = ['{script}.py', {config!r}, '--dry-run']
+try:
+    runpy.run_path({path!r}, run_name='__main__')
+    code = 0
+except SystemExit as exc:
+    code = exc.code
+sys.stdout.write(json.dumps({{'time': time.time() - start, 'code': code,
+                              'ROOT': 'ROOT' in sys.modules, 'pandas': 'pandas' in sys.modules}}) + '\\n')
+'''
+
+
+def run_python(code, cwd): # -> dict
+    """
+    run code in a fresh interpreter and read the JSON of its last output line
+    """
+    env = dict(os.environ, PYTHONPATH=conftest.PLOT_DIR)
+    output = subprocess.check_output([sys.executable, '-c', code], cwd=cwd, env=env)
+    return json.loads(output.decode().strip().splitlines()[-1])
+
+
+def test_import_budget():
+    result = run_python(IMPORT_CODE.format(', '.join(PLOT_SCRIPTS)), conftest.PLOT_DIR)
+    assert not result['ROOT']
+    assert not result['pandas']
+    assert result['time'] < BUDGET
+
+
+def check_dry_run(script, config_file, cwd): # -> None
+    code = DRY_RUN_CODE.format(script=script, config=config_file, path=os.path.join(conftest.PLOT_DIR, script + '.py'))
+    result = run_python(code, cwd)
+    assert result['code'] == 0
+    assert not result['ROOT']
+    assert not result['pandas']
+    assert result['time'] < BUDGET
+
+
+def test_dry_run_budget():
+    check_dry_run('limit_plot', 'examples/example_limit_config.yml', REPO_DIR)
+
+
+@pytest.mark.parametrize('script', sorted(DRY_RUN_CONFIGS))
+def test_dry_run_budget_of_script(script, tmpdir):
+    config, inputs = DRY_RUN_CONFIGS[script]
+    tmpdir.join('config.yml').write(config)
+    for name in inputs:
+        tmpdir.join(name).write('')
+    check_dry_run(script, 'config.yml', str(tmpdir))
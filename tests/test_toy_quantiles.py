@@ -0,0 +1,16 @@
+import conftest
+import toy_quantiles
+
+
+def test_parse_file_name():
+    assert toy_quantiles.parse_file_name('toys/higgsCombine.test.HybridNew.mH125.5.123.root') == ('.test', 125.5)
+    assert toy_quantiles.parse_file_name('higgsCombine.test.HybridNew.mH1000.123456.root') == ('.test', 1000.)
+    assert toy_quantiles.parse_file_name('higgsCombine.test.HybridNew.mH1000.-1.root') == ('.test', 1000.)
+    assert toy_quantiles.parse_file_name('higgsCombine.test.HybridNew.mH1000.root') == ('.test', 1000.)
+
+
+def test_group_files_by_fractional_mass():
+    groups = toy_quantiles.group_files(['higgsCombine.a.HybridNew.mH125.5.1.root', 'higgsCombine.a.HybridNew.mH125.5.2.root',
+                                        'higgsCombine.a.HybridNew.mH125.3.root'])
+    assert sorted(groups) == [('.a', 125.), ('.a', 125.5)]
+    assert len(groups[('.a', 125.5)]) == 2